@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Create the company_insights table used to persist generated company and hotel insights
+"""
+
+from sqlalchemy import inspect
+from app.db.session import engine
+from app.models.insight import CompanyInsight
+import sys
+
+def add_company_insights_table():
+    """Create company_insights, keyed on (osm_type, osm_id, kind), if it does not exist yet"""
+
+    try:
+        if inspect(engine).has_table(CompanyInsight.__tablename__):
+            print("Table 'company_insights' already exists. Nothing to do.")
+            return
+
+        print("Creating company_insights table...")
+        CompanyInsight.__table__.create(bind=engine, checkfirst=True)
+        print("company_insights table created successfully!")
+
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    add_company_insights_table()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python3
+"""
+Create the http_cache table used by GitHubService for ETag/Last-Modified revalidation
+"""
+
+from sqlalchemy import inspect
+from app.db.session import engine
+from app.models.http_cache import HttpCacheEntry
+import sys
+
+def add_http_cache_table():
+    """Create http_cache if it does not exist yet"""
+
+    try:
+        if inspect(engine).has_table(HttpCacheEntry.__tablename__):
+            print("Table 'http_cache' already exists. Nothing to do.")
+            return
+
+        print("Creating http_cache table...")
+        HttpCacheEntry.__table__.create(bind=engine, checkfirst=True)
+        print("http_cache table created successfully!")
+
+    except Exception as e:
+        print(f"Migration failed: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    add_http_cache_table()
@@ -1,20 +1,63 @@
-from fastapi import APIRouter, HTTPException
-from typing import Any, Dict, List
+from fastapi import APIRouter, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import json
+from app.core.config import settings
 from app.services.map_service import map_service
 
 router = APIRouter()
 
+
+def _sse(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _insights_event_stream(events: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+    """
+    Relay insight events as SSE: "delta" events carry partial model text,
+    the final "result" event carries the validated payload in the usual envelope.
+    """
+    try:
+        async for event, data in events:
+            if event == "delta":
+                yield _sse("delta", {"text": data})
+            else:
+                yield _sse("result", {"status_code": 200, "status": "success", "data": data})
+    except Exception as e:
+        yield _sse("error", {"status_code": 500, "status": "error", "detail": str(e)})
+
+
+def _sse_response(events: AsyncIterator[Tuple[str, Any]]) -> StreamingResponse:
+    return StreamingResponse(
+        _insights_event_stream(events),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @router.get("/companies", response_model=List[Dict])
-async def get_addis_companies(lat: float = 9.0192, lon: float = 38.7525, radius: int = 10000):
+async def get_addis_companies(
+    response: Response,
+    lat: float = 9.0192,
+    lon: float = 38.7525,
+    radius: int = 10000,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+):
     """
     Get a list of companies in Addis Ababa, centered around specific coordinates.
     Default center is 9.0192° N, 38.7525° E.
+    Results are sorted nearest first (`distance_m`); page with `offset`/`limit`.
+    The body stays a bare list; `X-Total-Count` carries the total and `X-Next-Offset`
+    the next page's offset (absent on the last page).
     """
     try:
-        companies = await map_service.search_nearby_companies(lat, lon, radius)
-        return companies
+        page = await map_service.search_nearby_companies_page(lat, lon, radius, offset=offset, limit=limit)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    response.headers["X-Total-Count"] = str(page["total"])
+    if page["next_offset"] is not None:
+        response.headers["X-Next-Offset"] = str(page["next_offset"])
+    return page["data"]
 
 @router.get("/search/nearby", response_model=Dict[str, Any])
 async def search_nearby(
@@ -22,18 +65,95 @@ async def search_nearby(
     lon: float = 38.7525,
     category: str = "hotel",
     radius: int = 1000,
+    offset: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=500),
 ):
     """
     Search for any supported category near a specific coordinate.
     Defaults to hotels around Addis Ababa (9.0192, 38.7525).
     Example categories: hotel, restaurant, hospital, school, mall, airport.
+    Results are sorted nearest first (`distance_m`); page with `offset`/`limit`.
+    `next_offset` is null on the last page.
+    """
+    try:
+        page = await map_service.get_nearby_places_page(
+            lat, lon, category=category, radius=radius, offset=offset, limit=limit
+        )
+        return {"status_code": 200, "status": "success", **page}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search/nearby/multi", response_model=Dict[str, Any])
+async def search_nearby_multi(
+    lat: float = 9.0192,
+    lon: float = 38.7525,
+    categories: List[str] = Query(["hotel", "restaurant", "company"]),
+    radius: int = 1000,
+):
     """
+    Search several categories at once with a single Overpass round trip.
+    Pass `categories` repeatedly or comma-separated, e.g. ?categories=hotel,restaurant.
+    Returns places grouped by category.
+    """
+    requested = [c.strip().lower() for value in categories for c in value.split(",") if c.strip()]
+    unknown = [c for c in requested if c not in map_service.category_tags]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported categories: {', '.join(unknown)}")
     try:
-        results = await map_service.get_nearby_places(lat, lon, category=category, radius=radius)
+        results = await map_service.get_nearby_places_multi(lat, lon, requested, radius=radius)
         return {
             "status_code": 200,
             "status": "success",
-            "data": results 
+            "data": results
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/leads", response_model=Dict[str, Any])
+async def get_leads(
+    lat: float = 9.0192,
+    lon: float = 38.7525,
+    categories: List[str] = Query(["hotel", "restaurant", "company"]),
+    radius: int = 1000,
+    top_n: int = Query(5, ge=0, le=50),
+    limit: Optional[int] = Query(None, ge=1, le=500),
+):
+    """
+    Rank nearby places as outreach leads (weak digital presence, category, distance)
+    and attach AI insights to the top `top_n` only.
+    """
+    requested = [c.strip().lower() for value in categories for c in value.split(",") if c.strip()]
+    unknown = [c for c in requested if c not in map_service.category_tags]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unsupported categories: {', '.join(unknown)}")
+    try:
+        results = await map_service.get_leads(lat, lon, requested, radius=radius, top_n=top_n, limit=limit)
+        return {
+            "status_code": 200,
+            "status": "success",
+            "data": results
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/insights/stored", response_model=Dict[str, Any])
+async def list_stored_insights(
+    lat: float = 9.0192,
+    lon: float = 38.7525,
+    radius: int = 1000,
+    kind: Optional[str] = Query(None, pattern="^(company|hotel)$"),
+    limit: int = Query(200, ge=1, le=500),
+):
+    """
+    List insights already generated for places around a coordinate, nearest first.
+    Served from the database only; never calls the AI.
+    """
+    try:
+        results = await map_service.list_stored_insights(lat, lon, radius=radius, kind=kind, limit=limit)
+        return {
+            "status_code": 200,
+            "status": "success",
+            "data": results
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -68,3 +188,39 @@ async def get_hotel_insights(hotel_data: Dict):
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/company/insights/stream")
+async def stream_company_insights(company_data: Dict):
+    """
+    Streaming version of /company/insights using server-sent events.
+    Emits `delta` events with partial model output, then a final `result` event
+    with the validated insights (same shape as the non-streaming endpoint).
+    """
+    return _sse_response(map_service.stream_company_insights(company_data))
+
+@router.post("/company/insights/batch")
+async def batch_company_insights(places: List[Dict]):
+    """
+    Generate insights for many places (as returned by /search/nearby) in one request.
+    Streams newline-delimited JSON, one line per place as soon as it is ready:
+    {"index", "id", "status": "success", "data"} or {"index", "id", "status": "error", "detail"}.
+    """
+    if len(places) > settings.insights_batch_max_items:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.insights_batch_max_items} places per batch",
+        )
+
+    async def lines() -> AsyncIterator[str]:
+        async for item in map_service.batch_company_insights(places):
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@router.post("/hotel/insights/stream")
+async def stream_hotel_insights(hotel_data: Dict):
+    """
+    Streaming version of /hotel/insights using server-sent events.
+    """
+    return _sse_response(map_service.stream_hotel_insights(hotel_data))
@@ -13,9 +13,78 @@ class Settings(BaseSettings):
     # Gemini API settings
     gemini_api_key: str = ""
     gemini_api_keys: str = ""  # Comma-separated list of keys
+    gemini_max_concurrency: int = 8  # Max in-flight async Gemini calls per worker
+    gemini_requests_per_minute: float = 10  # Token-bucket refill rate per (key, model) pair
+    gemini_max_queue_wait: float = 20  # Seconds an async call may wait for a pair to leave cooldown
+    gemini_hedge_percentile: float = 0.9  # Hedge once the primary is slower than this latency percentile
+    gemini_hedge_min_delay: float = 2.0  # Never hedge earlier than this (also used until enough samples)
+    gemini_hedge_budget: float = 0.1  # Max hedged requests as a fraction of all requests
+    gemini_batch_token_budget: int = 6000  # Approx. input tokens packed into one batch extraction prompt
+    gemini_batch_max_posts: int = 20  # Hard cap on posts per batch extraction prompt
+
+    # LLM backend
+    llm_backend: str = "gemini"  # "gemini" or "fake" (deterministic local backend for benchmarks/CI)
+    llm_fake_fixtures: str = ""  # File or directory of recorded responses replayed by the fake backend
+    llm_fake_latency_ms: float = 0  # Simulated model latency per fake call
+    llm_fake_rate_limit_rate: float = 0.0  # Fraction of fake calls that fail with an injected 429
+    llm_fake_seed: int = 0  # Seed for 429 injection so runs are reproducible
+    llm_record_path: str = ""  # Append every live response here (JSON lines) for later replay
+
+    # LLM response cache
+    llm_cache_max_entries: int = 2048  # In-memory LRU size
+    llm_cache_ttl_seconds: int = 86400  # Default TTL when a template has none registered
+    llm_cache_path: str = ""  # SQLite file for the shared on-disk tier; empty disables it
+    llm_cache_job_ttl_seconds: int = 7 * 86400  # Job extraction results
+    llm_cache_insights_ttl_seconds: int = 3 * 86400  # Company/hotel insights
+
+    # Overpass (OpenStreetMap) HTTP pool
+    overpass_max_connections_per_host: int = 10  # Concurrent connections per mirror
+    overpass_max_keepalive_per_host: int = 5  # Idle connections kept open per mirror
+    overpass_keepalive_expiry: float = 60  # Seconds an idle connection is kept for reuse
+    overpass_http2: bool = True  # Negotiate HTTP/2 when the h2 package is installed
+    overpass_health_alpha: float = 0.3  # EWMA weight of the newest latency/error sample per mirror
+    overpass_circuit_failures: int = 3  # Consecutive 429/5xx/timeouts that open a mirror's circuit
+    overpass_circuit_open_seconds: float = 30  # First cooldown before a half-open probe
+    overpass_circuit_max_open_seconds: float = 600  # Cap for the doubling cooldown of a failing mirror
+
+    # Geohash tile cache for nearby-place searches
+    geo_tile_cache_enabled: bool = True
+    geo_tile_precision: int = 5  # Geohash length; 5 is a ~4.9km x 4.9km cell
+    geo_tile_ttl_seconds: int = 6 * 3600  # How long a fetched tile is served without refetching
+    geo_tile_max_tiles: int = 2000  # LRU bound across all categories
+    geo_tile_max_query_tiles: int = 36  # Larger searches bypass the cache and query the circle directly
+
+    # Background warm-up of hot map areas; off by default because it spends Overpass quota at startup
+    map_prefetch_enabled: bool = False
+    map_prefetch_targets: str = "9.0192,38.7525,1000,hotel|restaurant|company;9.0192,38.7525,5000,hotel"  # "lat,lon,radius,cat1|cat2;..."
+    map_prefetch_interval_seconds: int = 3 * 3600  # Refresh period; keep it below geo_tile_ttl_seconds
+    map_prefetch_spacing_seconds: float = 5  # Pause between targets so warm-up never bursts the mirrors
+
+    # Offline OSM extract (serves map search without Overpass when set)
+    osm_extract_path: str = ""  # Overpass JSON dump or .pbf (needs the osmium package) of the city
+    osm_extract_refresh_seconds: int = 3600  # How often to check the extract for changes and reload it
+
+    # Bulk company insights
+    insights_batch_concurrency: int = 4  # Places processed at once per batch request
+    insights_batch_max_items: int = 200  # Largest batch accepted by /company/insights/batch
+
+    # Persistent company/hotel insights store (database)
+    insights_store_enabled: bool = True
+    insights_store_max_age_days: int = 30  # Regenerate stored insights older than this even if the place is unchanged
 
     # GitHub API settings
     github_token: str = ""
+    github_tokens: str = ""  # Comma-separated extra tokens; each call uses the one with the most quota left
+    github_rate_limit_reserve: int = 50  # Calls kept in hand per token before work queues for the reset
+    github_rate_limit_max_wait_seconds: float = 60  # Longest a call queues for quota before being sent anyway
+    github_max_connections: int = 20  # Pooled keep-alive connections to api.github.com
+    github_enrich_concurrency: int = 10  # Repos enriched at once per scoring request (two calls each)
+    github_portfolio_backend: str = "auto"  # "auto" uses one GraphQL query when a token is set, "rest" forces 1 + 2N REST calls
+    github_max_repos: int = 100  # Repos scored per user (GraphQL pages through up to this many)
+    github_two_phase_scoring: bool = True  # REST: skip README/languages for repos that can't reach the top `limit`
+    github_http_cache_enabled: bool = True  # Revalidate REST GETs with stored ETag/Last-Modified (304s cost no quota)
+    github_http_cache_max_entries: int = 5000  # In-memory LRU of validators and bodies in front of the database
+    github_http_cache_persist: bool = True  # Also keep them in the http_cache table (run add_http_cache_table.py)
 
     class Config:
         env_file = os.path.join(os.path.dirname(__file__), "../../.env")
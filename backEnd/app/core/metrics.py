@@ -0,0 +1,206 @@
+from __future__ import annotations
+
+import threading
+from typing import Callable, Dict, List, Sequence, Tuple
+
+# Outbound calls range from ~50ms (GitHub) to the 40s Overpass timeout
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labelnames: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], lock: threading.Lock):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = lock
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(*args)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def count(self, **labels: str) -> int:
+        counts = self._counts.get(self._key(labels))
+        return counts[-1] if counts else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, counts in sorted(self._counts.items()):
+            for bound, count in zip(self.buckets, counts):
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(self._sums[key])}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class MetricsRegistry:
+    """Minimal in-process metrics registry rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Callable[[], None]] = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames, self._lock)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        metric = Gauge(name, documentation, labelnames, self._lock)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, self._lock, buckets=buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def register_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback that refreshes gauges right before each scrape."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+OUTBOUND_DURATION = registry.histogram(
+    "hustlers_outbound_request_duration_seconds",
+    "Latency of outbound calls to third-party dependencies.",
+    ["service", "target"],
+)
+OUTBOUND_REQUESTS = registry.counter(
+    "hustlers_outbound_requests_total",
+    "Outbound calls by dependency, chosen target (model/mirror/endpoint), key and outcome.",
+    ["service", "target", "key", "outcome"],
+)
+OUTBOUND_RETRIES = registry.counter(
+    "hustlers_outbound_retries_total",
+    "Outbound attempts that retried a failed call on another key, model or mirror.",
+    ["service"],
+)
+OUTBOUND_RATE_LIMITED = registry.counter(
+    "hustlers_outbound_rate_limited_total",
+    "Outbound calls rejected with 429/RESOURCE_EXHAUSTED.",
+    ["service", "target"],
+)
+OUTBOUND_BYTES = registry.counter(
+    "hustlers_outbound_bytes_total",
+    "Payload bytes exchanged with third-party dependencies.",
+    ["service", "direction"],
+)
+
+
+def observe_call(
+    service: str,
+    target: str,
+    outcome: str,
+    duration: float,
+    bytes_sent: int = 0,
+    bytes_received: int = 0,
+    key: str = "",
+) -> None:
+    """Record one outbound call. `outcome` is "success", "rate_limited" or "error"."""
+    OUTBOUND_DURATION.observe(duration, service=service, target=target)
+    OUTBOUND_REQUESTS.inc(service=service, target=target, key=key, outcome=outcome)
+    if outcome == "rate_limited":
+        OUTBOUND_RATE_LIMITED.inc(service=service, target=target)
+    if bytes_sent:
+        OUTBOUND_BYTES.inc(bytes_sent, service=service, direction="sent")
+    if bytes_received:
+        OUTBOUND_BYTES.inc(bytes_received, service=service, direction="received")
+
+
+def record_retry(service: str) -> None:
+    OUTBOUND_RETRIES.inc(service=service)
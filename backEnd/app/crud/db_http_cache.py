@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import hashlib
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.http_cache import HttpCacheEntry
+
+
+def cache_key(method: str, url: str, accept: str = "") -> str:
+    """Responses differ by Accept (e.g. raw vs JSON README), so it is part of the key."""
+    return hashlib.sha256(f"{method.upper()} {url} {accept}".encode("utf-8")).hexdigest()
+
+
+def get_cached_response(db: Session, key: str) -> Optional[HttpCacheEntry]:
+    return db.query(HttpCacheEntry).filter_by(key=key).one_or_none()
+
+
+def save_cached_response(
+    db: Session,
+    key: str,
+    url: str,
+    body: bytes,
+    etag: Optional[str] = None,
+    last_modified: Optional[str] = None,
+    content_type: Optional[str] = None,
+) -> HttpCacheEntry:
+    """Insert or replace the cached body and validators for `key`."""
+    row = get_cached_response(db, key)
+    if row is None:
+        row = HttpCacheEntry(key=key)
+        db.add(row)
+    row.url = url
+    row.body = body
+    row.etag = etag
+    row.last_modified = last_modified
+    row.content_type = content_type
+    row.updated_at = datetime.now(timezone.utc)
+    try:
+        db.commit()
+        db.refresh(row)
+    except Exception:
+        db.rollback()
+        raise
+    return row
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+import hashlib
+import json
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.insight import CompanyInsight
+
+# Fields added by our own API (search/lead ranking, not OSM data); they vary per request
+VOLATILE_PLACE_FIELDS = {"distance_m", "category", "lead_score"}
+
+
+def strip_volatile_fields(place: Dict[str, Any]) -> Dict[str, Any]:
+    """The place as OSM describes it, without per-request ranking fields."""
+    return {k: v for k, v in place.items() if k not in VOLATILE_PLACE_FIELDS}
+
+
+def fingerprint_place(kind: str, label: str, place: Dict[str, Any]) -> str:
+    """Stable hash of the place data the model sees; changes whenever the tags change."""
+    data = strip_volatile_fields(place)
+    payload = json.dumps([kind, label, data], sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive datetimes even for timezone-aware columns
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def get_fresh_insight(
+    db: Session,
+    osm_type: str,
+    osm_id: int,
+    kind: str,
+    fingerprint: str,
+    max_age: timedelta,
+) -> Optional[Dict[str, Any]]:
+    """Stored insights for the place, if its data is unchanged and they are younger than max_age."""
+    row = db.query(CompanyInsight).filter_by(osm_type=osm_type, osm_id=osm_id, kind=kind).one_or_none()
+    if row is None or row.fingerprint != fingerprint:
+        return None
+    if _aware(row.updated_at) < datetime.now(timezone.utc) - max_age:
+        return None
+    return json.loads(row.insights)
+
+
+def save_insight(
+    db: Session,
+    osm_type: str,
+    osm_id: int,
+    kind: str,
+    fingerprint: str,
+    place: Dict[str, Any],
+    insights: Dict[str, Any],
+) -> CompanyInsight:
+    """Insert or replace the stored insights for (osm_type, osm_id, kind)."""
+    row = db.query(CompanyInsight).filter_by(osm_type=osm_type, osm_id=osm_id, kind=kind).one_or_none()
+    if row is None:
+        row = CompanyInsight(osm_type=osm_type, osm_id=osm_id, kind=kind)
+        db.add(row)
+    row.fingerprint = fingerprint
+    row.name = (place.get("name") or "")[:255]
+    row.latitude = place.get("latitude")
+    row.longitude = place.get("longitude")
+    row.insights = json.dumps(insights, ensure_ascii=False)
+    row.updated_at = datetime.now(timezone.utc)
+    try:
+        db.commit()
+        db.refresh(row)
+    except Exception:
+        db.rollback()
+        raise
+    return row
+
+
+def list_insights_in_bounds(
+    db: Session,
+    south: float,
+    west: float,
+    north: float,
+    east: float,
+    kind: Optional[str] = None,
+    limit: int = 500,
+) -> List[CompanyInsight]:
+    """Stored insights whose place lies inside the bounding box."""
+    query = db.query(CompanyInsight).filter(
+        CompanyInsight.latitude.between(south, north),
+        CompanyInsight.longitude.between(west, east),
+    )
+    if kind:
+        query = query.filter(CompanyInsight.kind == kind)
+    return query.order_by(CompanyInsight.updated_at.desc()).limit(limit).all()
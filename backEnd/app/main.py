@@ -1,12 +1,34 @@
 from fastapi import FastAPI, Depends, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from collections import defaultdict, deque
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import asyncio
 from sqlalchemy.orm import Session
 from app.crud.db_poster import sync_job_posts, get_all_jobs, get_db
 from app.api.v1.endpoints import telegram, map, resume, github
+from app.core.metrics import registry
+from app.services.github_service import github_service
+from app.services.map_prefetch import map_prefetcher
+from app.services.map_service import map_service
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Long-lived outbound HTTP pools: open once, reuse keep-alive connections across requests
+    await map_service.startup()
+    await github_service.startup()
+    # Warm the tile cache for the areas first-time users land on
+    map_prefetcher.start()
+    try:
+        yield
+    finally:
+        await map_prefetcher.stop()
+        await github_service.shutdown()
+        await map_service.shutdown()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Simple in-memory rate limiter (per IP)
 RATE_LIMIT_MAX_REQUESTS = 60
@@ -49,6 +71,11 @@ app.include_router(github.router, prefix="/api/v1/github", tags=["github"])
 def read_root():
     return {"message": "Hustlers API is running"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Outbound-call metrics (Gemini, Overpass, GitHub, Telegram) in Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 # List all jobs endpoint
 # @app.get("/api/jobs")
 # def list_jobs(db: Session = Depends(get_db)):
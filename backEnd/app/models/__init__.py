@@ -1 +1,3 @@
 from app.models.post import JobPost
+from app.models.insight import CompanyInsight
+from app.models.http_cache import HttpCacheEntry
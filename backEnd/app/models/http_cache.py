@@ -0,0 +1,19 @@
+from datetime import datetime
+from sqlalchemy import DateTime, LargeBinary, String, Text, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+
+class HttpCacheEntry(Base):
+    __tablename__ = "http_cache"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    key: Mapped[str] = mapped_column(String(64), nullable=False, unique=True)  # sha256 of method, URL and Accept header
+    url: Mapped[str] = mapped_column(Text, nullable=False)
+    etag: Mapped[str] = mapped_column(String(255), nullable=True)
+    last_modified: Mapped[str] = mapped_column(String(64), nullable=True)
+    content_type: Mapped[str] = mapped_column(String(255), nullable=True)
+    body: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()
+    )
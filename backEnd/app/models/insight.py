@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import BigInteger, DateTime, Float, Index, String, Text, UniqueConstraint, func
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+
+class CompanyInsight(Base):
+    __tablename__ = "company_insights"
+    __table_args__ = (
+        # OSM ids are only unique per element type (node/way/relation)
+        UniqueConstraint("osm_type", "osm_id", "kind", name="uq_company_insights_osm_type_osm_id_kind"),
+        Index("ix_company_insights_location", "latitude", "longitude"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    osm_type: Mapped[str] = mapped_column(String(16), nullable=False, default="node")  # "node", "way" or "relation"
+    osm_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False, default="company")  # "company" or "hotel"
+    fingerprint: Mapped[str] = mapped_column(String(64), nullable=False)  # sha256 of the place data sent to the model
+    name: Mapped[str] = mapped_column(String(255), nullable=False, default="")
+    latitude: Mapped[float] = mapped_column(Float, nullable=True)
+    longitude: Mapped[float] = mapped_column(Float, nullable=True)
+    insights: Mapped[str] = mapped_column(Text, nullable=False)  # JSON payload as returned by the API
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), nullable=False, server_default=func.now(), onupdate=func.now()
+    )
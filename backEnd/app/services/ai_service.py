@@ -1,27 +1,112 @@
-from typing import List, Optional
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 import json
 import asyncio
-from google import genai
+import re
+import time
 from app.core.config import settings
+from app.core.metrics import observe_call, record_retry, registry
+from app.services.key_scheduler import KeyScheduler, key_scheduler, mask_key, parse_retry_after
+from app.services.llm_backends import LLMBackend, llm_backend
+from app.services.llm_cache import LLMCache, llm_cache
+
+JOB_FIELDS = ["jobname", "jobtype", "price", "expierdate", "jobdescrbiton"]
+
+# JobPost field -> key produced by fetch_afriworkamharic.formater
+FORMATTED_JOB_LABELS = {
+    "jobname": "job_title",
+    "jobtype": "job_type",
+    "price": "salary",
+    "expierdate": "deadline",
+    "jobdescrbiton": "description",
+}
+
+# Ethiopic script blocks (Amharic posts)
+ETHIOPIC_PATTERN = re.compile(r"[\u1200-\u139F\u2D80-\u2DDF\uAB00-\uAB2F]")
+
+JOB_EXTRACTION_PROMPT = (
+    "Extract job data from the user input and return STRICT JSON only. "
+    "No markdown, no extra text. Use these keys: "
+    "jobname, jobtype, price, expierdate, jobdescrbiton. jobdescrbiton should explain the job description very well. "
+    "use english for all the fields. even if its in amharic or any other language, translate it to english."
+    "If a field is missing, use an empty string."
+)
+
+BATCH_JOB_EXTRACTION_PROMPT = (
+    "The input is a JSON array of job posts, each with a deep_link and a text. "
+    "Extract job data from EVERY post and return a STRICT JSON array only, with one object per post. "
+    "No markdown, no extra text. Each object must have these keys: "
+    "deep_link, jobname, jobtype, price, expierdate, jobdescrbiton. "
+    "deep_link must be copied unchanged from the post it describes. "
+    "jobdescrbiton should explain the job description very well. "
+    "use english for all the fields. even if its in amharic or any other language, translate it to english."
+    "If a field is missing, use an empty string."
+)
+
+MISSING_KEY_MESSAGE = "Gemini API key is missing. Set GEMINI_API_KEY or GEMINI_API_KEYS in your .env file."
+
+# Placeholder key for backends that do not authenticate (keeps per-key scheduling uniform)
+LOCAL_KEY = "local"
+
+
+def _is_quota_error(error_str: str) -> bool:
+    return "429" in error_str or "RESOURCE_EXHAUSTED" in error_str
+
+
+def extract_job_by_rules(post: Dict) -> Optional[Dict]:
+    """
+    Map formater output straight to JobPost fields without calling the model.
+
+    Only posts where every labelled field is present and written in English qualify;
+    anything else (missing labels, Amharic text) returns None and goes to Gemini.
+    """
+    job: Dict[str, str] = {}
+    for field, label in FORMATTED_JOB_LABELS.items():
+        value = (post.get(label) or "").strip()
+        if not value or ETHIOPIC_PATTERN.search(value):
+            return None
+        job[field] = value
+    return job
+
 
 class AIService:
-    def __init__(self, model_name: str = "models/gemini-2.5-flash"):
+    def __init__(
+        self,
+        model_name: str = "models/gemini-2.5-flash",
+        max_concurrency: Optional[int] = None,
+        cache: Optional[LLMCache] = None,
+        scheduler: Optional[KeyScheduler] = None,
+        backend: Optional[LLMBackend] = None,
+    ):
         self.model_name = model_name
-        self._client: Optional[genai.Client] = None
+        self._backend = backend if backend is not None else llm_backend
+        # Cache keys use the requested model, not whichever one the scheduler picks
+        self.default_model = model_name
+        self._cache = cache if cache is not None else llm_cache
+        self._cache.set_ttl(JOB_EXTRACTION_PROMPT, settings.llm_cache_job_ttl_seconds)
+        self._scheduler = scheduler if scheduler is not None else key_scheduler
         self._api_keys: List[str] = self._load_api_keys()
-        self._api_key_index = 0
+        if not self._api_keys and not self._backend.requires_api_key:
+            self._api_keys = [LOCAL_KEY]
 
-        # Available models for rotation
+        # Available text models, in preference order (the requested model first)
         self._models = [
             "models/gemini-2.5-flash",
             "models/gemini-2.5-flash-lite", 
-            "models/gemini-2.5-flash-preview-tts",
             "models/gemini-3-flash-preview"
         ]
-        self._model_index = 0
+        if model_name in self._models:
+            self._models.remove(model_name)
+        self._models.insert(0, model_name)
+
+        # Caps in-flight async Gemini calls so a burst of insight requests
+        # cannot monopolise the worker's outbound connections.
+        self._semaphore = asyncio.Semaphore(max_concurrency or settings.gemini_max_concurrency)
 
-        if self._api_keys:
-            self._configure_current_key()
+        # Recent successful call latencies and counters used to size and budget hedges
+        self._latencies: Deque[float] = deque(maxlen=200)
+        self._requests_sent = 0
+        self._hedges_sent = 0
 
     def _load_api_keys(self) -> List[str]:
         keys = []
@@ -39,99 +124,488 @@ class AIService:
                 unique_keys.append(key)
         return unique_keys
 
-    def _configure_current_key(self) -> Optional[str]:
-        if not self._api_keys:
-            self._client = None
-            return None
-        key = self._api_keys[self._api_key_index]
-        try:
-            self._client = genai.Client(api_key=key)
-            return key
-        except Exception:
-            self._client = None
-            return None
-    def _rotate_model(self) -> str:
-        """Rotate to the next available model"""
-        self._model_index = (self._model_index + 1) % len(self._models)
-        self.model_name = self._models[self._model_index]
-        return self.model_name
-    def _rotate_key(self) -> Optional[str]:
-        if not self._api_keys:
-            return None     
-        self._api_key_index = (self._api_key_index + 1) % len(self._api_keys)
-        return self._configure_current_key()
+    def _build_prompt(self, user_input: str, prompt_template: Optional[str] = None) -> str:
+        return f"{prompt_template or JOB_EXTRACTION_PROMPT}\n\nInput:\n{user_input}"
+
+    def _parse_response_text(self, raw_text: Optional[str]) -> str:
+        text = (raw_text or "").strip()
+        # Remove markdown code blocks if present
+        if text.startswith("```json"):
+            text = text[7:]
+        if text.endswith("```"):
+            text = text[:-3]
+        text = text.strip()
+
+        parsed = json.loads(text)
+        return json.dumps(parsed, ensure_ascii=False)
+
+    def _cached(self, user_input: str, prompt_template: Optional[str]) -> Optional[str]:
+        return self._cache.get(self.default_model, prompt_template or JOB_EXTRACTION_PROMPT, user_input)
+
+    def _remember(self, user_input: str, prompt_template: Optional[str], result: str, ttl: Optional[float]) -> None:
+        self._cache.set(self.default_model, prompt_template or JOB_EXTRACTION_PROMPT, user_input, result, ttl=ttl)
+
+    # Async paths use these so the cache's SQLite tier never runs on the event loop
+    async def _acached(self, user_input: str, prompt_template: Optional[str]) -> Optional[str]:
+        return await self._cache.aget(self.default_model, prompt_template or JOB_EXTRACTION_PROMPT, user_input)
+
+    async def _aremember(
+        self, user_input: str, prompt_template: Optional[str], result: str, ttl: Optional[float]
+    ) -> None:
+        await self._cache.aset(self.default_model, prompt_template or JOB_EXTRACTION_PROMPT, user_input, result, ttl=ttl)
+
+    def _observe(self, key: str, model: str, outcome: str, started: float, prompt: str, text: Optional[str] = "") -> None:
+        observe_call(
+            self._backend.name,
+            model,
+            outcome,
+            time.perf_counter() - started,
+            bytes_sent=len(prompt.encode("utf-8")),
+            bytes_received=len((text or "").encode("utf-8")),
+            key=mask_key(key),
+        )
+
+    def _max_retries(self) -> int:
+        return min(len(self._api_keys) * len(self._models), 10)  # Don't try more than available keys
+
+    def _exhausted(self, last_error: Optional[str]) -> str:
+        if last_error is None:
+            return json.dumps({"error": "All API keys and models are cooling down"}, ensure_ascii=False)
+        return json.dumps({"error": f"All API keys and models exhausted. Last error: {last_error}"}, ensure_ascii=False)
 
-    def respond_to_input(self, user_input: str, prompt_template: Optional[str] = None) -> str:
+    def respond_to_input(
+        self,
+        user_input: str,
+        prompt_template: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+    ) -> str:
         """
         Takes a user input and returns a Gemini-generated response.
 
         Args:
             user_input (str): The input provided by the user.
             prompt_template (Optional[str]): Custom prompt template. If provided, user_input will be appended.
+            cache_ttl (Optional[float]): Seconds to cache the response for. Defaults to the TTL
+                registered for the template on the cache.
 
         Returns:
             str: The AI's response.
         """
-        if not self._client:
-            return "Gemini API key is missing. Set GEMINI_API_KEY or GEMINI_API_KEYS in your .env file."
+        cached = self._cached(user_input, prompt_template)
+        if cached is not None:
+            return cached
 
-        if prompt_template:
-            prompt = f"{prompt_template}\n\nInput:\n{user_input}"
-        else:
-            prompt = (
-                "Extract job data from the user input and return STRICT JSON only. "
-                "No markdown, no extra text. Use these keys: "
-                "jobname, jobtype, price, expierdate, jobdescrbiton. jobdescrbiton should explain the job description very well. "
-                "use english for all the fields. even if its in amharic or any other language, translate it to english."
-                "If a field is missing, use an empty string.\n\n"
-                f"Input:\n{user_input}"
-            )
+        if not self._api_keys:
+            return MISSING_KEY_MESSAGE
+
+        prompt = self._build_prompt(user_input, prompt_template)
+        last_error = None
 
-        # Try with current key, and retry with other keys if quota exceeded
-        max_retries = min(len(self._api_keys) * len(self._models), 10)  # Don't try more than available keys
-        
-        for attempt in range(max_retries):
+        # Each attempt goes to the healthiest (key, model) pair; 429s cool that pair down
+        for attempt in range(self._max_retries()):
+            pair = self._scheduler.acquire(self._api_keys, self._models)
+            if pair is None:
+                break
+            key, model = pair
+            if attempt:
+                record_retry(self._backend.name)
+            started = time.perf_counter()
+            response = None
             try:
-                response = self._client.models.generate_content(
-                    model=self.model_name,
-                    contents=prompt
-                )
-                # Only rotate on success after getting a response
-                if attempt == 0:  # Only rotate if this was the first attempt
-                    self._rotate_key()
-                    self._rotate_model()
-                    # Reconfigure client with new key
-                    self._configure_current_key()
-
-                text = (response.text or "").strip()
-                # Remove markdown code blocks if present
-                if text.startswith("```json"):
-                    text = text[7:]
-                if text.endswith("```"):
-                    text = text[:-3]
-                text = text.strip()
-
-                parsed = json.loads(text)
-                return json.dumps(parsed, ensure_ascii=False)
-                
+                response = self._backend.generate(key, model, prompt)
+                self._observe(key, model, "success", started, prompt, response)
+                self._scheduler.report_success(key, model)
+
+                result = self._parse_response_text(response)
+                self._remember(user_input, prompt_template, result, cache_ttl)
+                return result
+
             except Exception as e:
                 error_str = str(e)
-                if "429" in error_str or "RESOURCE_EXHAUSTED" in error_str:
-                    # Rotate to next key and retry
-                    if attempt < max_retries - 1:  # Don't rotate on last attempt
-                        self._rotate_key()
-                        self._rotate_model()
-                        # Reconfigure client with new key
-                        self._configure_current_key()
+                if _is_quota_error(error_str):
+                    self._observe(key, model, "rate_limited", started, prompt)
+                    self._scheduler.report_rate_limited(key, model, parse_retry_after(error_str))
+                    last_error = error_str
+                    continue
+                if response is None:
+                    self._observe(key, model, "error", started, prompt)
+                # Non-quota error, return immediately
+                return json.dumps({"error": error_str}, ensure_ascii=False)
+
+        return self._exhausted(last_error)
+
+    async def arespond_to_input(
+        self,
+        user_input: str,
+        prompt_template: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        hedge: bool = False,
+        validator: Optional[Callable[[Any], bool]] = None,
+    ) -> str:
+        """
+        Awaitable version of respond_to_input built on the async backend API.
+
+        Use this from request handlers so a slow Gemini call does not block the
+        event loop. At most `gemini_max_concurrency` calls run at once per process.
+        When every (key, model) pair is cooling down, the call waits for the first
+        one to recover, up to `gemini_max_queue_wait` seconds.
+
+        With `hedge=True`, a second request is sent to a different model if the first
+        has not answered by the hedge deadline; the first response that parses (and
+        passes `validator`, which receives the decoded JSON) wins and the other is cancelled.
+        """
+        cached = await self._acached(user_input, prompt_template)
+        # Entries cached before validation was enforced may not pass; treat them as a miss
+        if cached is not None and self._is_acceptable(True, cached, validator):
+            return cached
+
+        if not self._api_keys:
+            return MISSING_KEY_MESSAGE
+
+        prompt = self._build_prompt(user_input, prompt_template)
+        self._requests_sent += 1
+        if hedge and len(self._models) > 1:
+            ok, result = await self._ahedged_call(prompt, validator)
+        else:
+            ok, result = await self._acall(prompt)
+
+        # Only answers the caller would accept are cached; a rejected (or hedging
+        # fallback) answer must not be replayed for the whole TTL
+        if self._is_acceptable(ok, result, validator):
+            await self._aremember(user_input, prompt_template, result, cache_ttl)
+        return result
+
+    async def _acall(
+        self,
+        prompt: str,
+        exclude_models: Sequence[str] = (),
+        max_wait: Optional[float] = None,
+        dispatched: Optional[Dict[str, str]] = None,
+    ) -> Tuple[bool, str]:
+        """
+        Run one logical request with retries across (key, model) pairs.
+
+        Returns (ok, text): ok is True when `text` is the model's parsed JSON, False when
+        it is an error payload. The chosen model is written to `dispatched` if given.
+        """
+        max_retries = self._max_retries()
+        last_error = None
+        wait = settings.gemini_max_queue_wait if max_wait is None else max_wait
+        deadline = asyncio.get_running_loop().time() + wait
+
+        async with self._semaphore:
+            for attempt in range(max_retries):
+                pair = await self._aacquire(deadline, exclude_models)
+                if pair is None:
+                    break
+                key, model = pair
+                if dispatched is not None:
+                    dispatched["model"] = model
+                if attempt:
+                    record_retry(self._backend.name)
+                started = time.perf_counter()
+                response = None
+                try:
+                    response = await self._backend.agenerate(key, model, prompt)
+                    self._observe(key, model, "success", started, prompt, response)
+                    self._latencies.append(time.perf_counter() - started)
+                    self._scheduler.report_success(key, model)
+
+                    return True, self._parse_response_text(response)
+
+                except Exception as e:
+                    error_str = str(e)
+                    if _is_quota_error(error_str):
+                        self._observe(key, model, "rate_limited", started, prompt)
+                        self._scheduler.report_rate_limited(key, model, parse_retry_after(error_str))
+                        last_error = error_str
                         continue
-                    else:
-                        # Last attempt failed, return error
-                        return json.dumps({"error": f"All API keys and models exhausted. Last error: {error_str}"}, ensure_ascii=False)
-                else:
-                    # Non-quota error, return immediately
-                    return json.dumps({"error": error_str}, ensure_ascii=False)
-        
-        return json.dumps({"error": "Max retries exceeded"}, ensure_ascii=False)
+                    if response is None:
+                        self._observe(key, model, "error", started, prompt)
+                    return False, json.dumps({"error": error_str}, ensure_ascii=False)
+
+        return False, self._exhausted(last_error)
+
+    def _hedge_delay(self) -> float:
+        """Seconds to wait for the primary before hedging: the configured latency percentile."""
+        floor = settings.gemini_hedge_min_delay
+        if len(self._latencies) < 20:
+            return floor
+        ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(settings.gemini_hedge_percentile * len(ordered)))
+        return max(floor, ordered[index])
+
+    def _hedge_allowed(self) -> bool:
+        # Hedges may never exceed the configured fraction of requests sent
+        return self._hedges_sent + 1 <= settings.gemini_hedge_budget * self._requests_sent
+
+    def _is_acceptable(self, ok: bool, text: str, validator: Optional[Callable[[Any], bool]]) -> bool:
+        if not ok:
+            return False
+        if validator is None:
+            return True
+        try:
+            return bool(validator(json.loads(text)))
+        except Exception:
+            return False
+
+    async def _ahedged_call(
+        self,
+        prompt: str,
+        validator: Optional[Callable[[Any], bool]] = None,
+    ) -> Tuple[bool, str]:
+        dispatched: Dict[str, str] = {}
+        primary = asyncio.ensure_future(self._acall(prompt, dispatched=dispatched))
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self._hedge_delay())
+            if done or not self._hedge_allowed():
+                return await primary
+
+            self._hedges_sent += 1
+            HEDGED_REQUESTS.inc()
+            # The backup goes to another model and never queues for quota
+            backup = asyncio.ensure_future(
+                self._acall(prompt, exclude_models=[dispatched.get("model", self.model_name)], max_wait=0)
+            )
+            tasks.append(backup)
+            pending = set(tasks)
+            fallback: Optional[Tuple[bool, str]] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    ok, text = task.result()
+                    if self._is_acceptable(ok, text, validator):
+                        if task is backup:
+                            HEDGE_WINS.inc()
+                        return ok, text
+                    if fallback is None or (ok and not fallback[0]):
+                        fallback = (ok, text)
+            return fallback
+        finally:
+            # Cancel the loser (or everything, if our caller went away)
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def astream_response(
+        self,
+        user_input: str,
+        prompt_template: Optional[str] = None,
+        cache_ttl: Optional[float] = None,
+        validator: Optional[Callable[[Any], bool]] = None,
+    ) -> AsyncIterator[Tuple[str, str]]:
+        """
+        Stream a Gemini response as it is generated.
+
+        Yields ("delta", text) for every chunk the model produces, then exactly one
+        ("result", text) holding the same JSON string arespond_to_input would return.
+        A quota error is only retried on another pair if nothing has been streamed yet.
+        As with arespond_to_input, only results that pass `validator` are cached.
+        """
+        cached = await self._acached(user_input, prompt_template)
+        if cached is not None and self._is_acceptable(True, cached, validator):
+            yield ("result", cached)
+            return
+
+        if not self._api_keys:
+            yield ("result", MISSING_KEY_MESSAGE)
+            return
+
+        prompt = self._build_prompt(user_input, prompt_template)
+        last_error = None
+        deadline = asyncio.get_running_loop().time() + settings.gemini_max_queue_wait
+
+        async with self._semaphore:
+            for attempt in range(self._max_retries()):
+                pair = await self._aacquire(deadline)
+                if pair is None:
+                    break
+                key, model = pair
+                if attempt:
+                    record_retry(self._backend.name)
+                started = time.perf_counter()
+                streamed = False
+                chunks: List[str] = []
+                try:
+                    async for text in self._backend.astream(key, model, prompt):
+                        if text:
+                            chunks.append(text)
+                            yield ("delta", text)
+                    streamed = True
+                    self._observe(key, model, "success", started, prompt, "".join(chunks))
+                    self._scheduler.report_success(key, model)
+
+                    result = self._parse_response_text("".join(chunks))
+                    if self._is_acceptable(True, result, validator):
+                        await self._aremember(user_input, prompt_template, result, cache_ttl)
+                    yield ("result", result)
+                    return
+
+                except Exception as e:
+                    error_str = str(e)
+                    if _is_quota_error(error_str) and not chunks:
+                        self._observe(key, model, "rate_limited", started, prompt)
+                        self._scheduler.report_rate_limited(key, model, parse_retry_after(error_str))
+                        last_error = error_str
+                        continue
+                    if not streamed:
+                        self._observe(key, model, "error", started, prompt, "".join(chunks))
+                    yield ("result", json.dumps({"error": error_str}, ensure_ascii=False))
+                    return
+
+        yield ("result", self._exhausted(last_error))
+
+    async def _aacquire(self, deadline: float, exclude_models: Sequence[str] = ()) -> Optional[Tuple[str, str]]:
+        """Wait for a (key, model) pair to become available, giving up at `deadline` (loop time)."""
+        loop = asyncio.get_running_loop()
+        models = [m for m in self._models if m not in exclude_models]
+        if not models:
+            return None
+        while True:
+            pair = self._scheduler.acquire(self._api_keys, models)
+            if pair is not None:
+                return pair
+            wait = self._scheduler.next_available_in(self._api_keys, models)
+            if loop.time() + wait > deadline:
+                return None
+            await asyncio.sleep(wait)
+
+    def _estimate_tokens(self, text: str) -> int:
+        # Rough heuristic (~4 chars per token); good enough for packing batches.
+        return len(text) // 4 + 1
+
+    def _pack_job_batches(self, posts: List[Dict], token_budget: int, max_posts: int) -> List[List[Dict]]:
+        batches: List[List[Dict]] = []
+        current: List[Dict] = []
+        used = self._estimate_tokens(BATCH_JOB_EXTRACTION_PROMPT)
+        for post in posts:
+            cost = self._estimate_tokens(post.get("text") or "")
+            if current and (used + cost > token_budget or len(current) >= max_posts):
+                batches.append(current)
+                current = []
+                used = self._estimate_tokens(BATCH_JOB_EXTRACTION_PROMPT)
+            current.append(post)
+            used += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    def _is_valid_job(self, item: Dict) -> bool:
+        return isinstance(item, dict) and all(isinstance(item.get(k), str) for k in JOB_FIELDS)
+
+    def _load_cached_job(self, cached: str) -> Optional[Dict]:
+        # Anything that is not a JSON object (e.g. an array cached by an older build) is a miss
+        try:
+            item = json.loads(cached)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
+
+    async def _aextract_single_job(self, post: Dict) -> Dict:
+        response_text = await self.arespond_to_input(
+            post.get("text") or "", validator=lambda item: isinstance(item, dict)
+        )
+        try:
+            parsed = json.loads(response_text)
+        except json.JSONDecodeError:
+            parsed = {"error": response_text}
+        if not isinstance(parsed, dict):
+            parsed = {"error": f"Unexpected AI response: {response_text}"}
+        parsed["deep_link"] = post.get("deep_link")
+        return parsed
+
+    async def _aextract_job_batch(self, batch: List[Dict]) -> List[Dict]:
+        if len(batch) == 1:
+            return [await self._aextract_single_job(batch[0])]
+
+        batch_input = json.dumps(
+            [{"deep_link": post["deep_link"], "text": post.get("text") or ""} for post in batch],
+            ensure_ascii=False,
+        )
+        response_text = await self.arespond_to_input(batch_input, prompt_template=BATCH_JOB_EXTRACTION_PROMPT)
+
+        by_link: Dict[str, Dict] = {}
+        try:
+            items = json.loads(response_text)
+        except json.JSONDecodeError:
+            items = []
+        if isinstance(items, list):
+            for item in items:
+                if self._is_valid_job(item) and isinstance(item.get("deep_link"), str):
+                    by_link[item["deep_link"]] = {k: item[k] for k in JOB_FIELDS}
+
+        results: List[Optional[Dict]] = []
+        fallbacks = []
+        for post in batch:
+            item = by_link.get(post["deep_link"])
+            if item is None:
+                fallbacks.append((len(results), post))
+                results.append(None)
+            else:
+                # Cache per post so re-ingesting the same text skips the model
+                await self._aremember(post.get("text") or "", None, json.dumps(item, ensure_ascii=False), None)
+                item["deep_link"] = post["deep_link"]
+                results.append(item)
+
+        # Anything the batch call dropped or mangled gets its own request
+        retried = await asyncio.gather(*(self._aextract_single_job(post) for _, post in fallbacks))
+        for (index, _), item in zip(fallbacks, retried):
+            results[index] = item
+        return results
+
+    async def aextract_jobs(
+        self,
+        posts: List[Dict],
+        token_budget: Optional[int] = None,
+        max_posts: Optional[int] = None,
+    ) -> List[Dict]:
+        """
+        Extract job data for many Telegram posts using as few Gemini calls as possible.
+
+        Posts (dicts with "deep_link" and "text") are packed into batches bounded by
+        `token_budget` input tokens and sent as a single prompt per batch. The model
+        answers with a JSON array keyed by deep_link, which is split back into one dict
+        per post. Items that are missing or fail validation fall back to a single-post call.
+
+        Returns:
+            List[Dict]: One result per input post, in the same order. Failed posts
+            contain an "error" key.
+        """
+        token_budget = token_budget or settings.gemini_batch_token_budget
+        max_posts = max_posts or settings.gemini_batch_max_posts
+
+        by_id = {}
+        # Only posts with a unique deep_link can be matched back from a batch answer
+        seen = set()
+        batchable: List[Dict] = []
+        singles: List[Dict] = []
+        cached_entries = await asyncio.gather(*(self._acached(post.get("text") or "", None) for post in posts))
+        for post, cached in zip(posts, cached_entries):
+            item = self._load_cached_job(cached) if cached is not None else None
+            if item is not None:
+                item["deep_link"] = post.get("deep_link")
+                by_id[id(post)] = item
+                continue
+            link = post.get("deep_link")
+            if link and link not in seen:
+                seen.add(link)
+                batchable.append(post)
+            else:
+                singles.append(post)
+
+        batches = self._pack_job_batches(batchable, token_budget, max_posts)
+        batch_results, single_results = await asyncio.gather(
+            asyncio.gather(*(self._aextract_job_batch(batch) for batch in batches)),
+            asyncio.gather(*(self._aextract_single_job(post) for post in singles)),
+        )
+
+        for batch, results in zip(batches, batch_results):
+            for post, result in zip(batch, results):
+                by_id[id(post)] = result
+        for post, result in zip(singles, single_results):
+            by_id[id(post)] = result
+        return [by_id[id(post)] for post in posts]
 
     def list_available_models(self) -> List[str]:
         """
@@ -140,53 +614,97 @@ class AIService:
         Returns:
             List[str]: A list of model names.
         """
-        if not self._client:
-            return ["Gemini API key is missing. Set GEMINI_API_KEY or GEMINI_API_KEYS in your .env file."]
+        if not self._api_keys:
+            return [MISSING_KEY_MESSAGE]
 
         try:
-            models = self._client.models.list()
-            return [model.name for model in models]
+            return self._backend.list_models(self._api_keys[0])
         except Exception as e:
             return [f"Error listing models: {str(e)}"]
 
     def debug_key_state(self) -> dict:
         """Return non-sensitive info about loaded API keys for debugging."""
-        masked_keys = []
-        for key in self._api_keys:
-            if len(key) <= 8:
-                masked_keys.append("****")
-            else:
-                masked_keys.append(f"{key[:4]}...{key[-4:]}")
         return {
             "keys_loaded": len(self._api_keys),
-            "active_index": self._api_key_index if self._api_keys else None,
-            "masked_keys": masked_keys,
+            "masked_keys": [mask_key(key) for key in self._api_keys],
             "model_name": self.model_name,
+            "backend": self._backend.name,
+            "scheduler": self._scheduler.state(),
+            "hedges_sent": self._hedges_sent,
+            "requests_sent": self._requests_sent,
+            "cache": self._cache.stats(),
         }
 
-# async def res():
-#     from app.services.singelgroup import fetch_afriworkamharic
-#     service = AIService()
-#     try:
-#         ls = await fetch_afriworkamharic.main()
-#     except Exception as e:
-#         print(f"Error fetching posts: {e}")
-#         return []
-        
-#     posts = []
-#     for post in ls:
-#         response_text = service.respond_to_input(post['text'])
-#         try:
-#             if "error" in response_text:
-#                 continue
-#             response = json.loads(response_text)
-#             response["deep_link"] = post.get("deep_link")
-#             response["date"] = post.get("date")
-#             posts.append(response)
-#             print(response)
-#         except json.JSONDecodeError:
-#             print(f"Failed to parse AI response: {response_text}")
-#     return posts
+
+# Global instance
+ai_service = AIService()
+
+_LLM_CACHE_LOOKUPS = registry.gauge(
+    "hustlers_llm_cache_lookups", "LLM response cache lookups since start, by result.", ["result"]
+)
+HEDGED_REQUESTS = registry.counter(
+    "hustlers_gemini_hedged_requests_total", "Backup Gemini requests fired because the primary was slow."
+)
+HEDGE_WINS = registry.counter(
+    "hustlers_gemini_hedge_wins_total", "Hedged requests where the backup answered first."
+)
+JOB_EXTRACTIONS = registry.counter(
+    "hustlers_job_extractions_total", "Job posts extracted, by path (rules skip the model).", ["path"]
+)
+_LLM_CACHE_ENTRIES = registry.gauge("hustlers_llm_cache_entries", "Entries in the in-memory LLM cache.")
+
+
+def _collect_llm_cache_metrics() -> None:
+    stats = ai_service._cache.stats()
+    _LLM_CACHE_LOOKUPS.set(stats["hits"] - stats["disk_hits"], result="memory_hit")
+    _LLM_CACHE_LOOKUPS.set(stats["disk_hits"], result="disk_hit")
+    _LLM_CACHE_LOOKUPS.set(stats["misses"], result="miss")
+    _LLM_CACHE_ENTRIES.set(stats["entries"])
+
+
+registry.register_collector(_collect_llm_cache_metrics)
+
+
+def _post_text(post: Dict) -> str:
+    return "\n".join(f"{key}: {value}" for key, value in post.items() if key != "deeplink" and value)
+
+
+async def res():
+    from app.services.singel_group_services import fetch_afriworkamharic
+    service = ai_service
+    try:
+        ls = await fetch_afriworkamharic.main()
+    except Exception as e:
+        print(f"Error fetching posts: {e}")
+        return []
+
+    posts = []
+    inputs = []
+    for post in ls:
+        job = extract_job_by_rules(post)
+        if job is None:
+            inputs.append({"deep_link": post.get("deeplink"), "text": _post_text(post), "date": post.get("date")})
+            continue
+        job["deep_link"] = post.get("deeplink")
+        job["date"] = post.get("date")
+        posts.append(job)
+
+    JOB_EXTRACTIONS.inc(len(posts), path="rules")
+    JOB_EXTRACTIONS.inc(len(inputs), path="model")
+    if ls:
+        print(
+            f"Rule-based extraction handled {len(posts)}/{len(ls)} posts "
+            f"({len(posts) / len(ls):.0%}); {len(inputs)} sent to the model"
+        )
+
+    responses = await service.aextract_jobs(inputs)
+    for post, response in zip(inputs, responses):
+        if "error" in response:
+            print(f"Failed to extract job from {post['deep_link']}: {response['error']}")
+            continue
+        response["date"] = post.get("date")
+        posts.append(response)
+    return posts
 
 if __name__ == "__main__":
     asyncio.run(res())
@@ -0,0 +1,162 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+EARTH_RADIUS_M = 6371000.0
+
+
+def geohash_encode(lat: float, lon: float, precision: int) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        rng, coord = (lon_range, lon) if even else (lat_range, lat)
+        mid = (rng[0] + rng[1]) / 2
+        value <<= 1
+        if coord >= mid:
+            value |= 1
+            rng[0] = mid
+        else:
+            rng[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(GEOHASH_ALPHABET[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+
+def geohash_bounds(tile: str) -> Tuple[float, float, float, float]:
+    """Return (south, west, north, east) of a geohash cell."""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in tile:
+        value = GEOHASH_ALPHABET.index(char)
+        for shift in range(4, -1, -1):
+            rng = lon_range if even else lat_range
+            mid = (rng[0] + rng[1]) / 2
+            if value >> shift & 1:
+                rng[0] = mid
+            else:
+                rng[1] = mid
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def haversine_many(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """Distances in metres from (lat, lon) to every point of `lats`/`lons` in one vectorized pass."""
+    phi1 = np.radians(lat)
+    phi2 = np.radians(lats)
+    dphi = phi2 - phi1
+    dlambda = np.radians(lons - lon)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def tiles_covering(lat: float, lon: float, radius_m: float, precision: int) -> List[str]:
+    """Geohash cells that intersect the bounding box of the circle (lat, lon, radius_m)."""
+    dlat = math.degrees(radius_m / EARTH_RADIUS_M)
+    dlon = math.degrees(radius_m / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+    south, west, north, east = lat - dlat, lon - dlon, lat + dlat, lon + dlon
+
+    s, w, n, e = geohash_bounds(geohash_encode(south, west, precision))
+    cell_height, cell_width = n - s, e - w
+    tiles = []
+    cell_lat = s + cell_height / 2
+    while cell_lat - cell_height / 2 <= north:
+        cell_lon = w + cell_width / 2
+        while cell_lon - cell_width / 2 <= east:
+            tile = geohash_encode(cell_lat, cell_lon, precision)
+            if tile not in tiles:
+                tiles.append(tile)
+            cell_lon += cell_width
+        cell_lat += cell_height
+    return tiles
+
+
+def union_bounds(tiles: List[str]) -> Tuple[float, float, float, float]:
+    bounds = [geohash_bounds(tile) for tile in tiles]
+    return (
+        min(b[0] for b in bounds),
+        min(b[1] for b in bounds),
+        max(b[2] for b in bounds),
+        max(b[3] for b in bounds),
+    )
+
+
+class TileCache:
+    """
+    LRU + TTL cache of Overpass results per (category, geohash tile).
+
+    A tile stores every place of that category inside the cell, so any radius query
+    can be answered by merging the covering tiles and filtering by distance.
+    """
+
+    def __init__(self, max_tiles: int = 2000, ttl: float = 21600):
+        self.max_tiles = max_tiles
+        self.ttl = ttl
+        self._tiles: "OrderedDict[Tuple[str, str], Tuple[float, List[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, category: str, tile: str) -> Optional[List[Dict]]:
+        key = (category, tile)
+        with self._lock:
+            entry = self._tiles.get(key)
+            if entry is not None:
+                expires_at, places = entry
+                if expires_at > time.time():
+                    self._tiles.move_to_end(key)
+                    self.hits += 1
+                    return places
+                del self._tiles[key]
+            self.misses += 1
+            return None
+
+    def put(self, category: str, tile: str, places: List[Dict]) -> None:
+        key = (category, tile)
+        with self._lock:
+            self._tiles[key] = (time.time() + self.ttl, places)
+            self._tiles.move_to_end(key)
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "tiles": len(self._tiles),
+        }
+
+
+# Global instance
+tile_cache = TileCache(max_tiles=settings.geo_tile_max_tiles, ttl=settings.geo_tile_ttl_seconds)
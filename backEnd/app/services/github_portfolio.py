@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+
+if TYPE_CHECKING:
+    from app.services.github_service import GitHubService
+
+# (repo in REST listing shape, languages {name: bytes}, README text)
+RepoBundle = Tuple[Dict, Dict[str, int], str]
+
+# README names tried in order; GraphQL can only read a blob by exact path
+README_PATHS = ["README.md", "readme.md", "Readme.md", "README.rst", "README.txt", "README"]
+
+# privacy: PUBLIC matches REST /users/{login}/repos, which never lists private repos
+PORTFOLIO_QUERY = """
+query($login: String!, $first: Int!, $after: String) {
+  repositoryOwner(login: $login) {
+    repositories(first: $first, after: $after, ownerAffiliations: OWNER, privacy: PUBLIC,
+                 orderBy: {field: UPDATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes {
+        name
+        url
+        description
+        updatedAt
+        stargazerCount
+        forkCount
+        diskUsage
+        isFork
+        repositoryTopics(first: 20) { nodes { topic { name } } }
+        languages(first: 25, orderBy: {field: SIZE, direction: DESC}) { edges { size node { name } } }
+%s
+      }
+    }
+  }
+}
+""" % "\n".join(
+    f'        readme{i}: object(expression: "HEAD:{path}") {{ ... on Blob {{ text }} }}'
+    for i, path in enumerate(README_PATHS)
+)
+
+
+class PortfolioBackend(ABC):
+    """Fetches a user's repos together with their languages and README for scoring."""
+
+    name = "portfolio"
+
+    def __init__(self, service: "GitHubService"):
+        self.service = service
+
+    @abstractmethod
+    async def fetch_portfolio(
+        self, username: str, role: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[RepoBundle]:
+        """
+        Repos in listing order. Given `role` and `limit`, a backend may leave out repos
+        that provably cannot make the top `limit` for that role.
+        """
+
+
+class RestPortfolioBackend(PortfolioBackend):
+    """1 + 2N REST calls: the repo listing, then languages and README per repo (concurrently)."""
+
+    name = "rest"
+
+    async def fetch_portfolio(
+        self, username: str, role: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[RepoBundle]:
+        repos = await self.service._fetch_repos(username)
+        if not repos:
+            return []
+        semaphore = asyncio.Semaphore(max(1, settings.github_enrich_concurrency))
+        if role is not None and limit and settings.github_two_phase_scoring and len(repos) > limit:
+            return await self._fetch_pruned(username, repos, role, limit, semaphore)
+        # All repos are enriched at once; the semaphore caps in-flight repos per request
+        enriched = await asyncio.gather(*(self._enrich(username, repo["name"], semaphore) for repo in repos))
+        return [(repo, languages, readme) for repo, (languages, readme) in zip(repos, enriched)]
+
+    async def _fetch_pruned(
+        self,
+        username: str,
+        repos: List[Dict],
+        role: str,
+        limit: int,
+        semaphore: asyncio.Semaphore,
+    ) -> List[RepoBundle]:
+        """
+        Branch and bound: enrich repos in decreasing upper-bound order, in waves, and
+        stop once no remaining repo can beat the current `limit`-th best.
+
+        Ranks are (-total, listing index), matching the stable sort used for the final
+        ranking, so ties resolve the same way and the top `limit` is unchanged.
+        """
+        service = self.service
+        bounds = [service._score_upper_bound(repo) for repo in repos]
+        order = sorted(range(len(repos)), key=lambda i: (-bounds[i], i))
+        wave_size = max(limit, settings.github_enrich_concurrency)
+        enriched: Dict[int, Tuple[Dict[str, int], str]] = {}
+        top: List[Tuple[int, int]] = []
+        position = 0
+        while position < len(order):
+            wave = order[position:position + wave_size]
+            if len(top) >= limit:
+                cutoff = top[limit - 1]
+                # `order` is sorted by the same key, so the first repo that can't beat
+                # the cutoff ends the search
+                wave = [i for i in wave if (-bounds[i], i) < cutoff]
+                if not wave:
+                    break
+            results = await asyncio.gather(*(self._enrich(username, repos[i]["name"], semaphore) for i in wave))
+            for i, (languages, readme) in zip(wave, results):
+                enriched[i] = (languages, readme)
+                top.append((-service._score_repo(repos[i], languages, readme, role).total, i))
+            top.sort()
+            del top[limit:]
+            position += len(wave)
+        return [(repos[i], *enriched[i]) for i in sorted(enriched)]
+
+    async def _enrich(self, username: str, repo: str, semaphore: asyncio.Semaphore) -> Tuple[Dict[str, int], str]:
+        async with semaphore:
+            languages, readme = await asyncio.gather(
+                self.service._fetch_languages(username, repo),
+                self.service._fetch_readme(username, repo),
+            )
+        return languages, readme
+
+
+class GraphQLPortfolioBackend(PortfolioBackend):
+    """
+    Repos, languages, topics, stars and README in one GraphQL query per page of repos.
+
+    GitHub's GraphQL API requires a token. Nodes are converted to the REST listing
+    shape so `GitHubService._score_repo` scores both backends identically.
+    """
+
+    name = "graphql"
+
+    async def fetch_portfolio(
+        self, username: str, role: Optional[str] = None, limit: Optional[int] = None
+    ) -> List[RepoBundle]:
+        # One query already returns everything, so there is nothing to prune
+        bundles: List[RepoBundle] = []
+        after: Optional[str] = None
+        max_repos = settings.github_max_repos
+        while len(bundles) < max_repos:
+            variables = {"login": username, "first": min(100, max_repos - len(bundles)), "after": after}
+            data = await self._query(variables)
+            owner = data.get("repositoryOwner")
+            if owner is None:
+                raise LookupError(f"GitHub user not found: {username}")
+            repositories = owner["repositories"]
+            bundles.extend(self._to_bundle(node) for node in repositories["nodes"] if node)
+            page = repositories["pageInfo"]
+            if not page["hasNextPage"]:
+                break
+            after = page["endCursor"]
+        return bundles
+
+    async def _query(self, variables: Dict) -> Dict:
+        service = self.service
+        response = await service._send(
+            "graphql",
+            "POST",
+            f"{service.base_url}/graphql",
+            service._headers(),
+            "graphql",
+            json={"query": PORTFOLIO_QUERY, "variables": variables},
+        )
+        response.raise_for_status()
+        body = response.json()
+        if body.get("errors"):
+            raise ValueError(f"GitHub GraphQL errors: {body['errors'][0].get('message')}")
+        return body.get("data") or {}
+
+    @staticmethod
+    def _to_bundle(node: Dict) -> RepoBundle:
+        repo = {
+            "name": node.get("name", ""),
+            "html_url": node.get("url", ""),
+            "description": node.get("description"),
+            "topics": [t["topic"]["name"] for t in (node.get("repositoryTopics") or {}).get("nodes", [])],
+            "updated_at": node.get("updatedAt"),
+            "stargazers_count": node.get("stargazerCount", 0),
+            "forks_count": node.get("forkCount", 0),
+            # diskUsage is in KB, like the REST `size` field
+            "size": node.get("diskUsage") or 0,
+            "fork": node.get("isFork", False),
+        }
+        languages = {
+            edge["node"]["name"]: edge["size"] for edge in (node.get("languages") or {}).get("edges", [])
+        }
+        readme = ""
+        for i in range(len(README_PATHS)):
+            blob = node.get(f"readme{i}")
+            if blob and blob.get("text"):
+                readme = blob["text"]
+                break
+        return repo, languages, readme
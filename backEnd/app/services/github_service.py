@@ -1,12 +1,26 @@
 from __future__ import annotations
 
+import asyncio
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime, timezone
 import re
-from typing import Dict, List, Optional, Tuple
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
 
 import httpx
+from sqlalchemy.orm import Session
 from app.core.config import settings
+from app.core.metrics import observe_call, registry
+from app.crud.db_http_cache import cache_key, get_cached_response, save_cached_response
+from app.services.github_portfolio import (
+    GraphQLPortfolioBackend,
+    PortfolioBackend,
+    RepoBundle,
+    RestPortfolioBackend,
+)
+from app.services.github_tokens import TokenPool, github_token_pool
+from app.services.single_flight import SingleFlight, normalize_key
 
 
 ROLE_KEYWORDS: Dict[str, List[str]] = {
@@ -17,6 +31,18 @@ ROLE_KEYWORDS: Dict[str, List[str]] = {
     "mobile": ["android", "ios", "flutter", "react native", "swift", "kotlin"],
 }
 
+HTTP_CACHE_REQUESTS = registry.counter(
+    "hustlers_github_http_cache_total",
+    "GitHub GETs by cache result (not_modified: served from cache on 304, refreshed, uncached).",
+    ["endpoint", "result"],
+)
+
+RATE_LIMIT_WAITS = registry.counter(
+    "hustlers_github_rate_limit_waits_total",
+    "GitHub calls that queued because every token was near its rate limit.",
+    ["resource"],
+)
+
 
 @dataclass
 class RepoScore:
@@ -39,51 +65,330 @@ class RepoScore:
 
 
 class GitHubService:
-    def __init__(self):
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+        token_pool: Optional[TokenPool] = None,
+    ):
         self.base_url = "https://api.github.com"
         self.token = settings.github_token
+        self._tokens: List[str] = self._load_tokens()
+        self.token_pool = token_pool if token_pool is not None else github_token_pool
+        self._scoring_flight = SingleFlight()
+        # One long-lived pooled client, opened by startup() (app lifespan)
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        # ETag/Last-Modified cache: in-memory LRU in front of the http_cache table
+        # (SessionLocal unless a factory is injected)
+        self._session_factory = session_factory
+        self._http_memo: "OrderedDict[str, Dict]" = OrderedDict()
+        self._http_store_enabled = settings.github_http_cache_persist
+        self._http_store_writes: Set[asyncio.Task] = set()
+        self.rest_backend = RestPortfolioBackend(self)
+        self.graphql_backend = GraphQLPortfolioBackend(self)
+
+    def _load_tokens(self) -> List[str]:
+        tokens = [self.token] if self.token else []
+        if settings.github_tokens:
+            tokens.extend([t.strip() for t in settings.github_tokens.split(",") if t.strip()])
+        return list(dict.fromkeys(tokens))
+
+    def _pool_tokens(self) -> List[str]:
+        return self._tokens or ([self.token] if self.token else [])
+
+    def _client(self) -> httpx.AsyncClient:
+        """Pooled GitHub client (created lazily outside the app lifespan)."""
+        if self._http is None or self._http.is_closed:
+            limits = httpx.Limits(
+                max_connections=settings.github_max_connections,
+                max_keepalive_connections=settings.github_max_connections,
+            )
+            self._http = httpx.AsyncClient(timeout=30, limits=limits, transport=self._transport)
+        return self._http
+
+    async def startup(self) -> None:
+        """Open the pooled GitHub client. Called from the FastAPI lifespan."""
+        self._client()
+
+    async def shutdown(self) -> None:
+        """Flush pending cache writes, then close the pooled GitHub client and its keep-alive connections."""
+        if self._http_store_writes:
+            await asyncio.gather(*self._http_store_writes, return_exceptions=True)
+        client, self._http = self._http, None
+        if client is not None:
+            await client.aclose()
 
     async def score_repos_for_role(self, username: str, role: str, limit: int = 5) -> List[Dict]:
-        repos = await self._fetch_repos(username)
-        if not repos:
+        # GitHub logins are case-insensitive; concurrent identical requests share one run
+        key = normalize_key(username.strip().lower(), role.strip().lower(), limit)
+        return await self._scoring_flight.do(
+            key, lambda: self._score_repos_for_role(username.strip(), role, limit)
+        )
+
+    async def _score_repos_for_role(self, username: str, role: str, limit: int) -> List[Dict]:
+        bundles = await self._fetch_portfolio(username, role, limit)
+        if not bundles:
             return []
 
-        scored: List[RepoScore] = []
-        for repo in repos:
-            languages = await self._fetch_languages(username, repo["name"])
-            readme = await self._fetch_readme(username, repo["name"])
-            scored.append(self._score_repo(repo, languages, readme, role))
+        scored: List[RepoScore] = [
+            self._score_repo(repo, languages, readme, role) for repo, languages, readme in bundles
+        ]
 
+        # Stable sort: ties keep GitHub's listing order, as before
         scored.sort(key=lambda r: r.total, reverse=True)
         return [item.to_dict() for item in scored[:limit]]
 
+    def _portfolio_backends(self) -> List[PortfolioBackend]:
+        # GraphQL needs a token; REST stays as the fallback for anything GraphQL can't serve
+        if settings.github_portfolio_backend == "rest" or not self._pool_tokens():
+            return [self.rest_backend]
+        return [self.graphql_backend, self.rest_backend]
+
+    async def _fetch_portfolio(self, username: str, role: str, limit: int) -> List[RepoBundle]:
+        *preferred, fallback = self._portfolio_backends()
+        for backend in preferred:
+            try:
+                return await backend.fetch_portfolio(username, role, limit)
+            except Exception as e:
+                print(f"GitHub {backend.name} portfolio fetch failed, falling back to {fallback.name}: {e}")
+        return await fallback.fetch_portfolio(username, role, limit)
+
     async def _fetch_repos(self, username: str) -> List[Dict]:
         url = f"{self.base_url}/users/{username}/repos"
         headers = self._headers()
-        params = {"per_page": 100, "type": "owner", "sort": "updated"}
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, params=params, timeout=30)
-            response.raise_for_status()
-            return response.json()
+        params = {"per_page": min(100, settings.github_max_repos), "type": "owner", "sort": "updated"}
+        response = await self._get("repos", url, headers, params)
+        response.raise_for_status()
+        return response.json()
 
     async def _fetch_languages(self, username: str, repo: str) -> Dict[str, int]:
         url = f"{self.base_url}/repos/{username}/{repo}/languages"
         headers = self._headers()
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, timeout=30)
-            if response.status_code != 200:
-                return {}
-            return response.json()
+        response = await self._get("languages", url, headers)
+        if response.status_code != 200:
+            return {}
+        return response.json()
 
     async def _fetch_readme(self, username: str, repo: str) -> str:
         url = f"{self.base_url}/repos/{username}/{repo}/readme"
         headers = self._headers()
         headers["Accept"] = "application/vnd.github.raw+json"
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url, headers=headers, timeout=30)
-            if response.status_code != 200:
-                return ""
-            return response.text
+        response = await self._get("readme", url, headers)
+        if response.status_code != 200:
+            return ""
+        return response.text
+
+    def _open_store(self) -> Session:
+        if self._session_factory is None:
+            # Deferred so the service imports without a database driver (scripts, tests)
+            from app.db.session import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _read_cached(self, key: str) -> Optional[Dict]:
+        db = self._open_store()
+        try:
+            row = get_cached_response(db, key)
+            if row is None:
+                return None
+            return {
+                "etag": row.etag,
+                "last_modified": row.last_modified,
+                "content_type": row.content_type,
+                "body": row.body,
+            }
+        finally:
+            db.close()
+
+    def _write_cached(self, key: str, url: str, entry: Dict) -> None:
+        db = self._open_store()
+        try:
+            save_cached_response(
+                db,
+                key,
+                url,
+                entry["body"],
+                etag=entry["etag"],
+                last_modified=entry["last_modified"],
+                content_type=entry["content_type"],
+            )
+        finally:
+            db.close()
+
+    def _disable_http_store(self, error: Exception) -> None:
+        # Logged once: e.g. the http_cache table is missing until add_http_cache_table.py runs
+        if self._http_store_enabled:
+            self._http_store_enabled = False
+            print(f"GitHub HTTP cache database tier disabled, using memory only: {error}")
+
+    def _memo_get(self, key: str) -> Optional[Dict]:
+        entry = self._http_memo.get(key)
+        if entry is not None:
+            self._http_memo.move_to_end(key)
+        return entry
+
+    def _memo_put(self, key: str, entry: Dict) -> None:
+        self._http_memo[key] = entry
+        self._http_memo.move_to_end(key)
+        while len(self._http_memo) > settings.github_http_cache_max_entries:
+            self._http_memo.popitem(last=False)
+
+    async def _lookup_cached(self, key: str) -> Optional[Dict]:
+        cached = self._memo_get(key)
+        if cached is not None or not self._http_store_enabled:
+            return cached
+        try:
+            cached = await asyncio.to_thread(self._read_cached, key)
+        except Exception as e:
+            self._disable_http_store(e)
+            return None
+        if cached is not None:
+            self._memo_put(key, cached)
+        return cached
+
+    def _persist_cached(self, key: str, url: str, entry: Dict) -> None:
+        """Write to the database tier in the background; the response never waits for it."""
+        if not self._http_store_enabled:
+            return
+
+        async def write() -> None:
+            try:
+                await asyncio.to_thread(self._write_cached, key, url, entry)
+            except Exception as e:
+                self._disable_http_store(e)
+
+        task = asyncio.ensure_future(write())
+        self._http_store_writes.add(task)
+        task.add_done_callback(self._http_store_writes.discard)
+
+    async def _get(
+        self,
+        endpoint: str,
+        url: str,
+        headers: Dict[str, str],
+        params: Optional[Dict] = None,
+    ) -> httpx.Response:
+        """
+        Conditional GET: revalidates a cached body with If-None-Match/If-Modified-Since.
+
+        GitHub does not count 304s against the rate limit, so unchanged resources cost
+        no quota. A 304 is returned to callers as a 200 carrying the cached body.
+        Validators live in an in-memory LRU backed by the http_cache table; database
+        errors switch the process to memory only.
+        """
+        cached = None
+        key = ""
+        if settings.github_http_cache_enabled:
+            key = cache_key("GET", str(httpx.URL(url, params=params)), headers.get("Accept", ""))
+            cached = await self._lookup_cached(key)
+        if cached:
+            headers = dict(headers)
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+
+        response = await self._send(endpoint, "GET", url, headers, "core", params=params)
+
+        if response.status_code == 304 and cached:
+            HTTP_CACHE_REQUESTS.inc(endpoint=endpoint, result="not_modified")
+            cached_headers = {"content-type": cached["content_type"]} if cached["content_type"] else {}
+            return httpx.Response(
+                200, headers=cached_headers, content=cached["body"], request=response.request
+            )
+        if key and response.status_code == 200 and (
+            response.headers.get("etag") or response.headers.get("last-modified")
+        ):
+            HTTP_CACHE_REQUESTS.inc(endpoint=endpoint, result="refreshed")
+            entry = {
+                "etag": response.headers.get("etag"),
+                "last_modified": response.headers.get("last-modified"),
+                "content_type": response.headers.get("content-type"),
+                "body": response.content,
+            }
+            self._memo_put(key, entry)
+            self._persist_cached(key, url, entry)
+        else:
+            HTTP_CACHE_REQUESTS.inc(endpoint=endpoint, result="uncached")
+        return response
+
+    async def _acquire_token(self, tokens: List[str], resource: str) -> str:
+        """Queue until a token has quota to spare, then send anyway after the max wait."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.github_rate_limit_max_wait_seconds
+        queued = False
+        while True:
+            token = self.token_pool.acquire(tokens, resource)
+            if token is not None:
+                return token
+            wait = self.token_pool.next_available_in(tokens, resource)
+            if loop.time() + wait > deadline:
+                return self.token_pool.acquire(tokens, resource, force=True)
+            if not queued:
+                RATE_LIMIT_WAITS.inc(resource=resource)
+                queued = True
+            await asyncio.sleep(wait)
+
+    async def _send(
+        self,
+        endpoint: str,
+        method: str,
+        url: str,
+        headers: Dict[str, str],
+        resource: str,
+        **kwargs,
+    ) -> httpx.Response:
+        """
+        One GitHub call on the token with the most quota left.
+
+        A rate-limited response is retried on the next best token (or after the
+        reset) up to once per token.
+        """
+        tokens = self._pool_tokens()
+        attempts = 0
+        while True:
+            token = await self._acquire_token(tokens, resource) if tokens else None
+            request_headers = dict(headers)
+            if token:
+                request_headers["Authorization"] = f"Bearer {token}"
+            started = time.perf_counter()
+            try:
+                response = await self._client().request(method, url, headers=request_headers, **kwargs)
+            except Exception:
+                if token:
+                    self.token_pool.release(token, resource)
+                raise
+            self._observe(endpoint, started, response)
+            if not token:
+                return response
+            self.token_pool.report(token, resource, response.status_code, response.headers)
+            attempts += 1
+            if not self._is_rate_limited(response) or attempts >= max(2, len(tokens)):
+                return response
+
+    @staticmethod
+    def _is_rate_limited(response: httpx.Response) -> bool:
+        return response.status_code == 429 or (
+            response.status_code == 403
+            and (response.headers.get("x-ratelimit-remaining") == "0" or "retry-after" in response.headers)
+        )
+
+    def _observe(self, endpoint: str, started: float, response: httpx.Response) -> None:
+        if self._is_rate_limited(response):
+            outcome = "rate_limited"
+        elif response.status_code < 400 or response.status_code == 404:
+            # 404 just means no README/languages for that repo
+            outcome = "success"
+        else:
+            outcome = "error"
+        observe_call(
+            "github",
+            endpoint,
+            outcome,
+            time.perf_counter() - started,
+            bytes_received=len(response.content),
+        )
 
     def _headers(self) -> Dict[str, str]:
         headers = {"Accept": "application/vnd.github+json"}
@@ -139,6 +444,18 @@ class GitHubService:
             evidence=evidence,
         )
 
+    def _score_upper_bound(self, repo: Dict) -> int:
+        """
+        Highest total `_score_repo` can give this repo, from listing metadata alone.
+
+        Impact, recency and ownership are exact; relevance, complexity, quality and
+        results depend on languages/README and are counted at their maximum of 5.
+        """
+        impact, _ = self._score_impact(repo.get("stargazers_count", 0), repo.get("forks_count", 0))
+        recency, _ = self._score_recency(repo.get("updated_at"))
+        ownership, _ = self._score_ownership(repo.get("fork", False))
+        return impact + recency + ownership + 4 * 5
+
     def _score_relevance(
         self,
         role: str,
@@ -266,4 +583,32 @@ class GitHubService:
         return score, evidence
 
 
+# Global instance
 github_service = GitHubService()
+
+_RATE_LIMIT_REMAINING = registry.gauge(
+    "hustlers_github_rate_limit_remaining", "Calls left in the current window per GitHub token.", ["token", "resource"]
+)
+_RATE_LIMIT_LIMIT = registry.gauge(
+    "hustlers_github_rate_limit_limit", "Window size reported by GitHub per token.", ["token", "resource"]
+)
+_RATE_LIMIT_RESET = registry.gauge(
+    "hustlers_github_rate_limit_reset_seconds", "Seconds until the GitHub quota window resets.", ["token", "resource"]
+)
+_RATE_LIMIT_IN_FLIGHT = registry.gauge(
+    "hustlers_github_rate_limit_in_flight", "GitHub calls awaiting a response per token.", ["token", "resource"]
+)
+
+
+def _collect_rate_limit_metrics() -> None:
+    for quota in github_service.token_pool.state():
+        labels = {"token": quota["token"], "resource": quota["resource"]}
+        if quota["remaining"] is not None:
+            _RATE_LIMIT_REMAINING.set(quota["remaining"], **labels)
+        if quota["limit"] is not None:
+            _RATE_LIMIT_LIMIT.set(quota["limit"], **labels)
+        _RATE_LIMIT_RESET.set(quota["reset_in_seconds"], **labels)
+        _RATE_LIMIT_IN_FLIGHT.set(quota["in_flight"], **labels)
+
+
+registry.register_collector(_collect_rate_limit_metrics)
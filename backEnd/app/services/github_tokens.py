@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import threading
+import time
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.services.key_scheduler import mask_key
+
+# Authenticated REST quota; assumed until a response tells us the real numbers
+DEFAULT_LIMIT = 5000
+# Wait used when quota is only held up by in-flight calls that have not reported back
+IN_FLIGHT_WAIT_SECONDS = 0.1
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    value = headers.get(name)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+@dataclass
+class _Quota:
+    limit: Optional[int] = None
+    remaining: Optional[int] = None
+    reset_at: float = 0.0  # Unix time from X-RateLimit-Reset
+    cooldown_until: float = 0.0  # Retry-After on secondary rate limits
+    in_flight: int = 0
+
+
+class TokenPool:
+    """
+    Picks the GitHub token for each call from the quota GitHub reports.
+
+    Every (token, resource) pair tracks X-RateLimit-Limit/Remaining/Reset from the
+    last response ("core" for REST, "graphql" for GraphQL). `acquire` returns the
+    token with the most headroom (remaining minus calls still in flight) as long as
+    it stays above `reserve`; otherwise it returns None and `next_available_in` says
+    how long to queue. Once the reset time passes, the quota is assumed refilled.
+    """
+
+    def __init__(self, reserve: int = 50, clock: Callable[[], float] = time.time):
+        self.reserve = reserve
+        self._clock = clock
+        self._quotas: Dict[Tuple[str, str], _Quota] = {}
+        self._lock = threading.Lock()
+
+    def _quota(self, token: str, resource: str, now: float) -> _Quota:
+        quota = self._quotas.setdefault((token, resource), _Quota())
+        if quota.reset_at and now >= quota.reset_at:
+            quota.remaining = None
+            quota.reset_at = 0.0
+        return quota
+
+    def _headroom(self, quota: _Quota) -> int:
+        remaining = quota.remaining if quota.remaining is not None else (quota.limit or DEFAULT_LIMIT)
+        return remaining - quota.in_flight
+
+    def acquire(self, tokens: Sequence[str], resource: str = "core", force: bool = False) -> Optional[str]:
+        """
+        Reserve a call on the token with the most headroom.
+
+        With `force`, the reserve and cooldowns are ignored and the least exhausted
+        token is returned anyway (used once the caller has queued long enough).
+        """
+        now = self._clock()
+        with self._lock:
+            best = None
+            best_rank = None
+            for token in tokens:
+                quota = self._quota(token, resource, now)
+                headroom = self._headroom(quota)
+                if not force and (quota.cooldown_until > now or headroom <= self.reserve):
+                    continue
+                rank = (quota.cooldown_until > now, -headroom, quota.reset_at)
+                if best_rank is None or rank < best_rank:
+                    best, best_rank = (token, quota), rank
+            if best is None:
+                return None
+            token, quota = best
+            quota.in_flight += 1
+            return token
+
+    def next_available_in(self, tokens: Sequence[str], resource: str = "core") -> float:
+        now = self._clock()
+        with self._lock:
+            waits = []
+            for token in tokens:
+                quota = self._quota(token, resource, now)
+                wait = max(quota.cooldown_until - now, 0.0)
+                if self._headroom(quota) <= self.reserve:
+                    if quota.remaining is not None and quota.remaining > self.reserve:
+                        wait = max(wait, IN_FLIGHT_WAIT_SECONDS)
+                    else:
+                        wait = max(wait, quota.reset_at - now if quota.reset_at else IN_FLIGHT_WAIT_SECONDS)
+                waits.append(wait)
+            return min(waits) if waits else 0.0
+
+    def report(self, token: str, resource: str, status_code: int, headers: Mapping[str, str]) -> None:
+        """Release the reservation and record the quota headers of the response."""
+        now = self._clock()
+        with self._lock:
+            quota = self._quota(token, resource, now)
+            quota.in_flight = max(0, quota.in_flight - 1)
+            limit = _int_header(headers, "x-ratelimit-limit")
+            remaining = _int_header(headers, "x-ratelimit-remaining")
+            reset_at = _int_header(headers, "x-ratelimit-reset")
+            if limit is not None:
+                quota.limit = limit
+            if remaining is not None:
+                quota.remaining = remaining
+            if reset_at is not None:
+                quota.reset_at = float(reset_at)
+            retry_after = _int_header(headers, "retry-after")
+            if status_code in (403, 429) and retry_after is not None:
+                quota.cooldown_until = now + retry_after
+
+    def release(self, token: str, resource: str) -> None:
+        """Drop a reservation whose call never got a response."""
+        with self._lock:
+            quota = self._quotas.get((token, resource))
+            if quota is not None:
+                quota.in_flight = max(0, quota.in_flight - 1)
+
+    def state(self) -> List[Dict]:
+        now = self._clock()
+        with self._lock:
+            return [
+                {
+                    "token": mask_key(token),
+                    "resource": resource,
+                    "limit": quota.limit,
+                    "remaining": quota.remaining,
+                    "reset_in_seconds": round(max(0.0, quota.reset_at - now), 1) if quota.reset_at else 0.0,
+                    "cooldown_seconds": round(max(0.0, quota.cooldown_until - now), 1),
+                    "in_flight": quota.in_flight,
+                }
+                for (token, resource), quota in self._quotas.items()
+            ]
+
+
+# Shared by every GitHubService in the process so quota state never diverges
+github_token_pool = TokenPool(reserve=settings.github_rate_limit_reserve)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import re
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+
+
+RETRY_AFTER_PATTERNS = [
+    re.compile(r"retryDelay['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)s", re.IGNORECASE),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+    re.compile(r"retry-after['\"]?\s*[:=]\s*['\"]?(\d+(?:\.\d+)?)", re.IGNORECASE),
+]
+
+
+def parse_retry_after(error_text: str) -> Optional[float]:
+    """Pull a retry hint (in seconds) out of a Gemini 429 error message, if present."""
+    for pattern in RETRY_AFTER_PATTERNS:
+        match = pattern.search(error_text)
+        if match:
+            return float(match.group(1))
+    return None
+
+
+def mask_key(key: str) -> str:
+    if len(key) <= 8:
+        return "****"
+    return f"{key[:4]}...{key[-4:]}"
+
+
+@dataclass
+class _Slot:
+    tokens: float
+    updated_at: float
+    cooldown_until: float = 0.0
+    failures: int = 0
+    last_used: float = 0.0
+
+
+class KeyScheduler:
+    """
+    Picks the (API key, model) pair for each Gemini call.
+
+    Every pair has a token bucket refilled at `requests_per_minute` and a cooldown that
+    is set when the pair returns 429/RESOURCE_EXHAUSTED (from the retry hint when the
+    error carries one, otherwise exponential backoff). `acquire` stays on the most
+    preferred model and picks its healthiest key; a lower-ranked model is only used
+    once every key for the models ahead of it is cooling down or out of tokens.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float = 10,
+        base_cooldown: float = 15,
+        max_cooldown: float = 600,
+    ):
+        self.capacity = max(1.0, requests_per_minute)
+        self.refill_per_second = requests_per_minute / 60.0
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self._slots: Dict[Tuple[str, str], _Slot] = {}
+        self._lock = threading.Lock()
+
+    def _slot(self, key: str, model: str, now: float) -> _Slot:
+        slot = self._slots.get((key, model))
+        if slot is None:
+            slot = _Slot(tokens=self.capacity, updated_at=now)
+            self._slots[(key, model)] = slot
+        elif slot.tokens < self.capacity:
+            slot.tokens = min(self.capacity, slot.tokens + (now - slot.updated_at) * self.refill_per_second)
+        slot.updated_at = now
+        return slot
+
+    def acquire(
+        self,
+        keys: Sequence[str],
+        models: Sequence[str],
+        exclude_models: Iterable[str] = (),
+    ) -> Optional[Tuple[str, str]]:
+        """
+        Reserve a request on the healthiest pair.
+
+        `models` is in preference order and takes priority over key health, so
+        successful calls never rotate away from the first model. Returns None when every
+        pair is cooling down or out of tokens; `next_available_in` tells the caller how
+        long to wait.
+        """
+        excluded = set(exclude_models)
+        now = time.monotonic()
+        with self._lock:
+            best = None
+            best_rank = None
+            for model_rank, model in enumerate(models):
+                if model in excluded:
+                    continue
+                for key in keys:
+                    slot = self._slot(key, model, now)
+                    if slot.cooldown_until > now or slot.tokens < 1:
+                        continue
+                    rank = (model_rank, slot.failures, -int(slot.tokens), slot.last_used)
+                    if best_rank is None or rank < best_rank:
+                        best, best_rank = (key, model, slot), rank
+            if best is None:
+                return None
+            key, model, slot = best
+            slot.tokens -= 1
+            slot.last_used = now
+            return key, model
+
+    def next_available_in(self, keys: Sequence[str], models: Sequence[str]) -> float:
+        now = time.monotonic()
+        with self._lock:
+            waits = []
+            for model in models:
+                for key in keys:
+                    slot = self._slot(key, model, now)
+                    token_wait = 0.0
+                    if slot.tokens < 1:
+                        token_wait = (1 - slot.tokens) / self.refill_per_second if self.refill_per_second else float("inf")
+                    waits.append(max(slot.cooldown_until - now, token_wait, 0.0))
+            return min(waits) if waits else float("inf")
+
+    def report_success(self, key: str, model: str) -> None:
+        with self._lock:
+            slot = self._slot(key, model, time.monotonic())
+            slot.failures = 0
+
+    def report_rate_limited(self, key: str, model: str, retry_after: Optional[float] = None) -> float:
+        """Put the pair on cooldown after a 429. Returns the cooldown in seconds."""
+        now = time.monotonic()
+        with self._lock:
+            slot = self._slot(key, model, now)
+            slot.failures += 1
+            slot.tokens = 0
+            if retry_after is None:
+                retry_after = self.base_cooldown * (2 ** (slot.failures - 1))
+            cooldown = min(self.max_cooldown, retry_after)
+            slot.cooldown_until = now + cooldown
+            return cooldown
+
+    def state(self) -> List[Dict]:
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {
+                    "key": mask_key(key),
+                    "model": model,
+                    "tokens": round(slot.tokens, 2),
+                    "cooldown_seconds": round(max(0.0, slot.cooldown_until - now), 1),
+                    "failures": slot.failures,
+                }
+                for (key, model), slot in self._slots.items()
+            ]
+
+
+# Shared by every AIService in the process so rotation state never diverges
+key_scheduler = KeyScheduler(requests_per_minute=settings.gemini_requests_per_minute)
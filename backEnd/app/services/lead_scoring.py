@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+from typing import Dict, List
+
+import numpy as np
+
+# How likely a business in each category is to pay for websites/booking/software (0..1)
+CATEGORY_WEIGHTS: Dict[str, float] = {
+    "hotel": 1.0,
+    "guest_house": 0.9,
+    "hostel": 0.8,
+    "motel": 0.8,
+    "apartment": 0.7,
+    "restaurant": 0.9,
+    "cafe": 0.8,
+    "bar": 0.6,
+    "pub": 0.6,
+    "fast_food": 0.6,
+    "clinic": 0.9,
+    "dentist": 0.9,
+    "doctors": 0.8,
+    "hospital": 0.7,
+    "pharmacy": 0.7,
+    "school": 0.8,
+    "college": 0.8,
+    "kindergarten": 0.7,
+    "university": 0.6,
+    "company": 0.8,
+    "lawyer": 0.8,
+    "insurance": 0.7,
+    "ngo": 0.6,
+    "supermarket": 0.6,
+    "bakery": 0.6,
+    "clothes": 0.6,
+    "electronics": 0.6,
+    "mall": 0.5,
+    "cinema": 0.5,
+    "theatre": 0.5,
+}
+DEFAULT_CATEGORY_WEIGHT = 0.3
+
+# Missing contact channel -> share of the "weak digital presence" signal
+PRESENCE_GAPS = {"website": 0.5, "phone": 0.2, "email": 0.2, "address": 0.1}
+
+WEAKNESS_WEIGHT = 0.6
+CATEGORY_WEIGHT = 0.25
+PROXIMITY_WEIGHT = 0.15
+# Places with no name tag are hard to reach out to
+UNNAMED_FACTOR = 0.2
+
+
+def score_leads(places: List[Dict], radius: float) -> np.ndarray:
+    """
+    Score places as outreach leads in [0, 1] in one vectorized pass.
+
+    Combines weak digital presence (missing website/phone/email/address), how likely
+    the category is to buy, and proximity to the search centre. Places need the
+    `category` and `distance_m` fields that MapService adds.
+    """
+    if not places:
+        return np.zeros(0)
+
+    weakness = np.zeros(len(places))
+    for field, weight in PRESENCE_GAPS.items():
+        missing = np.fromiter((not p.get(field) for p in places), dtype=bool, count=len(places))
+        weakness += weight * missing
+
+    category = np.fromiter(
+        (CATEGORY_WEIGHTS.get(p.get("category", ""), DEFAULT_CATEGORY_WEIGHT) for p in places),
+        dtype=float,
+        count=len(places),
+    )
+    distance = np.fromiter((p.get("distance_m") or 0.0 for p in places), dtype=float, count=len(places))
+    proximity = np.clip(1.0 - distance / max(radius, 1.0), 0.0, 1.0)
+    named = np.fromiter(
+        (bool(p.get("name")) and not str(p.get("name")).startswith("Unnamed ") for p in places),
+        dtype=bool,
+        count=len(places),
+    )
+
+    score = WEAKNESS_WEIGHT * weakness + CATEGORY_WEIGHT * category + PROXIMITY_WEIGHT * proximity
+    return score * np.where(named, 1.0, UNNAMED_FACTOR)
+
+
+def rank_leads(places: List[Dict], radius: float) -> List[Dict]:
+    """Copies of `places` with a `lead_score` field, best lead first."""
+    scores = score_leads(places, radius)
+    order = np.argsort(-scores, kind="stable")
+    ranked = []
+    for i in order:
+        lead = dict(places[i])
+        lead["lead_score"] = round(float(scores[i]), 4)
+        ranked.append(lead)
+    return ranked
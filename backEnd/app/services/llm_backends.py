@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from google import genai
+
+from app.core.config import settings
+
+INPUT_MARKER = "\n\nInput:\n"
+
+
+def prompt_fingerprint(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+
+
+class LLMBackend(ABC):
+    """
+    The model AIService talks to. Key selection, retries, caching and metrics stay in
+    AIService; a backend only turns (key, model, prompt) into response text and raises
+    an exception whose message contains "429"/"RESOURCE_EXHAUSTED" when rate limited.
+    """
+
+    name = "llm"
+    requires_api_key = True
+
+    @abstractmethod
+    def generate(self, key: str, model: str, prompt: str) -> str:
+        """Blocking call returning the full response text."""
+
+    @abstractmethod
+    async def agenerate(self, key: str, model: str, prompt: str) -> str:
+        """Awaitable call returning the full response text."""
+
+    @abstractmethod
+    def astream(self, key: str, model: str, prompt: str) -> AsyncIterator[str]:
+        """Async generator yielding response text chunks as they arrive."""
+
+    def list_models(self, key: str) -> List[str]:
+        return []
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+
+    def __init__(self):
+        # genai clients are cheap to reuse and safe to share, so keep one per key
+        self._clients: Dict[str, genai.Client] = {}
+
+    def _client_for(self, key: str) -> genai.Client:
+        client = self._clients.get(key)
+        if client is None:
+            client = genai.Client(api_key=key)
+            self._clients[key] = client
+        return client
+
+    def generate(self, key: str, model: str, prompt: str) -> str:
+        response = self._client_for(key).models.generate_content(model=model, contents=prompt)
+        return response.text or ""
+
+    async def agenerate(self, key: str, model: str, prompt: str) -> str:
+        response = await self._client_for(key).aio.models.generate_content(model=model, contents=prompt)
+        return response.text or ""
+
+    async def astream(self, key: str, model: str, prompt: str) -> AsyncIterator[str]:
+        stream = await self._client_for(key).aio.models.generate_content_stream(model=model, contents=prompt)
+        async for chunk in stream:
+            if chunk.text:
+                yield chunk.text
+
+    def list_models(self, key: str) -> List[str]:
+        return [model.name for model in self._client_for(key).models.list()]
+
+
+def _load_json_values(path: str) -> List[Any]:
+    """Read every JSON value in a file that holds one or more concatenated documents."""
+    with open(path, encoding="utf-8") as f:
+        text = f.read()
+    decoder = json.JSONDecoder()
+    values = []
+    index = 0
+    while index < len(text):
+        while index < len(text) and text[index].isspace():
+            index += 1
+        if index >= len(text):
+            break
+        value, index = decoder.raw_decode(text, index)
+        values.append(value)
+    return values
+
+
+def _schema_to_json(schema: str) -> Any:
+    """Turn the pseudo-JSON schemas used in our prompts into a minimal valid instance."""
+    text = re.sub(r'one of \[("[^"]*")[^\]]*\]', r"\1", schema)
+    text = re.sub(r"\b(string|number) \| null\b", "null", text)
+    text = text.replace("[string]", '["sample"]')
+    text = re.sub(r"\bstring\b", '"sample"', text)
+    text = re.sub(r"\bnumber\b", "0", text)
+    return json.loads(text)
+
+
+def _extract_schema(prompt: str) -> Optional[str]:
+    marker = prompt.find("SCHEMA")
+    if marker == -1:
+        return None
+    start = prompt.find("{", marker)
+    depth = 0
+    for index in range(start, len(prompt)):
+        if prompt[index] == "{":
+            depth += 1
+        elif prompt[index] == "}":
+            depth -= 1
+            if depth == 0:
+                return prompt[start:index + 1]
+    return None
+
+
+def synthesize_response(prompt: str) -> str:
+    """
+    Build a deterministic, schema-valid answer for the prompts AIService sends:
+    SCHEMA-based prompts (insights, resume suggestions) and job extraction (single or batch).
+    """
+    template, _, user_input = prompt.rpartition(INPUT_MARKER)
+    schema = _extract_schema(template)
+    if schema:
+        return json.dumps(_schema_to_json(schema), ensure_ascii=False)
+
+    keys_match = re.search(r"these keys: ([a-z_, ]+)\.", template)
+    keys = [k.strip() for k in keys_match.group(1).split(",")] if keys_match else []
+
+    def job_from(text: str, deep_link: Optional[str] = None) -> Dict[str, str]:
+        first_line = next((line for line in text.splitlines() if line.strip()), "")
+        item = {key: "" for key in keys}
+        if keys:
+            item[keys[0] if keys[0] != "deep_link" else keys[1]] = first_line.split(":", 1)[-1].strip()
+        if "deep_link" in item:
+            item["deep_link"] = deep_link or ""
+        return item
+
+    try:
+        posts = json.loads(user_input)
+    except json.JSONDecodeError:
+        posts = None
+    if isinstance(posts, list):
+        return json.dumps(
+            [job_from(p.get("text", ""), p.get("deep_link")) for p in posts if isinstance(p, dict)],
+            ensure_ascii=False,
+        )
+    return json.dumps(job_from(user_input), ensure_ascii=False)
+
+
+class FakeBackend(LLMBackend):
+    """
+    Deterministic local backend for benchmarks, load tests and offline development.
+
+    Responses come from, in order: recordings keyed by prompt fingerprint, then
+    sequential fixture documents (e.g. files in the tests/jsons/afriwork style) replayed
+    round-robin, then schema-valid synthesized JSON. Latency and 429s can be injected.
+    """
+
+    name = "fake"
+    requires_api_key = False
+
+    def __init__(
+        self,
+        fixtures_path: str = "",
+        latency: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        seed: int = 0,
+        chunk_size: int = 64,
+    ):
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._recorded: Dict[str, str] = {}
+        self._sequence: List[str] = []
+        self._cursor = 0
+        self._lock = threading.Lock()
+        if fixtures_path:
+            self.load_fixtures(fixtures_path)
+
+    def load_fixtures(self, path: str) -> None:
+        paths = [path]
+        if os.path.isdir(path):
+            paths = [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        for file_path in paths:
+            if not os.path.isfile(file_path):
+                continue
+            for value in _load_json_values(file_path):
+                if isinstance(value, dict) and "prompt_sha256" in value and "response" in value:
+                    self._recorded[value["prompt_sha256"]] = value["response"]
+                else:
+                    self._sequence.append(value if isinstance(value, str) else json.dumps(value, ensure_ascii=False))
+
+    def _respond(self, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            if self.rate_limit_rate and self._random.random() < self.rate_limit_rate:
+                raise RuntimeError("429 RESOURCE_EXHAUSTED (injected by FakeBackend) {'retryDelay': '1s'}")
+            recorded = self._recorded.get(prompt_fingerprint(prompt))
+            if recorded is not None:
+                return recorded
+            if self._sequence:
+                response = self._sequence[self._cursor % len(self._sequence)]
+                self._cursor += 1
+                return response
+        return synthesize_response(prompt)
+
+    def generate(self, key: str, model: str, prompt: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def agenerate(self, key: str, model: str, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._respond(prompt)
+
+    async def astream(self, key: str, model: str, prompt: str) -> AsyncIterator[str]:
+        text = self._respond(prompt)
+        chunks = [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)] or [""]
+        for chunk in chunks:
+            if self.latency:
+                await asyncio.sleep(self.latency / len(chunks))
+            yield chunk
+
+    def list_models(self, key: str) -> List[str]:
+        return ["fake"]
+
+
+class RecordingBackend(LLMBackend):
+    """Wrap a live backend and append every response to a JSON-lines file FakeBackend can replay."""
+
+    def __init__(self, inner: LLMBackend, path: str):
+        self.inner = inner
+        self.path = path
+        self.name = inner.name
+        self.requires_api_key = inner.requires_api_key
+        self._lock = threading.Lock()
+
+    def _record(self, model: str, prompt: str, response: str) -> None:
+        line = json.dumps(
+            {"prompt_sha256": prompt_fingerprint(prompt), "model": model, "response": response},
+            ensure_ascii=False,
+        )
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def generate(self, key: str, model: str, prompt: str) -> str:
+        response = self.inner.generate(key, model, prompt)
+        self._record(model, prompt, response)
+        return response
+
+    async def agenerate(self, key: str, model: str, prompt: str) -> str:
+        response = await self.inner.agenerate(key, model, prompt)
+        self._record(model, prompt, response)
+        return response
+
+    async def astream(self, key: str, model: str, prompt: str) -> AsyncIterator[str]:
+        chunks = []
+        async for chunk in self.inner.astream(key, model, prompt):
+            chunks.append(chunk)
+            yield chunk
+        self._record(model, prompt, "".join(chunks))
+
+    def list_models(self, key: str) -> List[str]:
+        return self.inner.list_models(key)
+
+
+def create_backend() -> LLMBackend:
+    """Build the backend selected by LLM_BACKEND ("gemini" or "fake")."""
+    if settings.llm_backend == "fake":
+        backend: LLMBackend = FakeBackend(
+            fixtures_path=settings.llm_fake_fixtures,
+            latency=settings.llm_fake_latency_ms / 1000,
+            rate_limit_rate=settings.llm_fake_rate_limit_rate,
+            seed=settings.llm_fake_seed,
+        )
+    elif settings.llm_backend == "gemini":
+        backend = GeminiBackend()
+    else:
+        raise ValueError(f"Unknown LLM_BACKEND: {settings.llm_backend}")
+    if settings.llm_record_path:
+        backend = RecordingBackend(backend, settings.llm_record_path)
+    return backend
+
+
+# Global instance
+llm_backend = create_backend()
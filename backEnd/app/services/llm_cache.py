@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import asyncio
+from collections import OrderedDict
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+from app.core.config import settings
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    Content-addressed cache for LLM responses.
+
+    Entries are keyed by (model, prompt-template hash, input hash). Lookups hit an
+    in-memory LRU first and then, if `db_path` is set, a SQLite table that survives
+    restarts and is shared by every worker pointing at the same file. Coroutines use
+    `aget`/`aset`, which run the SQLite calls in a worker thread.
+    """
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = 86400, db_path: str = ""):
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._template_ttls: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        # One connection is shared across worker threads, so disk calls are serialized
+        self._db_lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = self._open_db(db_path)
+
+    def _open_db(self, db_path: str) -> Optional[sqlite3.Connection]:
+        try:
+            db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            db.execute("DELETE FROM llm_cache WHERE expires_at < ?", (time.time(),))
+            db.commit()
+            return db
+        except sqlite3.Error as e:
+            print(f"LLM cache disk tier disabled ({db_path}): {e}")
+            return None
+
+    def make_key(self, model: str, prompt_template: str, user_input: str) -> str:
+        return _sha256(f"{model}\0{_sha256(prompt_template)}\0{_sha256(user_input)}")
+
+    def set_ttl(self, prompt_template: str, ttl_seconds: float) -> None:
+        """Override the TTL used for responses produced with `prompt_template`."""
+        self._template_ttls[_sha256(prompt_template)] = ttl_seconds
+
+    def ttl_for(self, prompt_template: str) -> float:
+        return self._template_ttls.get(_sha256(prompt_template), self.default_ttl)
+
+    def _memory_get(self, key: str, now: float) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at > now:
+            self._entries.move_to_end(key)
+            return value
+        del self._entries[key]
+        return None
+
+    def _disk_get(self, key: str, now: float) -> Optional[Tuple[str, float]]:
+        with self._db_lock:
+            try:
+                return self._db.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ? AND expires_at > ?",
+                    (key, now),
+                ).fetchone()
+            except sqlite3.Error as e:
+                print(f"LLM cache read failed: {e}")
+                return None
+
+    def _disk_set(self, key: str, value: str, expires_at: float) -> None:
+        with self._db_lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, expires_at),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"LLM cache write failed: {e}")
+
+    def _record_lookup(self, key: str, row: Optional[Tuple[str, float]]) -> Optional[str]:
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            value, expires_at = row
+            self._remember(key, value, expires_at)
+            self.hits += 1
+            self.disk_hits += 1
+            return value
+
+    def get(self, model: str, prompt_template: str, user_input: str) -> Optional[str]:
+        key = self.make_key(model, prompt_template, user_input)
+        now = time.time()
+        with self._lock:
+            value = self._memory_get(key, now)
+            if value is not None:
+                self.hits += 1
+                return value
+        row = self._disk_get(key, now) if self._db is not None else None
+        return self._record_lookup(key, row)
+
+    async def aget(self, model: str, prompt_template: str, user_input: str) -> Optional[str]:
+        """`get` for coroutines: a memory miss is looked up on disk in a worker thread."""
+        key = self.make_key(model, prompt_template, user_input)
+        now = time.time()
+        with self._lock:
+            value = self._memory_get(key, now)
+            if value is not None:
+                self.hits += 1
+                return value
+        row = await asyncio.to_thread(self._disk_get, key, now) if self._db is not None else None
+        return self._record_lookup(key, row)
+
+    def _expires_at(self, prompt_template: str, ttl: Optional[float]) -> float:
+        return time.time() + (ttl if ttl is not None else self.ttl_for(prompt_template))
+
+    def set(
+        self,
+        model: str,
+        prompt_template: str,
+        user_input: str,
+        value: str,
+        ttl: Optional[float] = None,
+    ) -> None:
+        key = self.make_key(model, prompt_template, user_input)
+        expires_at = self._expires_at(prompt_template, ttl)
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self._db is not None:
+            self._disk_set(key, value, expires_at)
+
+    async def aset(
+        self,
+        model: str,
+        prompt_template: str,
+        user_input: str,
+        value: str,
+        ttl: Optional[float] = None,
+    ) -> None:
+        """`set` for coroutines: the entry is in memory at once and written to disk in a worker thread."""
+        key = self.make_key(model, prompt_template, user_input)
+        expires_at = self._expires_at(prompt_template, ttl)
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self._db is not None:
+            await asyncio.to_thread(self._disk_set, key, value, expires_at)
+
+    def _remember(self, key: str, value: str, expires_at: float) -> None:
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM llm_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._entries),
+            "persistent": self._db is not None,
+        }
+
+
+# Global instance
+llm_cache = LLMCache(
+    max_entries=settings.llm_cache_max_entries,
+    default_ttl=settings.llm_cache_ttl_seconds,
+    db_path=settings.llm_cache_path,
+)
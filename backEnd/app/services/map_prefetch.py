@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+import time
+from typing import List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import registry
+from app.services.map_service import MapService, map_service
+
+PREFETCH_DURATION = registry.histogram(
+    "hustlers_map_prefetch_duration_seconds",
+    "Time to refresh one prefetch target into the tile cache.",
+    ["target"],
+)
+PREFETCH_REFRESHES = registry.counter(
+    "hustlers_map_prefetch_refreshes_total",
+    "Prefetch target refreshes by outcome (success, error, skipped).",
+    ["target", "outcome"],
+)
+PREFETCH_LAST_SUCCESS = registry.gauge(
+    "hustlers_map_prefetch_last_success_timestamp_seconds",
+    "Unix time of the last successful refresh per prefetch target.",
+    ["target"],
+)
+
+
+@dataclass(frozen=True)
+class PrefetchTarget:
+    lat: float
+    lon: float
+    radius: int
+    categories: Tuple[str, ...]
+
+    @property
+    def label(self) -> str:
+        return f"{self.lat},{self.lon},{self.radius},{'|'.join(self.categories)}"
+
+
+def parse_prefetch_targets(spec: str) -> List[PrefetchTarget]:
+    """
+    Parse "lat,lon,radius,cat1|cat2;lat,lon,radius,cat" into targets.
+    Malformed entries are reported and skipped.
+    """
+    targets = []
+    for entry in spec.split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        try:
+            lat, lon, radius, categories = [part.strip() for part in entry.split(",")]
+            names = tuple(c.strip().lower() for c in categories.split("|") if c.strip())
+            targets.append(PrefetchTarget(float(lat), float(lon), int(radius), names))
+        except ValueError:
+            print(f"Ignoring malformed map prefetch target: {entry!r}")
+    return targets
+
+
+class MapPrefetcher:
+    """
+    Keeps hot (center, radius, categories) areas warm in the geohash tile cache.
+
+    Every `interval` seconds each target is re-fetched with one union Overpass query,
+    `spacing` seconds apart so the warm-up never bursts the mirrors. Rounds are skipped
+    while every mirror's circuit is open or when an offline extract serves searches, and
+    nothing runs at all while the tile cache is disabled (there would be nothing to warm).
+    """
+
+    def __init__(
+        self,
+        service: MapService,
+        targets: List[PrefetchTarget],
+        interval: float = 1800,
+        spacing: float = 5,
+    ):
+        self.service = service
+        self.targets = targets
+        self.interval = interval
+        self.spacing = spacing
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> int:
+        """Refresh every target once. Returns how many refreshed successfully."""
+        refreshed = 0
+        if not settings.geo_tile_cache_enabled:
+            return refreshed
+        for i, target in enumerate(self.targets):
+            if self.service.osm_index.ready:
+                return refreshed
+            if not self.service.mirror_health.any_available():
+                PREFETCH_REFRESHES.inc(target=target.label, outcome="skipped")
+                continue
+            if i and self.spacing:
+                await asyncio.sleep(self.spacing)
+
+            started = time.perf_counter()
+            try:
+                ok = await self.service.refresh_area(target.lat, target.lon, list(target.categories), target.radius)
+            except Exception as e:
+                print(f"Map prefetch failed for {target.label}: {type(e).__name__} - {e}")
+                ok = False
+            duration = time.perf_counter() - started
+            PREFETCH_DURATION.observe(duration, target=target.label)
+            PREFETCH_REFRESHES.inc(target=target.label, outcome="success" if ok else "error")
+            if ok:
+                refreshed += 1
+                PREFETCH_LAST_SUCCESS.set(time.time(), target=target.label)
+            print(f"Map prefetch {target.label}: {'ok' if ok else 'failed'} in {duration:.1f}s")
+        return refreshed
+
+    async def _run_forever(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+    def start(self) -> None:
+        # Opt-in per deployment (MAP_PREFETCH_ENABLED=true)
+        if not settings.map_prefetch_enabled:
+            return
+        if not settings.geo_tile_cache_enabled:
+            if self.targets:
+                print("Map prefetch disabled: geo tile cache is off")
+            return
+        if self._task is None and self.targets:
+            self._task = asyncio.create_task(self._run_forever())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+# Global instance
+map_prefetcher = MapPrefetcher(
+    map_service,
+    parse_prefetch_targets(settings.map_prefetch_targets),
+    interval=settings.map_prefetch_interval_seconds,
+    spacing=settings.map_prefetch_spacing_seconds,
+)
@@ -1,12 +1,55 @@
-from typing import List, Dict, Optional
+from typing import Any, AsyncIterator, Callable, List, Dict, Optional, Tuple
+from datetime import timedelta
+from urllib.parse import urlsplit
+import asyncio
 import httpx
 import json
-import random
+import logging
+import math
+import numpy as np
+import time
+from sqlalchemy.exc import OperationalError, ProgrammingError
+from sqlalchemy.orm import Session
 from app.core.config import settings
-from app.services.ai_service import AIService
+from app.core.metrics import observe_call, record_retry, registry
+from app.crud.db_insights import (
+    fingerprint_place,
+    get_fresh_insight,
+    list_insights_in_bounds,
+    save_insight,
+    strip_volatile_fields,
+)
+from app.services.ai_service import ai_service
+from app.services.geo_tiles import EARTH_RADIUS_M, TileCache, geohash_encode, haversine_many, tile_cache, tiles_covering, union_bounds
+from app.services.lead_scoring import rank_leads
+from app.services.mirror_health import MirrorHealth
+from app.services.osm_index import OSMIndex
+from app.services.single_flight import SingleFlight, normalize_key
+
+logger = logging.getLogger(__name__)
+
+ALLOWED_SCALE = ["extremely low", "low", "medium", "high", "extremely high"]
+OSM_ELEMENT_TYPES = ("node", "way", "relation")
+
+OVERPASS_HEADERS = {
+    "User-Agent": "HustlersMapService/1.0 (contact: dev@hustlers.local)",
+    "Accept": "application/json",
+}
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
 
 class MapService:
-    def __init__(self):
+    def __init__(
+        self,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        tiles: Optional[TileCache] = None,
+        session_factory: Optional[Callable[[], Session]] = None,
+    ):
         self.overpass_urls = [
             "https://overpass-api.de/api/interpreter",
             "https://lz4.overpass-api.de/api/interpreter",
@@ -14,7 +57,26 @@ class MapService:
             "https://overpass.kumi.systems/api/interpreter",
             "https://overpass.osm.ch/api/interpreter",
         ]
-        self.ai_service = AIService()
+        self.ai_service = ai_service
+        # One long-lived pooled client per mirror host, opened by startup() (app lifespan)
+        self._transport = transport
+        self._clients: Dict[str, httpx.AsyncClient] = {}
+        self.tile_cache = tiles if tiles is not None else tile_cache
+        # Offline mode: when an extract is loaded, searches never touch the mirrors
+        self.osm_index = OSMIndex()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self.mirror_health = MirrorHealth(
+            self.overpass_urls,
+            alpha=settings.overpass_health_alpha,
+            failure_threshold=settings.overpass_circuit_failures,
+            open_seconds=settings.overpass_circuit_open_seconds,
+            max_open_seconds=settings.overpass_circuit_max_open_seconds,
+        )
+        # Concurrent taps on the same place share one Gemini call
+        self._insights_flight = SingleFlight()
+        # Persistent insights store (SessionLocal unless a factory is injected)
+        self._session_factory = session_factory
+        self._insights_store_enabled = True
         self.category_tags = {
             # 🏥 Health
             "hospital": ("amenity", "hospital"),
@@ -106,93 +168,283 @@ class MapService:
         """
         return await self.get_nearby_places(lat, lon, category="office", radius=radius)
 
-    async def get_nearby_places(self, lat: float, lon: float, category: str, radius: int = 1000) -> List[Dict]:
+    async def search_nearby_companies_page(
+        self,
+        lat: float,
+        lon: float,
+        radius: int = 1000,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """search_nearby_companies, paged like get_nearby_places_page."""
+        return self.paginate(await self.search_nearby_companies(lat, lon, radius), offset, limit)
+
+    async def get_nearby_places(
+        self,
+        lat: float,
+        lon: float,
+        category: str,
+        radius: int = 1000,
+    ) -> List[Dict]:
         """
         Generic search for places near a specific location using OpenStreetMap.
+
+        Results are served from the geohash tile cache when possible: the covering tiles
+        are looked up per category, missing ones are fetched from Overpass in a single
+        bounding-box query, and the merged tiles are filtered to the exact radius.
+        Places carry a `distance_m` field and are sorted nearest first.
+        """
+        category = category.lower()
+        if category not in self.category_tags:
+            return []
+        results = await self.get_nearby_places_multi(lat, lon, [category], radius)
+        return results[category]
+
+    async def get_nearby_places_page(
+        self,
+        lat: float,
+        lon: float,
+        category: str,
+        radius: int = 1000,
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """One page of get_nearby_places; see paginate for the shape."""
+        return self.paginate(await self.get_nearby_places(lat, lon, category, radius), offset, limit)
+
+    @staticmethod
+    def paginate(places: List[Dict], offset: int = 0, limit: Optional[int] = None) -> Dict[str, Any]:
         """
-        tag_key_value = self.category_tags.get(category.lower())
-        if not tag_key_value:
+        {"data": places[offset:offset + limit], "total": len(places), "next_offset": ...}.
+        `next_offset` is None on the last page; no `limit` means everything from `offset`.
+        """
+        end = min(offset + limit, len(places)) if limit is not None else len(places)
+        return {
+            "data": places[offset:end],
+            "total": len(places),
+            "next_offset": end if end < len(places) else None,
+        }
+
+    async def get_nearby_places_multi(
+        self,
+        lat: float,
+        lon: float,
+        categories: List[str],
+        radius: int = 1000,
+    ) -> Dict[str, List[Dict]]:
+        """
+        Search several categories around one point with at most one Overpass round trip.
+
+        Every category missing tiles is queried in a single union query and the returned
+        elements are partitioned back per category by tag. Unknown categories are ignored.
+        Each category's places are sorted by `distance_m`.
+        """
+        categories = list(dict.fromkeys(c.lower() for c in categories if c.lower() in self.category_tags))
+        if not categories:
+            return {}
+        candidates = await self._candidate_places(lat, lon, categories, radius)
+        return {
+            category: self._rank_by_distance(candidates[category], lat, lon, radius)
+            for category in categories
+        }
+
+    async def refresh_area(self, lat: float, lon: float, categories: List[str], radius: int = 1000) -> bool:
+        """
+        Re-fetch every tile covering the circle for `categories` into the tile cache,
+        ignoring what is cached. Returns False if the area cannot be tiled or Overpass failed.
+        """
+        categories = [c for c in categories if c in self.category_tags]
+        tiles = tiles_covering(lat, lon, radius, settings.geo_tile_precision)
+        if not categories or len(tiles) > settings.geo_tile_max_query_tiles:
+            return False
+        return await self._fetch_tiles(categories, tiles) is not None
+
+    def _rank_by_distance(self, places: List[Dict], lat: float, lon: float, radius: float) -> List[Dict]:
+        """Copy places within `radius` with a `distance_m` field, nearest first (one vectorized pass)."""
+        places = [p for p in places if p["latitude"] is not None and p["longitude"] is not None]
+        if not places:
             return []
-        tag_key, tag_value = tag_key_value
-        tag_queries = f"nwr[\"{tag_key}\"=\"{tag_value}\"](around:{radius},{lat},{lon});"
+        distances = haversine_many(
+            lat,
+            lon,
+            np.fromiter((p["latitude"] for p in places), dtype=float, count=len(places)),
+            np.fromiter((p["longitude"] for p in places), dtype=float, count=len(places)),
+        )
+        order = np.argsort(distances, kind="stable")
+        ranked = []
+        for i in order[distances[order] <= radius]:
+            place = dict(places[i])
+            place["distance_m"] = round(float(distances[i]), 1)
+            ranked.append(place)
+        return ranked
+
+    async def _candidate_places(
+        self, lat: float, lon: float, categories: List[str], radius: int
+    ) -> Dict[str, List[Dict]]:
+        """Places per category covering the search circle (may include some just outside it)."""
+        if self.osm_index.ready:
+            return {category: self.osm_index.query(category, lat, lon, radius) for category in categories}
+
+        tiles = []
+        if settings.geo_tile_cache_enabled:
+            tiles = tiles_covering(lat, lon, radius, settings.geo_tile_precision)
+        if not tiles or len(tiles) > settings.geo_tile_max_query_tiles:
+            # Too large an area to tile sensibly; ask Overpass for the circle directly
+            return await self._fetch_places_around(lat, lon, categories, radius)
+
+        by_tile: Dict[str, Dict[str, List[Dict]]] = {category: {} for category in categories}
+        missing: List[str] = []
+        to_fetch: List[str] = []
+        for category in categories:
+            for tile in tiles:
+                places = self.tile_cache.get(category, tile)
+                if places is None:
+                    if tile not in missing:
+                        missing.append(tile)
+                    if category not in to_fetch:
+                        to_fetch.append(category)
+                else:
+                    by_tile[category][tile] = places
+
+        if to_fetch:
+            fetched = await self._fetch_tiles(to_fetch, missing)
+            for category in to_fetch:
+                if fetched is None:
+                    # Mirrors are down: serve nothing for this category rather than a partial area
+                    by_tile[category] = {}
+                else:
+                    by_tile[category].update(fetched[category])
+
+        return {
+            category: [place for tile in tiles for place in by_tile[category].get(tile, [])]
+            for category in categories
+        }
+
+    def _overpass_query(self, selector: str) -> str:
         # Increased timeout in Overpass QL for more complex/larger radius searches
-        query = f"""
+        return f"""
         [out:json][timeout:30];
         (
-          {tag_queries}
+          {selector}
         );
         out center;
         """
-        headers = {
-            "User-Agent": "HustlersMapService/1.0 (contact: dev@hustlers.local)",
-            "Accept": "application/json",
+
+    def _element_to_place(self, element: Dict, category: str) -> Dict:
+        tags = element["tags"]
+        return {
+            "id": element.get("id"),
+            # OSM ids are only unique per element type
+            "osm_type": element.get("type"),
+            "name": tags.get("name", f"Unnamed {category.title()}"),
+            "description": tags.get("description") or tags.get("addr:description", ""),
+            "type": tags.get("tourism") or tags.get("amenity") or tags.get("office", category),
+            "website": tags.get("website", ""),
+            "phone": tags.get("phone") or tags.get("contact:phone", ""),
+            "email": tags.get("email") or tags.get("contact:email", ""),
+            "address": tags.get("addr:street") or tags.get("addr:full", ""),
+            "latitude": element.get("lat") or element.get("center", {}).get("lat"),
+            "longitude": element.get("lon") or element.get("center", {}).get("lon")
         }
-        # Increased httpx timeout to accommodate Overpass QL timeout
-        timeout = httpx.Timeout(40.0, connect=10.0)
 
-        # Shuffle URLs to distribute load across mirrors
-        shuffled_urls = list(self.overpass_urls)
-        random.shuffle(shuffled_urls)
+    def _selectors(self, categories: List[str], area: str) -> str:
+        return "\n          ".join(
+            f"nwr[\"{tag_key}\"=\"{tag_value}\"]({area});"
+            for tag_key, tag_value in (self.category_tags[category] for category in categories)
+        )
+
+    def _partition(self, data: Dict, categories: List[str]) -> Dict[str, List[Dict]]:
+        """Split a union query's elements back per category (an element may match several)."""
+        places: Dict[str, List[Dict]] = {category: [] for category in categories}
+        for element in data.get("elements", []):
+            tags = element.get("tags")
+            if not tags:
+                continue
+            for category in categories:
+                tag_key, tag_value = self.category_tags[category]
+                if tags.get(tag_key) == tag_value:
+                    places[category].append(self._element_to_place(element, category))
+        return places
 
-        async with httpx.AsyncClient(headers=headers, timeout=timeout, follow_redirects=True) as client:
-            last_error: Optional[Exception] = None
-            for url in shuffled_urls:
-                try:
-                    response = await client.post(url, data={"data": query})
-                    if response.status_code == 429:
-                        print(f"Rate limited by Overpass mirror: {url}")
-                        continue
-                        
-                    response.raise_for_status()
-                    data = response.json()
-
-                    places = []
-                    for element in data.get("elements", []):
-                        if "tags" in element:
-                            tags = element["tags"]
-                            places.append({
-                                "id": element.get("id"),
-                                "name": tags.get("name", f"Unnamed {category.title()}"),
-                                "description": tags.get("description") or tags.get("addr:description", ""),
-                                "type": tags.get("tourism") or tags.get("amenity") or tags.get("office", category),
-                                "website": tags.get("website", ""),
-                                "phone": tags.get("phone") or tags.get("contact:phone", ""),
-                                "email": tags.get("email") or tags.get("contact:email", ""),
-                                "address": tags.get("addr:street") or tags.get("addr:full", ""),
-                                "latitude": element.get("lat") or element.get("center", {}).get("lat"),
-                                "longitude": element.get("lon") or element.get("center", {}).get("lon")
-                            })
-                    return places
-                except httpx.HTTPStatusError as e:
-                    last_error = e
-                    status = e.response.status_code
-                    body_preview = e.response.text[:300].strip()
-                    print(f"Overpass HTTP error {status} from {url}: {body_preview}")
-                    if status in {429, 504, 502, 503}:
-                        continue
-                except httpx.RequestError as e:
-                    last_error = e
-                    print(f"Overpass request error from {url}: {type(e).__name__} - {e}")
+    async def _fetch_places_around(
+        self, lat: float, lon: float, categories: List[str], radius: int
+    ) -> Dict[str, List[Dict]]:
+        query = self._overpass_query(self._selectors(categories, f"around:{radius},{lat},{lon}"))
+        data = await self._post_overpass(query)
+        if data is None:
+            return {category: [] for category in categories}
+        return self._partition(data, categories)
+
+    async def _fetch_tiles(self, categories: List[str], tiles: List[str]) -> Optional[Dict[str, Dict[str, List[Dict]]]]:
+        """Fetch whole tiles for every category with one bounding-box query and cache them."""
+        south, west, north, east = union_bounds(tiles)
+        query = self._overpass_query(self._selectors(categories, f"{south},{west},{north},{east}"))
+        data = await self._post_overpass(query)
+        if data is None:
+            return None
+
+        precision = len(tiles[0])
+        fetched: Dict[str, Dict[str, List[Dict]]] = {}
+        for category, places in self._partition(data, categories).items():
+            by_tile: Dict[str, List[Dict]] = {tile: [] for tile in tiles}
+            for place in places:
+                if place["latitude"] is None or place["longitude"] is None:
                     continue
-                except Exception as e:
-                    last_error = e
-                    print(f"Error fetching places from Overpass ({url}): {type(e).__name__} - {e}")
+                tile = geohash_encode(place["latitude"], place["longitude"], precision)
+                if tile in by_tile:
+                    by_tile[tile].append(place)
+            for tile, tile_places in by_tile.items():
+                self.tile_cache.put(category, tile, tile_places)
+            fetched[category] = by_tile
+        return fetched
+
+    async def _post_overpass(self, query: str) -> Optional[Dict]:
+        """POST a query to the Overpass mirrors, healthiest first. Returns the JSON body, or None if all fail."""
+        last_error: Optional[Exception] = None
+        for attempt, url in enumerate(self.mirror_health.order()):
+            if attempt:
+                record_retry("overpass")
+            started = time.perf_counter()
+            try:
+                response = await self._client_for(url).post(url, data={"data": query})
+                if response.status_code == 429:
+                    self._observe_overpass(url, "rate_limited", started, query)
+                    self.mirror_health.report_failure(url, time.perf_counter() - started)
+                    print(f"Rate limited by Overpass mirror: {url}")
                     continue
 
-            print(f"Error fetching places from Overpass: {last_error}")
-            return []
+                outcome = "success" if response.is_success else "error"
+                self._observe_overpass(url, outcome, started, query, len(response.content))
+                if response.status_code >= 500:
+                    self.mirror_health.report_failure(url, time.perf_counter() - started)
+                else:
+                    # 4xx means a bad query, not a sick mirror
+                    self.mirror_health.report_success(url, time.perf_counter() - started)
+                response.raise_for_status()
+                return response.json()
+            except httpx.HTTPStatusError as e:
+                last_error = e
+                status = e.response.status_code
+                body_preview = e.response.text[:300].strip()
+                print(f"Overpass HTTP error {status} from {url}: {body_preview}")
+                if status in {429, 504, 502, 503}:
+                    continue
+            except httpx.RequestError as e:
+                last_error = e
+                self._observe_overpass(url, "error", started, query)
+                self.mirror_health.report_failure(url, time.perf_counter() - started)
+                print(f"Overpass request error from {url}: {type(e).__name__} - {e}")
+                continue
+            except Exception as e:
+                last_error = e
+                print(f"Error fetching places from Overpass ({url}): {type(e).__name__} - {e}")
+                continue
 
-    async def get_hotel_insights(self, hotel_data: Dict) -> Dict | str:
-        """
-        Use AI to generate deep insights for a hotel based on its available data.
-        Helps software engineers identify specific value propositions.
-        """
-        # Convert the dictionary to a formatted string for the AI
-        hotel_info_str = json.dumps(hotel_data, indent=2)
-        
-        allowed_scale = ["extremely low", "low", "medium", "high", "extremely high"]
+        print(f"Error fetching places from Overpass: {last_error}")
+        return None
 
-        prompt_template = (
+    def _hotel_prompt_template(self) -> str:
+        return (
             "You must return STRICT JSON ONLY. No extra text. "
             "If you cannot follow the schema exactly, return an empty string.\n\n"
             "SCHEMA (all keys required, keep exact key names and types):\n"
@@ -240,64 +492,50 @@ class MapService:
             "Never add extra keys."
         )
 
-        response_text = self.ai_service.respond_to_input(hotel_info_str, prompt_template=prompt_template)
+    def _is_valid_hotel_insights(self, payload: Dict) -> bool:
+        try:
+            if not isinstance(payload, dict):
+                return False
+            required_keys = [
+                "hotel", "current_state", "key_problems", "missing_components",
+                "business_impact", "recommended_solutions", "value_for_hotel", "outreach_summary"
+            ]
+            if any(k not in payload for k in required_keys):
+                return False
 
-        def is_valid(payload: Dict) -> bool:
-            try:
-                if not isinstance(payload, dict):
-                    return False
-                required_keys = [
-                    "hotel", "current_state", "key_problems", "missing_components",
-                    "business_impact", "recommended_solutions", "value_for_hotel", "outreach_summary"
-                ]
-                if any(k not in payload for k in required_keys):
-                    return False
+            if payload["current_state"]["online_visibility"] not in ALLOWED_SCALE:
+                return False
+            if payload["business_impact"]["lost_bookings"] not in ALLOWED_SCALE:
+                return False
+            if payload["business_impact"]["growth_potential"] not in ALLOWED_SCALE:
+                return False
 
-                if payload["current_state"]["online_visibility"] not in allowed_scale:
+            contact = payload["current_state"]["contact_information"]
+            for k in ["website", "phone", "email", "address"]:
+                if k not in contact:
                     return False
-                if payload["business_impact"]["lost_bookings"] not in allowed_scale:
-                    return False
-                if payload["business_impact"]["growth_potential"] not in allowed_scale:
-                    return False
-
-                contact = payload["current_state"]["contact_information"]
-                for k in ["website", "phone", "email", "address"]:
-                    if k not in contact:
-                        return False
 
-                rec = payload["recommended_solutions"]
-                for k in ["website", "booking", "payments", "local_seo", "operations", "marketing"]:
-                    if k not in rec:
-                        return False
+            rec = payload["recommended_solutions"]
+            for k in ["website", "booking", "payments", "local_seo", "operations", "marketing"]:
+                if k not in rec:
+                    return False
 
-                loc = payload["hotel"]["location"]
-                for k in ["latitude", "longitude"]:
-                    if k not in loc:
-                        return False
+            loc = payload["hotel"]["location"]
+            for k in ["latitude", "longitude"]:
+                if k not in loc:
+                    return False
 
-                return True
-            except Exception:
-                return False
+            return True
+        except Exception:
+            return False
 
-        try:
-            parsed = json.loads(response_text)
-            return parsed if is_valid(parsed) else ""
-        except Exception as e:
-            print(f"Failed to parse AI response: {response_text}, error: {e}")
-            return ""
-
-    async def get_company_insights(self, company_data: Dict, company_type: Optional[str] = None) -> Dict | str:
-        """
-        Use AI to generate deep insights for any company type based on its available data.
-        """
-        company_info_str = json.dumps(company_data, indent=2)
-        allowed_scale = ["extremely low", "low", "medium", "high", "extremely high"]
-        
+    def _company_label(self, company_data: Dict, company_type: Optional[str] = None) -> str:
         # Use provided type or fallback to the 'type' field in data, then 'company'
         raw_type = company_type or company_data.get("type", "company")
-        company_label = raw_type.strip().lower()
+        return raw_type.strip().lower()
 
-        prompt_template = (
+    def _company_prompt_template(self, company_label: str) -> str:
+        return (
             "You must return STRICT JSON ONLY. No extra text. "
             "If you cannot follow the schema exactly, return an empty string.\n\n"
             f"COMPANY TYPE: {company_label}\n"
@@ -346,45 +584,44 @@ class MapService:
             "Never add extra keys."
         )
 
-        response_text = self.ai_service.respond_to_input(company_info_str, prompt_template=prompt_template)
+    def _is_valid_company_insights(self, payload: Dict) -> bool:
+        try:
+            if not isinstance(payload, dict):
+                return False
+            required_keys = [
+                "company", "current_state", "key_problems", "missing_components",
+                "business_impact", "recommended_solutions", "value_for_company", "outreach_summary"
+            ]
+            if any(k not in payload for k in required_keys):
+                return False
 
-        def is_valid(payload: Dict) -> bool:
-            try:
-                if not isinstance(payload, dict):
-                    return False
-                required_keys = [
-                    "company", "current_state", "key_problems", "missing_components",
-                    "business_impact", "recommended_solutions", "value_for_company", "outreach_summary"
-                ]
-                if any(k not in payload for k in required_keys):
-                    return False
+            if payload["current_state"]["online_visibility"] not in ALLOWED_SCALE:
+                return False
+            if payload["business_impact"]["lost_leads"] not in ALLOWED_SCALE:
+                return False
+            if payload["business_impact"]["growth_potential"] not in ALLOWED_SCALE:
+                return False
 
-                if payload["current_state"]["online_visibility"] not in allowed_scale:
-                    return False
-                if payload["business_impact"]["lost_leads"] not in allowed_scale:
-                    return False
-                if payload["business_impact"]["growth_potential"] not in allowed_scale:
+            contact = payload["current_state"]["contact_information"]
+            for k in ["website", "phone", "email", "address"]:
+                if k not in contact:
                     return False
 
-                contact = payload["current_state"]["contact_information"]
-                for k in ["website", "phone", "email", "address"]:
-                    if k not in contact:
-                        return False
+            rec = payload["recommended_solutions"]
+            for k in ["website", "seo", "payments", "operations", "marketing"]:
+                if k not in rec:
+                    return False
 
-                rec = payload["recommended_solutions"]
-                for k in ["website", "seo", "payments", "operations", "marketing"]:
-                    if k not in rec:
-                        return False
+            loc = payload["company"]["location"]
+            for k in ["latitude", "longitude"]:
+                if k not in loc:
+                    return False
 
-                loc = payload["company"]["location"]
-                for k in ["latitude", "longitude"]:
-                    if k not in loc:
-                        return False
-
-                return True
-            except Exception:
-                return False
+            return True
+        except Exception:
+            return False
 
+    def _parse_insights(self, response_text: str, is_valid: Callable[[Dict], bool]) -> Dict | str:
         try:
             parsed = json.loads(response_text)
             return parsed if is_valid(parsed) else ""
@@ -392,5 +629,426 @@ class MapService:
             print(f"Failed to parse AI response: {response_text}, error: {e}")
             return ""
 
+    async def _stream_insights(
+        self,
+        info_str: str,
+        prompt_template: str,
+        is_valid: Callable[[Dict], bool],
+        kind: str,
+        label: str,
+        place: Dict,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        stored = await self._stored_insights(kind, label, place)
+        if stored is not None:
+            yield ("result", stored)
+            return
+
+        async for event, text in self.ai_service.astream_response(
+            info_str,
+            prompt_template=prompt_template,
+            cache_ttl=settings.llm_cache_insights_ttl_seconds,
+            validator=is_valid,
+        ):
+            if event == "delta":
+                yield ("delta", text)
+            else:
+                insights = self._parse_insights(text, is_valid)
+                await self._store_insights(kind, label, place, insights)
+                yield ("result", insights)
+
+    def _osm_ref(self, place: Dict) -> Optional[Tuple[str, int]]:
+        """(element type, id) of the place; None if either is missing, so nodes and ways never collide."""
+        osm_type = place.get("osm_type")
+        if osm_type not in OSM_ELEMENT_TYPES:
+            return None
+        try:
+            return osm_type, int(place.get("id"))
+        except (TypeError, ValueError):
+            return None
+
+    def _open_store(self):
+        if self._session_factory is None:
+            # Deferred so the service imports without a database driver (scripts, tests)
+            from app.db.session import SessionLocal
+            self._session_factory = SessionLocal
+        return self._session_factory()
+
+    def _read_stored_insights(self, osm_type: str, osm_id: int, kind: str, fingerprint: str) -> Optional[Dict]:
+        db = self._open_store()
+        try:
+            max_age = timedelta(days=settings.insights_store_max_age_days)
+            return get_fresh_insight(db, osm_type, osm_id, kind, fingerprint, max_age)
+        finally:
+            db.close()
+
+    def _write_stored_insights(
+        self, osm_type: str, osm_id: int, kind: str, fingerprint: str, place: Dict, insights: Dict
+    ) -> None:
+        db = self._open_store()
+        try:
+            save_insight(db, osm_type, osm_id, kind, fingerprint, place, insights)
+        finally:
+            db.close()
+
+    def _store_available(self, place: Dict) -> Optional[Tuple[str, int]]:
+        if not settings.insights_store_enabled or not self._insights_store_enabled:
+            return None
+        return self._osm_ref(place)
+
+    def _store_failed(self, action: str, kind: str, ref: Tuple[str, int], error: Exception) -> None:
+        # Missing table or unreachable database: nothing runs init_db at startup, so stop
+        # paying for a failing round-trip on every request until the process restarts
+        if isinstance(error, (OperationalError, ProgrammingError)):
+            if self._insights_store_enabled:
+                self._insights_store_enabled = False
+                logger.warning("Insights store disabled (run add_company_insights_table.py): %s", error)
+            return
+        logger.warning("Error %s stored insights for %s %s/%s: %s", action, kind, ref[0], ref[1], error)
+
+    async def _stored_insights(self, kind: str, label: str, place: Dict) -> Optional[Dict]:
+        """Persisted insights for this exact place data, if fresh enough. Store errors are treated as a miss."""
+        ref = self._store_available(place)
+        if ref is None:
+            return None
+        try:
+            return await asyncio.to_thread(
+                self._read_stored_insights, *ref, kind, fingerprint_place(kind, label, place)
+            )
+        except Exception as e:
+            self._store_failed("reading", kind, ref, e)
+            return None
+
+    async def _store_insights(self, kind: str, label: str, place: Dict, insights: Dict | str) -> None:
+        ref = self._store_available(place)
+        if ref is None or not isinstance(insights, dict):
+            return
+        try:
+            await asyncio.to_thread(
+                self._write_stored_insights, *ref, kind, fingerprint_place(kind, label, place), place, insights
+            )
+        except Exception as e:
+            self._store_failed("writing", kind, ref, e)
+
+    async def list_stored_insights(
+        self,
+        lat: float,
+        lon: float,
+        radius: int = 1000,
+        kind: Optional[str] = None,
+        limit: int = 200,
+    ) -> List[Dict]:
+        """Previously generated insights for places around a point, nearest first. Never calls the model."""
+        dlat = math.degrees(radius / EARTH_RADIUS_M)
+        dlon = math.degrees(radius / (EARTH_RADIUS_M * max(math.cos(math.radians(lat)), 1e-6)))
+
+        def read() -> List[Dict]:
+            db = self._open_store()
+            try:
+                rows = list_insights_in_bounds(db, lat - dlat, lon - dlon, lat + dlat, lon + dlon, kind=kind)
+                return [
+                    {
+                        "id": row.osm_id,
+                        "osm_type": row.osm_type,
+                        "kind": row.kind,
+                        "name": row.name,
+                        "latitude": row.latitude,
+                        "longitude": row.longitude,
+                        "updated_at": row.updated_at.isoformat(),
+                        "insights": json.loads(row.insights),
+                    }
+                    for row in rows
+                ]
+            finally:
+                db.close()
+
+        stored = await asyncio.to_thread(read)
+        return self._rank_by_distance(stored, lat, lon, radius)[:limit]
+
+    def _new_client(self) -> httpx.AsyncClient:
+        limits = httpx.Limits(
+            max_connections=settings.overpass_max_connections_per_host,
+            max_keepalive_connections=settings.overpass_max_keepalive_per_host,
+            keepalive_expiry=settings.overpass_keepalive_expiry,
+        )
+        return httpx.AsyncClient(
+            headers=OVERPASS_HEADERS,
+            # Increased httpx timeout to accommodate Overpass QL timeout
+            timeout=httpx.Timeout(40.0, connect=10.0),
+            limits=limits,
+            http2=settings.overpass_http2 and HTTP2_AVAILABLE,
+            transport=self._transport,
+            follow_redirects=True,
+        )
+
+    def _client_for(self, url: str) -> httpx.AsyncClient:
+        """Pooled client for the mirror serving `url` (created lazily outside the app lifespan)."""
+        host = urlsplit(url).netloc
+        client = self._clients.get(host)
+        if client is None or client.is_closed:
+            client = self._new_client()
+            self._clients[host] = client
+        return client
+
+    async def startup(self) -> None:
+        """Open the pooled Overpass clients and load the offline extract, if configured. Called from the FastAPI lifespan."""
+        for url in self.overpass_urls:
+            self._client_for(url)
+        if settings.osm_extract_path:
+            await self.load_osm_extract(settings.osm_extract_path)
+            self._refresh_task = asyncio.create_task(self._refresh_osm_extract_loop())
+
+    async def shutdown(self) -> None:
+        """Close the pooled Overpass clients and their keep-alive connections."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.aclose()
+
+    async def load_osm_extract(self, path: str) -> bool:
+        """
+        (Re)build the offline index from an Overpass JSON dump or .pbf extract.
+        Parsing runs in a worker thread; the previous index keeps serving until the swap.
+        """
+        try:
+            started = time.perf_counter()
+            await asyncio.to_thread(self.osm_index.load, path, self.category_tags, self._element_to_place)
+            print(f"Loaded OSM extract {path} in {time.perf_counter() - started:.1f}s: {self.osm_index.stats()['places']}")
+            return True
+        except Exception as e:
+            print(f"Error loading OSM extract ({path}): {type(e).__name__} - {e}")
+            return False
+
+    async def _refresh_osm_extract_loop(self) -> None:
+        while True:
+            await asyncio.sleep(settings.osm_extract_refresh_seconds)
+            if not self.osm_index.ready or self.osm_index.is_stale():
+                await self.load_osm_extract(settings.osm_extract_path)
+
+    def _observe_overpass(self, url: str, outcome: str, started: float, query: str, bytes_received: int = 0) -> None:
+        observe_call(
+            "overpass",
+            url,
+            outcome,
+            time.perf_counter() - started,
+            bytes_sent=len(query.encode("utf-8")),
+            bytes_received=bytes_received,
+        )
+
+    async def get_hotel_insights(self, hotel_data: Dict) -> Dict | str:
+        """
+        Use AI to generate deep insights for a hotel based on its available data.
+        Helps software engineers identify specific value propositions.
+        """
+        # Same place, same key: ranking fields must not split the flight, LLM cache or store
+        hotel_data = strip_volatile_fields(hotel_data)
+        return await self._insights_flight.do(
+            normalize_key("hotel", hotel_data),
+            lambda: self._generate_hotel_insights(hotel_data),
+        )
+
+    async def _generate_hotel_insights(self, hotel_data: Dict) -> Dict | str:
+        stored = await self._stored_insights("hotel", "hotel", hotel_data)
+        if stored is not None:
+            return stored
+
+        # Convert the dictionary to a formatted string for the AI
+        hotel_info_str = json.dumps(hotel_data, indent=2)
+
+        response_text = await self.ai_service.arespond_to_input(
+            hotel_info_str,
+            prompt_template=self._hotel_prompt_template(),
+            cache_ttl=settings.llm_cache_insights_ttl_seconds,
+            hedge=True,
+            validator=self._is_valid_hotel_insights,
+        )
+        insights = self._parse_insights(response_text, self._is_valid_hotel_insights)
+        await self._store_insights("hotel", "hotel", hotel_data, insights)
+        return insights
+
+    async def stream_hotel_insights(self, hotel_data: Dict) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of get_hotel_insights.
+
+        Yields ("delta", text) with partial model output, then one ("result", insights)
+        where insights has passed the same validation as get_hotel_insights ("" if not).
+        """
+        hotel_data = strip_volatile_fields(hotel_data)
+        hotel_info_str = json.dumps(hotel_data, indent=2)
+        async for event in self._stream_insights(
+            hotel_info_str,
+            self._hotel_prompt_template(),
+            self._is_valid_hotel_insights,
+            "hotel",
+            "hotel",
+            hotel_data,
+        ):
+            yield event
+
+    async def get_company_insights(self, company_data: Dict, company_type: Optional[str] = None) -> Dict | str:
+        """
+        Use AI to generate deep insights for any company type based on its available data.
+        Identical requests that arrive while one is in flight share its result.
+        """
+        # Same place, same key: ranking fields must not split the flight, LLM cache or store
+        company_data = strip_volatile_fields(company_data)
+        company_label = self._company_label(company_data, company_type)
+        return await self._insights_flight.do(
+            normalize_key("company", company_label, company_data),
+            lambda: self._generate_company_insights(company_data, company_label),
+        )
+
+    async def _generate_company_insights(self, company_data: Dict, company_label: str) -> Dict | str:
+        stored = await self._stored_insights("company", company_label, company_data)
+        if stored is not None:
+            return stored
+
+        company_info_str = json.dumps(company_data, indent=2)
+
+        response_text = await self.ai_service.arespond_to_input(
+            company_info_str,
+            prompt_template=self._company_prompt_template(company_label),
+            cache_ttl=settings.llm_cache_insights_ttl_seconds,
+            hedge=True,
+            validator=self._is_valid_company_insights,
+        )
+        insights = self._parse_insights(response_text, self._is_valid_company_insights)
+        await self._store_insights("company", company_label, company_data, insights)
+        return insights
+
+    async def batch_company_insights(
+        self,
+        places: List[Dict],
+        company_type: Optional[str] = None,
+        concurrency: Optional[int] = None,
+    ) -> AsyncIterator[Dict]:
+        """
+        Run get_company_insights for many places, at most `concurrency` at a time.
+
+        Yields one dict per place as soon as it finishes (completion order, not input
+        order): {"index", "id", "status": "success", "data"} or {"index", "id",
+        "status": "error", "detail"}. A failing place never aborts the rest of the batch.
+        """
+        semaphore = asyncio.Semaphore(concurrency or settings.insights_batch_concurrency)
+
+        async def run(index: int, place: Dict) -> Dict:
+            async with semaphore:
+                try:
+                    insights = await self.get_company_insights(place, company_type)
+                except Exception as e:
+                    return {"index": index, "id": place.get("id"), "status": "error", "detail": str(e)}
+            if not insights:
+                detail = "AI response did not match the insights schema"
+                return {"index": index, "id": place.get("id"), "status": "error", "detail": detail}
+            return {"index": index, "id": place.get("id"), "status": "success", "data": insights}
+
+        tasks = [asyncio.ensure_future(run(index, place)) for index, place in enumerate(places)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The client went away mid-batch: queued places never start, and in-flight
+            # calls are cancelled unless another request is waiting on the same place
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    async def get_leads(
+        self,
+        lat: float,
+        lon: float,
+        categories: List[str],
+        radius: int = 1000,
+        top_n: int = 5,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Rank nearby places as outreach leads locally and generate AI insights for the top N only.
+
+        Returns {"leads": [...], "total": ..., "insights_generated": ...}. Every lead has
+        `category`, `distance_m` and `lead_score`; the top N of the returned leads also
+        carry `insights` (or `insights_error` when generation failed). Leads cut by
+        `limit` are never sent to the model.
+        """
+        found = await self.get_nearby_places_multi(lat, lon, categories, radius)
+        places = [{**place, "category": category} for category, items in found.items() for place in items]
+        leads = rank_leads(places, radius)
+
+        returned = leads[:limit] if limit is not None else leads
+        top = returned[:top_n]
+        # Insights are generated for the bare place so they are shared with direct lookups
+        async for item in self.batch_company_insights([strip_volatile_fields(lead) for lead in top]):
+            if item["status"] == "success":
+                top[item["index"]]["insights"] = item["data"]
+            else:
+                top[item["index"]]["insights_error"] = item["detail"]
+
+        return {
+            "leads": returned,
+            "total": len(leads),
+            "insights_generated": sum(1 for lead in top if "insights" in lead),
+        }
+
+    async def stream_company_insights(
+        self,
+        company_data: Dict,
+        company_type: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of get_company_insights. Yields the same events as stream_hotel_insights.
+        """
+        company_data = strip_volatile_fields(company_data)
+        company_info_str = json.dumps(company_data, indent=2)
+        company_label = self._company_label(company_data, company_type)
+        async for event in self._stream_insights(
+            company_info_str,
+            self._company_prompt_template(company_label),
+            self._is_valid_company_insights,
+            "company",
+            company_label,
+            company_data,
+        ):
+            yield event
+
 # Global instance
 map_service = MapService()
+
+_TILE_CACHE_LOOKUPS = registry.gauge(
+    "hustlers_geo_tile_cache_lookups", "Geohash tile cache lookups since start, by result.", ["result"]
+)
+_TILE_CACHE_TILES = registry.gauge("hustlers_geo_tile_cache_tiles", "Tiles held in the geohash tile cache.")
+
+
+def _collect_tile_cache_metrics() -> None:
+    stats = map_service.tile_cache.stats()
+    _TILE_CACHE_LOOKUPS.set(stats["hits"], result="hit")
+    _TILE_CACHE_LOOKUPS.set(stats["misses"], result="miss")
+    _TILE_CACHE_TILES.set(stats["tiles"])
+
+
+registry.register_collector(_collect_tile_cache_metrics)
+
+_MIRROR_LATENCY = registry.gauge(
+    "hustlers_overpass_mirror_latency_seconds", "EWMA latency of each Overpass mirror.", ["mirror"]
+)
+_MIRROR_ERROR_RATE = registry.gauge(
+    "hustlers_overpass_mirror_error_rate", "EWMA of failed attempts (429/5xx/timeouts) per Overpass mirror.", ["mirror"]
+)
+_MIRROR_CIRCUIT = registry.gauge(
+    "hustlers_overpass_mirror_circuit_state",
+    "Circuit breaker state per Overpass mirror (0 closed, 1 half-open, 2 open).",
+    ["mirror"],
+)
+CIRCUIT_STATE_VALUES = {"closed": 0, "half_open": 1, "open": 2}
+
+
+def _collect_mirror_metrics() -> None:
+    for mirror in map_service.mirror_health.state():
+        if mirror["latency_seconds"] is not None:
+            _MIRROR_LATENCY.set(mirror["latency_seconds"], mirror=mirror["mirror"])
+        _MIRROR_ERROR_RATE.set(mirror["error_rate"], mirror=mirror["mirror"])
+        _MIRROR_CIRCUIT.set(CIRCUIT_STATE_VALUES[mirror["state"]], mirror=mirror["mirror"])
+
+
+registry.register_collector(_collect_mirror_metrics)
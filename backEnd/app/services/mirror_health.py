@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Added to a mirror's score per unit of error rate; roughly one Overpass timeout
+ERROR_PENALTY_SECONDS = 40.0
+
+
+@dataclass
+class _Mirror:
+    latency: Optional[float] = None  # EWMA of attempt duration (seconds)
+    error_rate: float = 0.0  # EWMA of failed attempts (0..1)
+    consecutive_failures: int = 0
+    state: str = CLOSED
+    open_until: float = 0.0
+    open_seconds: float = 0.0
+    probe_started: Optional[float] = None
+
+
+class MirrorHealth:
+    """
+    Health-ordered mirror selection with a per-mirror circuit breaker.
+
+    Each mirror keeps an EWMA of latency and error rate; `order` returns healthy
+    mirrors fastest first. After `failure_threshold` consecutive 429/5xx/timeouts the
+    circuit opens and the mirror is skipped. Once the cooldown has passed, the circuit
+    goes half-open: exactly one request tries it first, closing the circuit on success
+    or reopening it with a doubled cooldown on failure. A probe that never reports back
+    (e.g. the request was cancelled) is abandoned after one cooldown period.
+    """
+
+    def __init__(
+        self,
+        urls: Sequence[str],
+        alpha: float = 0.3,
+        failure_threshold: int = 3,
+        open_seconds: float = 30,
+        max_open_seconds: float = 600,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.alpha = alpha
+        self.failure_threshold = failure_threshold
+        self.base_open_seconds = open_seconds
+        self.max_open_seconds = max_open_seconds
+        self._clock = clock
+        self._mirrors: Dict[str, _Mirror] = {url: _Mirror() for url in urls}
+        self._lock = threading.Lock()
+
+    def _score(self, mirror: _Mirror) -> float:
+        # Unmeasured mirrors score 0 so they get explored early
+        return (mirror.latency or 0.0) + mirror.error_rate * ERROR_PENALTY_SECONDS
+
+    def order(self) -> List[str]:
+        """Mirrors to try for the next request, best first. Open circuits are left out."""
+        now = self._clock()
+        with self._lock:
+            probes = []
+            healthy = []
+            for url, mirror in self._mirrors.items():
+                if mirror.state == OPEN and now >= mirror.open_until:
+                    mirror.state = HALF_OPEN
+                    mirror.probe_started = None
+                if mirror.state == HALF_OPEN:
+                    stale = mirror.probe_started is not None and now - mirror.probe_started > mirror.open_seconds
+                    if mirror.probe_started is None or stale:
+                        mirror.probe_started = now
+                        probes.append(url)
+                elif mirror.state == CLOSED:
+                    healthy.append(url)
+
+            if not probes and not healthy:
+                # Everything is open: probe the mirror that is closest to reopening
+                url = min(self._mirrors, key=lambda u: self._mirrors[u].open_until)
+                self._mirrors[url].state = HALF_OPEN
+                self._mirrors[url].probe_started = now
+                probes = [url]
+
+            # Random tie-break spreads load across mirrors of equal health
+            healthy.sort(key=lambda u: (self._score(self._mirrors[u]), random.random()))
+            return probes + healthy
+
+    def _observe(self, mirror: _Mirror, latency: float, failed: bool) -> None:
+        if mirror.latency is None:
+            mirror.latency = latency
+        else:
+            mirror.latency += self.alpha * (latency - mirror.latency)
+        mirror.error_rate += self.alpha * ((1.0 if failed else 0.0) - mirror.error_rate)
+
+    def report_success(self, url: str, latency: float) -> None:
+        with self._lock:
+            mirror = self._mirrors.setdefault(url, _Mirror())
+            self._observe(mirror, latency, failed=False)
+            mirror.consecutive_failures = 0
+            mirror.state = CLOSED
+            mirror.open_seconds = 0.0
+            mirror.probe_started = None
+
+    def report_failure(self, url: str, latency: float) -> None:
+        """Record a 429, 5xx or transport error from `url`."""
+        now = self._clock()
+        with self._lock:
+            mirror = self._mirrors.setdefault(url, _Mirror())
+            self._observe(mirror, latency, failed=True)
+            mirror.consecutive_failures += 1
+            mirror.probe_started = None
+            if mirror.state == HALF_OPEN or mirror.consecutive_failures >= self.failure_threshold:
+                mirror.open_seconds = min(
+                    self.max_open_seconds,
+                    mirror.open_seconds * 2 if mirror.state == HALF_OPEN and mirror.open_seconds else self.base_open_seconds,
+                )
+                mirror.state = OPEN
+                mirror.open_until = now + mirror.open_seconds
+
+    def any_available(self) -> bool:
+        """True if at least one mirror's circuit is not open (does not start a probe)."""
+        now = self._clock()
+        with self._lock:
+            return any(m.state != OPEN or now >= m.open_until for m in self._mirrors.values())
+
+    def state(self) -> List[Dict]:
+        now = self._clock()
+        with self._lock:
+            return [
+                {
+                    "mirror": url,
+                    "state": mirror.state,
+                    "latency_seconds": round(mirror.latency, 3) if mirror.latency is not None else None,
+                    "error_rate": round(mirror.error_rate, 3),
+                    "consecutive_failures": mirror.consecutive_failures,
+                    "open_for_seconds": round(max(0.0, mirror.open_until - now), 1) if mirror.state == OPEN else 0.0,
+                }
+                for url, mirror in self._mirrors.items()
+            ]
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import json
+import math
+import os
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.geo_tiles import EARTH_RADIUS_M, haversine_many
+
+
+class KDTree:
+    """Static 2-d tree over projected (x, y) points in metres."""
+
+    def __init__(self, points: Sequence[Tuple[float, float]]):
+        self._points = list(points)
+        # Each node is [point index, axis, left node, right node]; -1 means no child
+        self._nodes: List[List[int]] = []
+        self._root = self._build(list(range(len(self._points))), 0)
+
+    def _build(self, indices: List[int], depth: int) -> int:
+        if not indices:
+            return -1
+        axis = depth % 2
+        indices.sort(key=lambda i: self._points[i][axis])
+        mid = len(indices) // 2
+        node = len(self._nodes)
+        self._nodes.append([indices[mid], axis, -1, -1])
+        self._nodes[node][2] = self._build(indices[:mid], depth + 1)
+        self._nodes[node][3] = self._build(indices[mid + 1:], depth + 1)
+        return node
+
+    def query_radius(self, x: float, y: float, radius: float) -> List[int]:
+        found = []
+        radius_sq = radius * radius
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node < 0:
+                continue
+            index, axis, left, right = self._nodes[node]
+            px, py = self._points[index]
+            if (px - x) ** 2 + (py - y) ** 2 <= radius_sq:
+                found.append(index)
+            delta = (x - px) if axis == 0 else (y - py)
+            if delta <= radius:
+                stack.append(left)
+            if delta >= -radius:
+                stack.append(right)
+        return found
+
+    def __len__(self) -> int:
+        return len(self._points)
+
+
+def _element_matches(tags: Dict, tag_pairs: Sequence[Tuple[str, str]]) -> bool:
+    return any(tags.get(key) == value for key, value in tag_pairs)
+
+
+def _load_overpass_json(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return data.get("elements", []) if isinstance(data, dict) else data
+
+
+def _load_pbf(path: str, tag_pairs: Sequence[Tuple[str, str]]) -> List[Dict]:
+    try:
+        import osmium
+    except ImportError as e:
+        raise RuntimeError("Loading .pbf extracts requires the osmium package (pip install osmium)") from e
+
+    class Collector(osmium.SimpleHandler):
+        def __init__(self):
+            super().__init__()
+            self.elements: List[Dict] = []
+
+        def node(self, n):
+            tags = {t.k: t.v for t in n.tags}
+            if _element_matches(tags, tag_pairs) and n.location.valid():
+                self.elements.append(
+                    {"type": "node", "id": n.id, "lat": n.location.lat, "lon": n.location.lon, "tags": tags}
+                )
+
+        def way(self, w):
+            tags = {t.k: t.v for t in w.tags}
+            if not _element_matches(tags, tag_pairs):
+                return
+            coords = [(nd.lat, nd.lon) for nd in w.nodes if nd.location.valid()]
+            if coords:
+                center = {
+                    "lat": sum(c[0] for c in coords) / len(coords),
+                    "lon": sum(c[1] for c in coords) / len(coords),
+                }
+                self.elements.append({"type": "way", "id": w.id, "center": center, "tags": tags})
+
+    collector = Collector()
+    # Relations (multipolygons) are skipped: nodes and ways cover almost all POIs in city extracts
+    collector.apply_file(path, locations=True)
+    return collector.elements
+
+
+def load_extract(path: str, tag_pairs: Sequence[Tuple[str, str]]) -> List[Dict]:
+    """Read OSM elements from an Overpass JSON dump or a .pbf extract."""
+    if path.endswith(".pbf"):
+        return _load_pbf(path, tag_pairs)
+    return _load_overpass_json(path)
+
+
+class OSMIndex:
+    """
+    In-memory spatial index over a local OSM extract, one KD-tree per category.
+
+    Points are projected to metres around the extract's mean latitude (fine at city
+    scale); candidates from the tree are confirmed with an exact haversine distance.
+    """
+
+    def __init__(self):
+        self._places: Dict[str, List[Dict]] = {}
+        self._trees: Dict[str, KDTree] = {}
+        self._lat0 = 0.0
+        self.path = ""
+        self.mtime = 0.0
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at is not None
+
+    def _project(self, lat: float, lon: float) -> Tuple[float, float]:
+        x = math.radians(lon) * EARTH_RADIUS_M * math.cos(math.radians(self._lat0))
+        y = math.radians(lat) * EARTH_RADIUS_M
+        return x, y
+
+    def build(
+        self,
+        elements: List[Dict],
+        category_tags: Dict[str, Tuple[str, str]],
+        to_place: Callable[[Dict, str], Dict],
+    ) -> None:
+        places: Dict[str, List[Dict]] = {category: [] for category in category_tags}
+        for element in elements:
+            tags = element.get("tags")
+            if not tags:
+                continue
+            for category, (tag_key, tag_value) in category_tags.items():
+                if tags.get(tag_key) == tag_value:
+                    place = to_place(element, category)
+                    if place["latitude"] is not None and place["longitude"] is not None:
+                        places[category].append(place)
+
+        latitudes = [p["latitude"] for items in places.values() for p in items]
+        self._lat0 = sum(latitudes) / len(latitudes) if latitudes else 0.0
+        trees = {
+            category: KDTree([self._project(p["latitude"], p["longitude"]) for p in items])
+            for category, items in places.items()
+        }
+        # Swap in one step so concurrent queries never see a half-built index
+        self._places, self._trees = places, trees
+        self.loaded_at = time.time()
+
+    def load(
+        self,
+        path: str,
+        category_tags: Dict[str, Tuple[str, str]],
+        to_place: Callable[[Dict, str], Dict],
+    ) -> None:
+        mtime = os.path.getmtime(path)
+        elements = load_extract(path, list(category_tags.values()))
+        self.build(elements, category_tags, to_place)
+        self.path = path
+        self.mtime = mtime
+
+    def is_stale(self) -> bool:
+        try:
+            return os.path.getmtime(self.path) != self.mtime
+        except OSError:
+            return False
+
+    def query(self, category: str, lat: float, lon: float, radius: float) -> List[Dict]:
+        tree = self._trees.get(category)
+        if tree is None or not len(tree):
+            return []
+        places = self._places[category]
+        x, y = self._project(lat, lon)
+        # Slack for the projection error; the haversine check below is exact
+        candidates = sorted(tree.query_radius(x, y, radius * 1.01 + 1))
+        if not candidates:
+            return []
+        distances = haversine_many(
+            lat,
+            lon,
+            np.array([places[i]["latitude"] for i in candidates]),
+            np.array([places[i]["longitude"] for i in candidates]),
+        )
+        return [dict(places[i]) for i, distance in zip(candidates, distances) if distance <= radius]
+
+    def stats(self) -> Dict:
+        return {
+            "ready": self.ready,
+            "path": self.path,
+            "loaded_at": self.loaded_at,
+            "places": {category: len(items) for category, items in self._places.items() if items},
+        }
@@ -1,10 +1,11 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
+import json
 from typing import Dict, List, Optional, Tuple
 
-from app.services.ai_service import AIService
-from app.services.github_service import GitHubService
+from app.services.ai_service import ai_service
+from app.services.github_service import github_service
 from app.services.resume_parser_service import ResumeParserService
 
 
@@ -25,8 +26,8 @@ class SuggestionResult:
 class ResumeSuggestionService:
     def __init__(self):
         self.parser = ResumeParserService()
-        self.github = GitHubService()
-        self.ai = AIService()
+        self.github = github_service
+        self.ai = ai_service
 
     async def generate_suggestions(
         self,
@@ -40,7 +41,7 @@ class ResumeSuggestionService:
             username=github_username, role=role, limit=limit
         )
 
-        suggestions = self._ai_suggestions(parsed, github_scores, role)
+        suggestions = await self._ai_suggestions(parsed, github_scores, role)
         if not suggestions:
             suggestions = self._fallback_suggestions(parsed, github_scores, role)
 
@@ -55,7 +56,7 @@ class ResumeSuggestionService:
         )
         return result.to_dict()
 
-    def _ai_suggestions(self, parsed: Dict, github_scores: List[Dict], role: str) -> Dict:
+    async def _ai_suggestions(self, parsed: Dict, github_scores: List[Dict], role: str) -> Dict:
         prompt = (
             "You must return STRICT JSON ONLY. No extra text. "
             "If you cannot follow the schema exactly, return an empty string.\n\n"
@@ -82,36 +83,37 @@ class ResumeSuggestionService:
             "github_scores": github_scores,
         }
 
-        response = self.ai.respond_to_input(
+        response = await self.ai.arespond_to_input(
             user_input=str(payload),
             prompt_template=prompt,
+            hedge=True,
+            validator=self._is_valid_suggestions,
         )
 
         if not response or "error" in response:
             return {}
 
         try:
-            import json
-
             parsed_json = json.loads(response)
-            if not isinstance(parsed_json, dict):
-                return {}
-            required_keys = [
-                "resume_summary",
-                "strengths",
-                "gaps",
-                "skills_to_add",
-                "project_improvements",
-                "bullet_rewrites",
-                "github_highlights",
-                "next_steps",
-            ]
-            if any(key not in parsed_json for key in required_keys):
-                return {}
-            return parsed_json
+            return parsed_json if self._is_valid_suggestions(parsed_json) else {}
         except Exception:
             return {}
 
+    def _is_valid_suggestions(self, parsed_json: Dict) -> bool:
+        if not isinstance(parsed_json, dict):
+            return False
+        required_keys = [
+            "resume_summary",
+            "strengths",
+            "gaps",
+            "skills_to_add",
+            "project_improvements",
+            "bullet_rewrites",
+            "github_highlights",
+            "next_steps",
+        ]
+        return all(key in parsed_json for key in required_keys)
+
     def _fallback_suggestions(self, parsed: Dict, github_scores: List[Dict], role: str) -> Dict:
         strengths: List[str] = []
         gaps: List[str] = []
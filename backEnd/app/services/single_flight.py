@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+def normalize_key(*parts: Any) -> str:
+    """Build a stable key from request inputs (dict key order and whitespace do not matter)."""
+    return json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False, separators=(",", ":"))
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls into one upstream computation.
+
+    The first caller for a key starts the work; callers arriving while it is still
+    running await the same task and get the same result (or exception). The key is
+    forgotten as soon as the task finishes, so later calls compute afresh.
+
+    A caller that is cancelled leaves the work running for the others; once the last
+    waiting caller is cancelled, the shared task is cancelled too.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        self._waiters: Dict[asyncio.Task, int] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shield so one caller disconnecting does not cancel the work for everyone else
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                # Only reachable unfinished when the last waiter was cancelled
+                if not task.done():
+                    task.cancel()
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
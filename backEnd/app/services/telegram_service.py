@@ -1,10 +1,12 @@
-from telethon import TelegramClient
+from telethon import TelegramClient, errors
 from telethon.sessions import StringSession
 from telethon.tl.types import Channel
 from typing import List, Dict
 import asyncio
 import json
+import time
 from app.core.config import settings
+from app.core.metrics import observe_call
 from datetime import datetime
 
 class TelegramService:
@@ -15,8 +17,14 @@ class TelegramService:
             raise ValueError("TELEGRAM_SESSION is required for TelegramService")
         self.client = TelegramClient(StringSession(settings.telegram_session), self.api_id, self.api_hash)
 
+    def _observe(self, operation: str, started: float, outcome: str, bytes_received: int = 0) -> None:
+        observe_call("telegram", operation, outcome, time.perf_counter() - started, bytes_received=bytes_received)
+
     async def get_group_posts(self, group_username: str, limit=None, date_range=None) -> List[Dict]:
 
+        started = time.perf_counter()
+        outcome = "error"
+        received = 0
         await self.client.start()
 
         try:
@@ -43,11 +51,17 @@ class TelegramService:
                     
                     message.deep_link = deep_link
                     posts.append(message.__dict__)
+                    received += len(message.message.encode("utf-8"))
                 # print(message)
+            outcome = "success"
             return posts
 
+        except errors.FloodWaitError:
+            outcome = "rate_limited"
+            raise
         finally:
             await self.client.disconnect()
+            self._observe("get_group_posts", started, outcome, received)
 
     async def get_group_info(self, group_username: str) -> Dict:
         """
@@ -59,6 +73,8 @@ class TelegramService:
         Returns:
             Dictionary with group information
         """
+        started = time.perf_counter()
+        outcome = "error"
         await self.client.start()
 
         try:
@@ -72,10 +88,15 @@ class TelegramService:
             #     'type': 'channel' if isinstance(entity, Channel) else 'group'
             # }
 
+            outcome = "success"
             return entity.__dict__
 
+        except errors.FloodWaitError:
+            outcome = "rate_limited"
+            raise
         finally:
             await self.client.disconnect()
+            self._observe("get_group_info", started, outcome)
 
 # Global instance
 telegram_service = TelegramService()
\ No newline at end of file
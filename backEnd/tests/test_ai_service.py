@@ -0,0 +1,407 @@
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from app.core.metrics import OUTBOUND_RATE_LIMITED, OUTBOUND_RETRIES
+from app.services import ai_service as ai_service_module
+from app.services import llm_backends
+from app.services.ai_service import AIService, JOB_EXTRACTION_PROMPT, extract_job_by_rules
+from app.services.key_scheduler import KeyScheduler, parse_retry_after
+from app.services.llm_backends import FakeBackend, GeminiBackend, prompt_fingerprint
+from app.services.llm_cache import LLMCache
+
+
+def _fake_client(generate):
+    client = MagicMock()
+    client.aio.models.generate_content = generate
+    return client
+
+
+@pytest.fixture
+def ai(monkeypatch):
+    generate = AsyncMock(return_value=SimpleNamespace(text='```json\n{"jobname": "Backend Dev"}\n```'))
+    client = _fake_client(generate)
+    monkeypatch.setattr(llm_backends.genai, "Client", lambda api_key: client)
+    monkeypatch.setattr(AIService, "_load_api_keys", lambda self: ["key-a", "key-b"])
+    svc = AIService(
+        max_concurrency=2,
+        cache=LLMCache(),
+        scheduler=KeyScheduler(requests_per_minute=600),
+        backend=GeminiBackend(),
+    )
+    svc.generate = generate
+    return svc
+
+
+@pytest.mark.asyncio
+async def test_arespond_to_input_strips_markdown(ai):
+    result = await ai.arespond_to_input("some post")
+
+    assert json.loads(result) == {"jobname": "Backend Dev"}
+    ai.generate.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_arespond_to_input_respects_concurrency_cap(ai):
+    in_flight = 0
+    peak = 0
+
+    async def slow_generate(model, contents):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return SimpleNamespace(text="{}")
+
+    ai.generate.side_effect = slow_generate
+    await asyncio.gather(*(ai.arespond_to_input(f"post {i}") for i in range(6)))
+
+    assert peak == 2
+
+
+@pytest.mark.asyncio
+async def test_arespond_to_input_returns_error_json_on_failure(ai):
+    ai.generate.side_effect = RuntimeError("boom")
+
+    result = await ai.arespond_to_input("some post")
+
+    assert json.loads(result) == {"error": "boom"}
+
+
+@pytest.mark.asyncio
+async def test_aextract_jobs_batches_and_falls_back_for_invalid_items(ai):
+    posts = [
+        {"deep_link": "https://t.me/a", "text": "Job Title: Backend Developer"},
+        {"deep_link": "https://t.me/b", "text": "Job Title: Flutter Developer"},
+        {"deep_link": "https://t.me/c", "text": "Job Title: Data Analyst"},
+    ]
+    fields = {"jobtype": "Remote", "price": "", "expierdate": "", "jobdescrbiton": "desc"}
+    batch_answer = [
+        {"deep_link": "https://t.me/a", "jobname": "Backend Developer", **fields},
+        {"deep_link": "https://t.me/b", "jobname": "Flutter Developer", **fields},
+        {"deep_link": "https://t.me/c", "jobname": None},
+    ]
+    single_answer = {"jobname": "Data Analyst", **fields}
+    ai.generate.side_effect = [
+        SimpleNamespace(text=json.dumps(batch_answer)),
+        SimpleNamespace(text=json.dumps(single_answer)),
+    ]
+
+    results = await ai.aextract_jobs(posts)
+
+    assert ai.generate.await_count == 2
+    assert [r["jobname"] for r in results] == ["Backend Developer", "Flutter Developer", "Data Analyst"]
+    assert [r["deep_link"] for r in results] == [p["deep_link"] for p in posts]
+
+
+def test_pack_job_batches_respects_token_budget(ai):
+    posts = [{"deep_link": str(i), "text": "x" * 400} for i in range(10)]
+
+    batches = ai._pack_job_batches(posts, token_budget=500, max_posts=20)
+
+    assert sum(len(b) for b in batches) == 10
+    assert all(len(b) <= 3 for b in batches)
+    assert len(ai._pack_job_batches(posts, token_budget=100000, max_posts=4)) == 3
+
+
+@pytest.mark.asyncio
+async def test_arespond_to_input_serves_repeat_inputs_from_cache(ai):
+    first = await ai.arespond_to_input("same post")
+    second = await ai.arespond_to_input("same post")
+
+    assert first == second
+    ai.generate.assert_awaited_once()
+    assert ai._cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_answers_rejected_by_the_validator_are_not_cached(ai):
+    ai.generate.return_value = SimpleNamespace(text='{"company": {}}')
+    is_valid = lambda data: bool(data.get("company"))
+
+    await ai.arespond_to_input("acme", validator=is_valid)
+    await ai.arespond_to_input("acme", validator=is_valid)
+
+    assert ai.generate.await_count == 2
+    assert ai._cache.stats()["hits"] == 0
+
+
+@pytest.mark.asyncio
+async def test_aextract_jobs_treats_non_object_cache_entries_as_misses(ai):
+    fields = {"jobname": "Backend Developer", "jobtype": "Remote", "price": "", "expierdate": "", "jobdescrbiton": ""}
+    post = {"deep_link": "https://t.me/a", "text": "Job Title: Backend Developer"}
+    ai._remember(post["text"], None, "[]", None)
+    ai.generate.return_value = SimpleNamespace(text=json.dumps(fields))
+
+    results = await ai.aextract_jobs([post])
+
+    assert results[0]["jobname"] == "Backend Developer"
+    assert results[0]["deep_link"] == post["deep_link"]
+    ai.generate.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_single_job_array_replies_are_not_cached(ai):
+    ai.generate.return_value = SimpleNamespace(text="[1, 2]")
+    post = {"deep_link": "https://t.me/a", "text": "not a job"}
+
+    first = await ai.aextract_jobs([post])
+    second = await ai.aextract_jobs([post])
+
+    assert "error" in first[0] and "error" in second[0]
+    assert ai.generate.await_count == 2
+
+
+def test_llm_cache_persists_to_disk_and_honours_template_ttl(tmp_path):
+    db_path = str(tmp_path / "llm_cache.sqlite")
+    cache = LLMCache(db_path=db_path)
+    cache.set_ttl("short template", -1)
+    cache.set("model", "template", "input", '{"ok": true}')
+    cache.set("model", "short template", "input", '{"ok": true}')
+
+    reopened = LLMCache(db_path=db_path)
+
+    assert reopened.get("model", "template", "input") == '{"ok": true}'
+    assert reopened.get("model", "short template", "input") is None
+    assert reopened.get("other-model", "template", "input") is None
+    assert reopened.stats()["disk_hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_llm_cache_disk_tier_runs_off_the_event_loop(tmp_path, monkeypatch):
+    import threading
+
+    cache = LLMCache(db_path=str(tmp_path / "llm_cache.sqlite"))
+    threads = []
+    disk_get, disk_set = cache._disk_get, cache._disk_set
+    monkeypatch.setattr(cache, "_disk_get", lambda *a: threads.append(threading.current_thread()) or disk_get(*a))
+    monkeypatch.setattr(cache, "_disk_set", lambda *a: threads.append(threading.current_thread()) or disk_set(*a))
+
+    await cache.aset("model", "template", "input", '{"ok": true}')
+    cache._entries.clear()
+    assert await cache.aget("model", "template", "input") == '{"ok": true}'
+
+    assert len(threads) == 2
+    assert threading.main_thread() not in threads
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_pair_is_cooled_down_and_skipped(ai):
+    calls = []
+
+    async def generate(model, contents):
+        calls.append(model)
+        if len(calls) == 1:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED {'retryDelay': '30s'}")
+        return SimpleNamespace(text="{}")
+
+    ai.generate.side_effect = generate
+    rate_limited_before = OUTBOUND_RATE_LIMITED.value(service="gemini", target="models/gemini-2.5-flash")
+    retries_before = OUTBOUND_RETRIES.value(service="gemini")
+
+    assert await ai.arespond_to_input("post") == "{}"
+    assert OUTBOUND_RATE_LIMITED.value(service="gemini", target="models/gemini-2.5-flash") == rate_limited_before + 1
+    assert OUTBOUND_RETRIES.value(service="gemini") == retries_before + 1
+
+    cooling = [s for s in ai._scheduler.state() if s["cooldown_seconds"] > 0]
+    assert len(cooling) == 1
+    assert 29 <= cooling[0]["cooldown_seconds"] <= 30
+    assert cooling[0]["failures"] == 1
+
+
+def test_scheduler_prefers_healthy_pairs_and_reports_wait():
+    scheduler = KeyScheduler(requests_per_minute=60)
+    keys, models = ["k1", "k2"], ["m1"]
+
+    scheduler.report_rate_limited("k1", "m1", retry_after=60)
+    assert scheduler.acquire(keys, models) == ("k2", "m1")
+
+    scheduler.report_rate_limited("k2", "m1", retry_after=5)
+    assert scheduler.acquire(keys, models) is None
+    assert 4 < scheduler.next_available_in(keys, models) <= 5
+
+
+def test_scheduler_stays_on_the_preferred_model_until_it_is_exhausted():
+    scheduler = KeyScheduler(requests_per_minute=3)
+    keys, models = ["k1", "k2"], ["m1", "m2"]
+
+    picks = [scheduler.acquire(keys, models) for _ in range(6)]
+    for key, model in picks:
+        scheduler.report_success(key, model)
+
+    # Both keys of the preferred model are used up before falling back
+    assert [model for _, model in picks] == ["m1"] * 6
+    assert scheduler.acquire(keys, models)[1] == "m2"
+
+
+@pytest.mark.asyncio
+async def test_successful_calls_stay_on_the_primary_model(ai):
+    calls = []
+
+    async def generate(model, contents):
+        calls.append(model)
+        return SimpleNamespace(text="{}")
+
+    ai.generate.side_effect = generate
+
+    for i in range(8):
+        await ai.arespond_to_input(f"post {i}")
+
+    assert calls == ["models/gemini-2.5-flash"] * 8
+    assert "models/gemini-2.5-flash-preview-tts" not in ai._models
+
+
+def test_parse_retry_after_hints():
+    assert parse_retry_after("429 ... 'retryDelay': '17s'") == 17.0
+    assert parse_retry_after("Please retry in 3.5s.") == 3.5
+    assert parse_retry_after("RESOURCE_EXHAUSTED") is None
+
+
+@pytest.mark.asyncio
+async def test_astream_response_yields_deltas_then_parsed_result(ai):
+    async def chunks():
+        for text in ['```json\n{"jobname": ', '"Backend Dev"}', "\n```"]:
+            yield SimpleNamespace(text=text)
+
+    ai._backend._client_for("key-a").aio.models.generate_content_stream = AsyncMock(return_value=chunks())
+
+    events = [event async for event in ai.astream_response("some post")]
+
+    assert [e for e, _ in events] == ["delta", "delta", "delta", "result"]
+    assert json.loads(events[-1][1]) == {"jobname": "Backend Dev"}
+    # A repeat request is answered from the cache in a single event
+    assert [e async for e in ai.astream_response("some post")] == [events[-1]]
+
+
+def test_extract_job_by_rules_handles_complete_english_posts_only():
+    post = {
+        "job_title": "Backend Developer",
+        "job_type": "Remote - Full-time",
+        "location": "Addis Ababa, Ethiopia",
+        "sex": "",
+        "salary": "Monthly",
+        "deadline": "February 28th, 2026",
+        "description": "Build and maintain FastAPI services.",
+        "more_info": "",
+        "deeplink": "https://t.me/afriworkapplicantbot/applicantapp?startapp=1",
+    }
+
+    assert extract_job_by_rules(post) == {
+        "jobname": "Backend Developer",
+        "jobtype": "Remote - Full-time",
+        "price": "Monthly",
+        "expierdate": "February 28th, 2026",
+        "jobdescrbiton": "Build and maintain FastAPI services.",
+    }
+    assert extract_job_by_rules({**post, "job_type": ""}) is None
+    assert extract_job_by_rules({**post, "job_title": "የሶፍትዌር መሃንዲስ"}) is None
+
+
+@pytest.mark.asyncio
+async def test_hedged_request_uses_backup_model_when_primary_is_slow(ai, monkeypatch):
+    monkeypatch.setattr(ai_service_module.settings, "gemini_hedge_min_delay", 0.01)
+    monkeypatch.setattr(ai_service_module.settings, "gemini_hedge_budget", 1.0)
+    primary_cancelled = asyncio.Event()
+
+    async def generate(model, contents):
+        if model == "models/gemini-2.5-flash":
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                primary_cancelled.set()
+                raise
+        return SimpleNamespace(text='{"model": "%s"}' % model)
+
+    ai.generate.side_effect = generate
+
+    result = await ai.arespond_to_input("post", hedge=True, validator=lambda payload: "model" in payload)
+
+    assert json.loads(result)["model"] != "models/gemini-2.5-flash"
+    await asyncio.wait_for(primary_cancelled.wait(), timeout=1)
+    assert ai._hedges_sent == 1
+
+
+@pytest.mark.asyncio
+async def test_hedging_respects_budget(ai, monkeypatch):
+    monkeypatch.setattr(ai_service_module.settings, "gemini_hedge_min_delay", 0.01)
+    monkeypatch.setattr(ai_service_module.settings, "gemini_hedge_budget", 0.0)
+
+    async def generate(model, contents):
+        await asyncio.sleep(0.05)
+        return SimpleNamespace(text="{}")
+
+    ai.generate.side_effect = generate
+
+    assert await ai.arespond_to_input("post", hedge=True) == "{}"
+    assert ai.generate.await_count == 1
+    assert ai._hedges_sent == 0
+
+
+def _fake_ai(backend, monkeypatch):
+    monkeypatch.setattr(AIService, "_load_api_keys", lambda self: [])
+    return AIService(cache=LLMCache(), scheduler=KeyScheduler(requests_per_minute=600), backend=backend)
+
+
+@pytest.mark.asyncio
+async def test_fake_backend_replays_recordings_then_fixtures(tmp_path, monkeypatch):
+    prompt = f"{JOB_EXTRACTION_PROMPT}\n\nInput:\nrecorded post"
+    recording = tmp_path / "recorded.jsonl"
+    recording.write_text(
+        json.dumps({"prompt_sha256": prompt_fingerprint(prompt), "response": '{"jobname": "Recorded"}'}) + "\n"
+    )
+    backend = FakeBackend(fixtures_path=str(recording))
+    backend.load_fixtures("tests/jsons/afriwork")
+    ai = _fake_ai(backend, monkeypatch)
+
+    assert json.loads(await ai.arespond_to_input("recorded post")) == {"jobname": "Recorded"}
+    replayed = json.loads(await ai.arespond_to_input("any other post"))
+    assert replayed["Job Title"] == "Guidance and Counseling Officer"
+
+
+@pytest.mark.asyncio
+async def test_fake_backend_synthesizes_schema_valid_json(monkeypatch):
+    from app.services.map_service import map_service
+
+    ai = _fake_ai(FakeBackend(), monkeypatch)
+
+    insights = json.loads(await ai.arespond_to_input("{}", prompt_template=map_service._company_prompt_template("company")))
+    assert map_service._is_valid_company_insights(insights)
+
+    posts = [{"deep_link": f"https://t.me/{i}", "text": f"Job Title: Role {i}"} for i in range(3)]
+    jobs = await ai.aextract_jobs(posts)
+    assert [job["jobname"] for job in jobs] == ["Role 0", "Role 1", "Role 2"]
+    assert ai._backend.calls == 2  # one insights call, one batch for all three posts
+
+
+@pytest.mark.asyncio
+async def test_fake_backend_injects_rate_limits(monkeypatch):
+    # With seed 1 the first draw is a 429 and the next two succeed
+    backend = FakeBackend(rate_limit_rate=0.5, seed=1)
+    ai = _fake_ai(backend, monkeypatch)
+    primary, fallback = ai._models[0], ai._models[1]
+    rate_limited_before = OUTBOUND_RATE_LIMITED.value(service="fake", target=primary)
+
+    results = [json.loads(await ai.arespond_to_input(f"post {i}")) for i in range(2)]
+
+    assert all("error" not in r for r in results)
+    assert backend.calls == 3
+    assert OUTBOUND_RATE_LIMITED.value(service="fake", target=primary) == rate_limited_before + 1
+    # The 429 cooled the primary model down for its 1s retry hint; both posts were served by the fallback
+    state = {s["model"]: s for s in ai._scheduler.state()}
+    assert state[primary]["failures"] == 1
+    assert 0 < state[primary]["cooldown_seconds"] <= 1
+    assert state[fallback]["failures"] == 0
+    assert state[fallback]["tokens"] < ai._scheduler.capacity - 1
+
+
+def test_llm_backend_subclasses_must_implement_the_interface():
+    class Incomplete(llm_backends.LLMBackend):
+        def generate(self, key, model, prompt):
+            return ""
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -1,8 +1,27 @@
+import asyncio
+import hashlib
+import json
+import time
+import httpx
 import pytest
 from unittest.mock import AsyncMock
 from datetime import datetime, timezone
 
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import app.models  # noqa: F401
+from app.core.config import settings
+from app.db.base import Base
 from app.services.github_service import GitHubService
+from app.services.github_tokens import TokenPool
+
+
+def _sqlite_sessions():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
 
 
 @pytest.fixture
@@ -161,3 +180,416 @@ async def test_score_repos_for_role_end_to_end(github_service):
     assert "total" in repo and isinstance(repo["total"], int)
     assert repo["scores"]["relevance"] >= 3
     assert repo["scores"]["quality_docs_tests"] >= 4
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_scoring_requests_are_coalesced(github_service):
+    async def slow_repos(username):
+        await asyncio.sleep(0.01)
+        return []
+
+    github_service._fetch_repos.side_effect = slow_repos
+
+    results = await asyncio.gather(
+        github_service.score_repos_for_role("SomeUser", "backend"),
+        github_service.score_repos_for_role("someuser", "Backend "),
+    )
+
+    assert results == [[], []]
+    github_service._fetch_repos.assert_awaited_once_with("SomeUser")
+
+
+@pytest.mark.asyncio
+async def test_repo_enrichment_runs_concurrently_on_one_pooled_client():
+    in_flight = 0
+    peak = 0
+    all_in_flight = asyncio.Event()
+
+    async def handler(request):
+        nonlocal in_flight, peak
+        path = request.url.path
+        if path.endswith("/repos"):
+            repos = [{"name": f"repo{i}", "html_url": "", "fork": False} for i in range(8)]
+            return httpx.Response(200, json=repos)
+        in_flight += 1
+        peak = max(peak, in_flight)
+        if in_flight == 16:
+            all_in_flight.set()
+        # Hold every call open until all 16 overlap; the timeout only guards against a hang
+        try:
+            await asyncio.wait_for(all_in_flight.wait(), timeout=2)
+        except asyncio.TimeoutError:
+            pass
+        in_flight -= 1
+        if path.endswith("/languages"):
+            return httpx.Response(200, json={"Python": 100})
+        return httpx.Response(404)
+
+    svc = GitHubService(transport=httpx.MockTransport(handler), session_factory=_sqlite_sessions())
+    try:
+        results = await svc.score_repos_for_role("someuser", "backend", limit=8)
+        client = svc._client()
+        assert svc._client() is client
+    finally:
+        await svc.shutdown()
+
+    # All 16 enrichment calls overlap instead of running one after another
+    assert peak == 16
+    # Equal totals keep the listing order
+    assert [r["name"] for r in results] == [f"repo{i}" for i in range(8)]
+    assert all("Python" in r["evidence"]["complexity"] for r in results)
+
+
+@pytest.mark.asyncio
+async def test_repo_enrichment_respects_concurrency_setting(github_service, monkeypatch):
+    monkeypatch.setattr(settings, "github_enrich_concurrency", 2)
+    in_flight = 0
+    peak = 0
+
+    async def slow_languages(username, repo):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return {}
+
+    github_service._fetch_repos.return_value = [{"name": f"repo{i}"} for i in range(6)]
+    github_service._fetch_languages.side_effect = slow_languages
+    github_service._fetch_readme.return_value = ""
+
+    results = await github_service.score_repos_for_role("someuser", "backend", limit=6)
+
+    assert len(results) == 6
+    assert peak == 2
+
+
+FAKE_REPOS = [
+    {
+        "name": "api-server",
+        "html_url": "https://github.com/someuser/api-server",
+        "description": "Backend REST API with FastAPI and postgres",
+        "topics": ["api", "backend"],
+        "updated_at": "2024-01-01T00:00:00Z",
+        "stargazers_count": 12,
+        "forks_count": 4,
+        "size": 2500,
+        "fork": False,
+    },
+    {
+        "name": "dotfiles",
+        "html_url": "https://github.com/someuser/dotfiles",
+        "description": None,
+        "topics": [],
+        "updated_at": "2020-01-01T00:00:00Z",
+        "stargazers_count": 0,
+        "forks_count": 0,
+        "size": 10,
+        "fork": True,
+    },
+]
+FAKE_LANGUAGES = {"api-server": {"Python": 900, "Dockerfile": 100}, "dotfiles": {}}
+FAKE_READMES = {"api-server": "Install, usage and pytest docs. Latency dropped 40%.", "dotfiles": ""}
+
+
+def _fake_github(calls, graphql_errors=False, queries=None):
+    """Local fake of the GitHub REST and GraphQL APIs serving the same portfolio."""
+    queries = queries if queries is not None else []
+
+    def rest(request, response):
+        # Strong ETag over the body, like GitHub; unchanged resources answer 304
+        etag = '"%s"' % hashlib.sha1(response.content).hexdigest()
+        if request.headers.get("if-none-match") == etag:
+            return httpx.Response(304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return response
+
+    def graphql_node(repo):
+        node = {
+            "name": repo["name"],
+            "url": repo["html_url"],
+            "description": repo["description"],
+            "updatedAt": repo["updated_at"],
+            "stargazerCount": repo["stargazers_count"],
+            "forkCount": repo["forks_count"],
+            "diskUsage": repo["size"],
+            "isFork": repo["fork"],
+            "repositoryTopics": {"nodes": [{"topic": {"name": t}} for t in repo["topics"]]},
+            "languages": {
+                "edges": [{"size": size, "node": {"name": name}} for name, size in FAKE_LANGUAGES[repo["name"]].items()]
+            },
+        }
+        readme = FAKE_READMES[repo["name"]]
+        # README.md is missing; the README.rst alias (readme3) carries the text
+        node["readme3"] = {"text": readme} if readme else None
+        return node
+
+    def handler(request):
+        path = request.url.path
+        calls.append(path)
+        if path == "/graphql":
+            queries.append(json.loads(request.content))
+            if graphql_errors:
+                return httpx.Response(200, json={"errors": [{"message": "Something went wrong"}]})
+            body = json.loads(request.content)
+            after = body["variables"]["after"]
+            # One repo per page to exercise pagination
+            index = 0 if after is None else int(after)
+            data = {
+                "repositoryOwner": {
+                    "repositories": {
+                        "pageInfo": {"hasNextPage": index + 1 < len(FAKE_REPOS), "endCursor": str(index + 1)},
+                        "nodes": [graphql_node(FAKE_REPOS[index])],
+                    }
+                }
+            }
+            return httpx.Response(200, json={"data": data})
+        if path.endswith("/repos"):
+            return rest(request, httpx.Response(200, json=FAKE_REPOS))
+        repo = path.split("/")[3]
+        if path.endswith("/languages"):
+            return rest(request, httpx.Response(200, json=FAKE_LANGUAGES[repo]))
+        if FAKE_READMES[repo]:
+            return rest(request, httpx.Response(200, text=FAKE_READMES[repo]))
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+@pytest.mark.asyncio
+async def test_graphql_backend_matches_rest_scores_in_fewer_calls():
+    rest_calls, graphql_calls, queries = [], [], []
+    rest = GitHubService(transport=_fake_github(rest_calls), session_factory=_sqlite_sessions())
+    rest.token = ""
+    graphql = GitHubService(transport=_fake_github(graphql_calls, queries=queries), session_factory=_sqlite_sessions())
+    graphql.token = "token"
+    try:
+        rest_results = await rest.score_repos_for_role("someuser", "backend")
+        graphql_results = await graphql.score_repos_for_role("someuser", "backend")
+    finally:
+        await rest.shutdown()
+        await graphql.shutdown()
+
+    assert graphql_results == rest_results
+    assert rest_results[0]["name"] == "api-server"
+    assert len(rest_calls) == 1 + 2 * len(FAKE_REPOS)
+    assert graphql_calls == ["/graphql", "/graphql"]
+    # Only public repos, like REST /users/{login}/repos, paged by cursor
+    assert all("privacy: PUBLIC" in q["query"] and "ownerAffiliations: OWNER" in q["query"] for q in queries)
+    assert [q["variables"] for q in queries] == [
+        {"login": "someuser", "first": 100, "after": None},
+        {"login": "someuser", "first": 99, "after": "1"},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_graphql_errors_fall_back_to_rest():
+    calls = []
+    svc = GitHubService(transport=_fake_github(calls, graphql_errors=True), session_factory=_sqlite_sessions())
+    svc.token = "token"
+    try:
+        results = await svc.score_repos_for_role("someuser", "backend")
+    finally:
+        await svc.shutdown()
+
+    assert [r["name"] for r in results] == ["api-server", "dotfiles"]
+    assert calls[0] == "/graphql"
+    assert "/users/someuser/repos" in calls
+
+
+@pytest.mark.asyncio
+async def test_rescoring_unchanged_repos_is_served_from_etag_cache():
+    calls = []
+    svc = GitHubService(transport=_fake_github(calls), session_factory=_sqlite_sessions())
+    svc.token = ""
+    statuses = []
+    original_observe = svc._observe
+
+    def observe(endpoint, started, response):
+        statuses.append(response.status_code)
+        original_observe(endpoint, started, response)
+
+    svc._observe = observe
+    try:
+        first = await svc.score_repos_for_role("someuser", "backend")
+        first_statuses, statuses[:] = list(statuses), []
+        # A different limit is a separate scoring run, so every GET goes out again
+        second = await svc.score_repos_for_role("someuser", "backend", limit=4)
+    finally:
+        await svc.shutdown()
+
+    assert second == first
+    assert first_statuses.count(200) == 1 + 2 * len(FAKE_REPOS) - 1  # dotfiles has no README
+    # Everything that was cached revalidates as 304; the missing README stays a 404
+    assert sorted(statuses) == [304] * (2 * len(FAKE_REPOS)) + [404]
+
+
+def test_token_pool_routes_to_most_headroom_and_queues_near_exhaustion():
+    now = [1000.0]
+    pool = TokenPool(reserve=10, clock=lambda: now[0])
+    tokens = ["aaaa-token", "bbbb-token"]
+
+    pool.report("aaaa-token", "core", 200, {"x-ratelimit-remaining": "100", "x-ratelimit-reset": "1600"})
+    pool.report("bbbb-token", "core", 200, {"x-ratelimit-remaining": "11", "x-ratelimit-reset": "1060"})
+    assert pool.acquire(tokens) == "aaaa-token"
+
+    pool.report("aaaa-token", "core", 200, {"x-ratelimit-remaining": "5", "x-ratelimit-reset": "1600"})
+    # One call left above the reserve on b, then both are held back until b resets
+    assert pool.acquire(tokens) == "bbbb-token"
+    assert pool.acquire(tokens) is None
+    assert pool.next_available_in(tokens) == pytest.approx(0.1)
+    pool.report("bbbb-token", "core", 200, {"x-ratelimit-remaining": "10", "x-ratelimit-reset": "1060"})
+    assert pool.acquire(tokens) is None
+    assert pool.next_available_in(tokens) == pytest.approx(60)
+    assert pool.acquire(tokens, force=True) == "bbbb-token"
+
+    # Past the reset the quota is assumed refilled
+    now[0] = 1061
+    assert pool.acquire(tokens) == "bbbb-token"
+    # GraphQL quota is tracked separately
+    assert pool.acquire(tokens, "graphql") is not None
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_token_is_retried_on_the_next_token():
+    seen = []
+
+    def handler(request):
+        token = request.headers["authorization"].split()[-1]
+        seen.append(token)
+        if token == "aaaa-token":
+            return httpx.Response(
+                403,
+                headers={"x-ratelimit-remaining": "0", "x-ratelimit-reset": str(int(time.time()) + 3600)},
+            )
+        return httpx.Response(200, json=[], headers={"x-ratelimit-remaining": "4000"})
+
+    pool = TokenPool(reserve=0)
+    svc = GitHubService(
+        transport=httpx.MockTransport(handler), session_factory=_sqlite_sessions(), token_pool=pool
+    )
+    svc.token = ""
+    svc._tokens = ["aaaa-token", "bbbb-token"]
+    try:
+        # a looks healthier at first, so the call starts there and hits the wall
+        pool.report("bbbb-token", "core", 200, {"x-ratelimit-remaining": "4999"})
+        assert await svc._fetch_repos("someuser") == []
+        # Later calls skip the exhausted token entirely
+        assert await svc._fetch_repos("otheruser") == []
+    finally:
+        await svc.shutdown()
+
+    assert seen == ["aaaa-token", "bbbb-token", "bbbb-token"]
+    state = {q["token"]: q for q in pool.state()}
+    assert state["aaaa...oken"]["remaining"] == 0
+    assert state["bbbb...oken"]["in_flight"] == 0
+
+
+def test_metrics_expose_github_quota():
+    from app.core.metrics import registry
+    from app.services.github_service import github_service
+
+    github_service.token_pool.report("cccc-token", "core", 200, {"x-ratelimit-remaining": "42", "x-ratelimit-limit": "5000"})
+    text = registry.render()
+    assert 'hustlers_github_rate_limit_remaining{token="cccc...oken",resource="core"} 42' in text
+
+
+def _portfolio(count, hot):
+    now = datetime.now(timezone.utc).isoformat()
+    repos = []
+    for i in range(count):
+        if i in hot:
+            repos.append({"name": f"repo{i}", "updated_at": now, "stargazers_count": 300, "fork": False})
+        else:
+            repos.append({"name": f"repo{i}", "updated_at": "2015-01-01T00:00:00Z", "stargazers_count": 0, "fork": True})
+    return repos
+
+
+async def _score_with_mode(svc, monkeypatch, two_phase, limit):
+    monkeypatch.setattr(settings, "github_two_phase_scoring", two_phase)
+    svc._fetch_languages.reset_mock()
+    results = await svc.score_repos_for_role("someuser", "backend", limit=limit)
+    return results, svc._fetch_languages.await_count
+
+
+@pytest.mark.asyncio
+async def test_two_phase_scoring_prunes_repos_without_changing_top_n(github_service, monkeypatch):
+    monkeypatch.setattr(settings, "github_enrich_concurrency", 4)
+    github_service._fetch_repos.return_value = _portfolio(40, hot={3, 17, 31})
+    github_service._fetch_languages.return_value = {"Python": 100}
+    github_service._fetch_readme.return_value = "Install and usage. Backend API, tests with pytest."
+
+    full, full_calls = await _score_with_mode(github_service, monkeypatch, False, limit=3)
+    pruned, pruned_calls = await _score_with_mode(github_service, monkeypatch, True, limit=3)
+
+    assert pruned == full
+    assert [r["name"] for r in pruned] == ["repo3", "repo17", "repo31"]
+    assert full_calls == 40
+    # One wave of 4 settles the top 3; the stale forks can't catch up
+    assert pruned_calls == 4
+
+
+@pytest.mark.asyncio
+async def test_two_phase_scoring_breaks_ties_by_listing_order(github_service, monkeypatch):
+    monkeypatch.setattr(settings, "github_enrich_concurrency", 2)
+    github_service._fetch_repos.return_value = _portfolio(12, hot=set())
+
+    async def languages(username, repo):
+        # Every bound is equal; exact totals only differ by language count, with many ties
+        return {f"lang{n}": 1 for n in range(int(repo[4:]) % 3)}
+
+    github_service._fetch_languages.side_effect = languages
+    github_service._fetch_readme.return_value = ""
+
+    full, _ = await _score_with_mode(github_service, monkeypatch, False, limit=4)
+    pruned, _ = await _score_with_mode(github_service, monkeypatch, True, limit=4)
+
+    assert pruned == full
+
+
+@pytest.mark.asyncio
+async def test_etag_cache_serves_from_memory_and_survives_a_missing_table(capsys):
+    from sqlalchemy import create_engine as _create_engine
+
+    # No tables created: the database tier fails and must fall back to memory quietly
+    broken = sessionmaker(bind=_create_engine("sqlite://", poolclass=StaticPool))
+    calls = []
+    svc = GitHubService(transport=_fake_github(calls), session_factory=broken)
+    svc.token = ""
+    try:
+        first = await svc.score_repos_for_role("someuser", "backend")
+        second = await svc.score_repos_for_role("someuser", "backend", limit=4)
+    finally:
+        await svc.shutdown()
+
+    assert second == first
+    assert not svc._http_store_enabled
+    assert capsys.readouterr().out.count("database tier disabled") == 1
+    assert len(svc._http_memo) == 1 + 2 * len(FAKE_REPOS) - 1
+
+
+@pytest.mark.asyncio
+async def test_etag_cache_reloads_validators_from_the_database():
+    sessions = _sqlite_sessions()
+    calls = []
+    first_svc = GitHubService(transport=_fake_github(calls), session_factory=sessions)
+    first_svc.token = ""
+    try:
+        await first_svc._fetch_repos("someuser")
+    finally:
+        await first_svc.shutdown()
+
+    statuses = []
+    second_svc = GitHubService(transport=_fake_github(calls), session_factory=sessions)
+    second_svc.token = ""
+    original_observe = second_svc._observe
+    second_svc._observe = lambda endpoint, started, response: (
+        statuses.append(response.status_code), original_observe(endpoint, started, response)
+    )
+    try:
+        repos = await second_svc._fetch_repos("someuser")
+    finally:
+        await second_svc.shutdown()
+
+    assert repos == FAKE_REPOS
+    assert statuses == [304]
@@ -0,0 +1,596 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.db.base import Base
+import app.models  # noqa: F401
+
+from app.services.ai_service import AIService
+from app.services.geo_tiles import TileCache, haversine_m
+from app.services.key_scheduler import KeyScheduler
+from app.services.lead_scoring import rank_leads
+from app.services.llm_backends import FakeBackend
+from app.services.llm_cache import LLMCache
+from app.services.map_prefetch import MapPrefetcher, PrefetchTarget, parse_prefetch_targets
+from app.services.map_service import MapService
+from app.services.mirror_health import MirrorHealth
+
+
+VALID_COMPANY_INSIGHTS = {
+    "company": {"id": 1, "name": "Acme", "type": "company", "location": {"latitude": 9.0, "longitude": 38.7}},
+    "current_state": {
+        "digital_presence": "weak",
+        "contact_information": {"website": None, "phone": None, "email": None, "address": None},
+        "online_visibility": "low",
+        "customer_acquisition": "word of mouth",
+    },
+    "key_problems": ["no website"],
+    "missing_components": ["website"],
+    "business_impact": {"lost_leads": "high", "revenue_leakage": "some", "growth_potential": "high"},
+    "recommended_solutions": {"website": "", "seo": "", "payments": "", "operations": "", "marketing": ""},
+    "value_for_company": ["more leads"],
+    "outreach_summary": {"goal": "", "primary_pitch": "", "call_to_action": ""},
+}
+
+
+class FakeAIService:
+    def __init__(self, chunks, result):
+        self.chunks = chunks
+        self.result = result
+
+    async def astream_response(self, user_input, prompt_template=None, cache_ttl=None, validator=None):
+        for chunk in self.chunks:
+            yield ("delta", chunk)
+        yield ("result", self.result)
+
+
+def _sqlite_sessions():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+
+@pytest.fixture
+def map_service():
+    return MapService(tiles=TileCache(), session_factory=_sqlite_sessions())
+
+
+@pytest.mark.asyncio
+async def test_stream_company_insights_validates_final_payload(map_service):
+    map_service.ai_service = FakeAIService(["{", "...}"], json.dumps(VALID_COMPANY_INSIGHTS))
+
+    events = [e async for e in map_service.stream_company_insights({"name": "Acme", "type": "company"})]
+
+    assert events[:2] == [("delta", "{"), ("delta", "...}")]
+    assert events[-1] == ("result", VALID_COMPANY_INSIGHTS)
+
+
+@pytest.mark.asyncio
+async def test_stream_company_insights_rejects_invalid_payload(map_service):
+    map_service.ai_service = FakeAIService([], '{"company": {}}')
+
+    events = [e async for e in map_service.stream_company_insights({"name": "Acme"})]
+
+    assert events == [("result", "")]
+
+
+@pytest.mark.asyncio
+async def test_invalid_streamed_insights_are_not_cached(map_service, tmp_path, monkeypatch):
+    fixtures = tmp_path / "invalid.json"
+    fixtures.write_text(json.dumps({"company": {}}))
+    backend = FakeBackend(fixtures_path=str(fixtures))
+    monkeypatch.setattr(AIService, "_load_api_keys", lambda self: [])
+    cache = LLMCache()
+    map_service.ai_service = AIService(cache=cache, scheduler=KeyScheduler(requests_per_minute=600), backend=backend)
+
+    for _ in range(2):
+        events = [e async for e in map_service.stream_company_insights({"name": "Acme", "type": "company"})]
+        assert events[-1] == ("result", "")
+
+    # Both streams reached the model; the rejected answer was never replayed from the cache
+    assert backend.calls == 2
+    assert cache.stats()["hits"] == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_insight_requests_share_one_call(map_service):
+    calls = 0
+
+    class SlowAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return json.dumps(VALID_COMPANY_INSIGHTS)
+
+    map_service.ai_service = SlowAIService()
+    place = {"name": "Acme", "type": "company", "id": 1}
+    same_place_reordered = {"id": 1, "type": "company", "name": "Acme"}
+
+    results = await asyncio.gather(
+        map_service.get_company_insights(place),
+        map_service.get_company_insights(same_place_reordered),
+        map_service.get_company_insights(place),
+    )
+
+    assert calls == 1
+    assert all(r == VALID_COMPANY_INSIGHTS for r in results)
+    assert map_service._insights_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_insight_call_is_cancelled_once_its_last_waiter_goes_away(map_service):
+    started = asyncio.Event()
+    release = asyncio.Event()
+    cancelled = []
+
+    class BlockingAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            started.set()
+            try:
+                await release.wait()
+            except asyncio.CancelledError:
+                cancelled.append(user_input)
+                raise
+            return json.dumps(VALID_COMPANY_INSIGHTS)
+
+    map_service.ai_service = BlockingAIService()
+    place = {"name": "Acme", "type": "company", "id": 1}
+
+    first = asyncio.ensure_future(map_service.get_company_insights(place))
+    second = asyncio.ensure_future(map_service.get_company_insights(place))
+    await started.wait()
+
+    # One of two callers leaving keeps the shared call alive for the other
+    first.cancel()
+    await asyncio.sleep(0)
+    assert cancelled == []
+
+    second.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await second
+    await asyncio.sleep(0)
+    assert len(cancelled) == 1
+    assert map_service._insights_flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_overpass_clients_are_pooled_per_mirror_and_closed_on_shutdown():
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json={"elements": [{"id": 1, "lat": 9.0, "lon": 38.7, "tags": {"name": "Acme", "office": "company"}}]})
+
+    # A zero-size tile cache forces every search out to the mirrors
+    service = MapService(transport=httpx.MockTransport(handler), tiles=TileCache(max_tiles=0))
+    await service.startup()
+    clients = dict(service._clients)
+
+    for _ in range(3):
+        places = await service.get_nearby_places(9.0, 38.7, "company")
+        assert places[0]["name"] == "Acme"
+
+    assert len(clients) == len(service.overpass_urls)
+    assert service._clients == clients
+    assert len(requests) == 3
+
+    await service.shutdown()
+    assert all(client.is_closed for client in clients.values())
+    assert service._clients == {}
+
+
+@pytest.mark.asyncio
+async def test_nearby_searches_are_served_from_cached_tiles():
+    queries = []
+    elements = [
+        {"type": "node", "id": 1, "lat": 9.0192, "lon": 38.7525, "tags": {"name": "Center", "office": "company"}},
+        {"type": "node", "id": 2, "lat": 9.0250, "lon": 38.7525, "tags": {"name": "North 650m", "office": "company"}},
+        {"type": "way", "id": 3, "center": {"lat": 9.0192, "lon": 38.7700}, "tags": {"name": "East 1.9km", "office": "company"}},
+    ]
+
+    def handler(request):
+        queries.append(request.content.decode())
+        return httpx.Response(200, json={"elements": elements})
+
+    service = MapService(transport=httpx.MockTransport(handler), tiles=TileCache())
+
+    wide = await service.get_nearby_places(9.0192, 38.7525, "company", radius=1000)
+    narrow = await service.get_nearby_places(9.0195, 38.7520, "company", radius=300)
+
+    assert sorted(p["name"] for p in wide) == ["Center", "North 650m"]
+    assert [p["name"] for p in narrow] == ["Center"]
+    assert len(queries) == 1
+    assert "around" not in queries[0]
+    assert service.tile_cache.stats()["hits"] > 0
+
+
+def test_haversine_matches_known_distance():
+    # Meskel Square to Bole airport is roughly 5.3 km
+    assert 5000 < haversine_m(9.0107, 38.7613, 8.9779, 38.7993) < 5600
+
+
+@pytest.mark.asyncio
+async def test_multi_category_search_uses_one_union_query():
+    queries = []
+    elements = [
+        {"type": "node", "id": 1, "lat": 9.0192, "lon": 38.7525, "tags": {"name": "Hilton", "tourism": "hotel"}},
+        {"type": "node", "id": 2, "lat": 9.0193, "lon": 38.7526, "tags": {"name": "Tomoca", "amenity": "cafe"}},
+        {"type": "node", "id": 3, "lat": 9.0194, "lon": 38.7527, "tags": {"name": "Acme", "office": "company"}},
+    ]
+
+    def handler(request):
+        queries.append(request.content.decode())
+        return httpx.Response(200, json={"elements": elements})
+
+    service = MapService(transport=httpx.MockTransport(handler), tiles=TileCache())
+
+    results = await service.get_nearby_places_multi(9.0192, 38.7525, ["hotel", "cafe", "company", "unknown"])
+
+    assert {c: [p["name"] for p in places] for c, places in results.items()} == {
+        "hotel": ["Hilton"],
+        "cafe": ["Tomoca"],
+        "company": ["Acme"],
+    }
+    assert len(queries) == 1
+    assert await service.get_nearby_places(9.0192, 38.7525, "cafe") == results["cafe"]
+    assert len(queries) == 1
+
+
+def test_mirror_health_orders_by_latency_and_breaks_circuits():
+    now = [0.0]
+    health = MirrorHealth(["fast", "slow", "bad"], failure_threshold=2, open_seconds=30, clock=lambda: now[0])
+    health.report_success("fast", 0.2)
+    health.report_success("slow", 3.0)
+    health.report_failure("bad", 40.0)
+    assert health.order() == ["fast", "slow", "bad"]
+
+    health.report_failure("bad", 40.0)
+    assert health.order() == ["fast", "slow"]
+
+    # After the cooldown exactly one request probes the mirror, and it goes first
+    now[0] = 31
+    assert health.order() == ["bad", "fast", "slow"]
+    assert health.order() == ["fast", "slow"]
+
+    # A failed probe reopens the circuit for twice as long
+    health.report_failure("bad", 40.0)
+    now[0] = 31 + 59
+    assert "bad" not in health.order()
+    now[0] = 31 + 61
+    assert health.order()[0] == "bad"
+    health.report_success("bad", 0.5)
+    assert [m["state"] for m in health.state()] == ["closed", "closed", "closed"]
+
+
+@pytest.mark.asyncio
+async def test_failing_mirror_is_skipped_once_its_circuit_opens():
+    hits = []
+
+    def handler(request):
+        hits.append(request.url.host)
+        if request.url.host == "overpass-api.de":
+            return httpx.Response(503, text="busy")
+        return httpx.Response(200, json={"elements": []})
+
+    service = MapService(transport=httpx.MockTransport(handler), tiles=TileCache(max_tiles=0))
+    service.mirror_health.failure_threshold = 1
+
+    for _ in range(len(service.overpass_urls) + 2):
+        await service.get_nearby_places(9.0192, 38.7525, "hotel")
+
+    assert hits.count("overpass-api.de") == 1
+    state = {m["mirror"]: m["state"] for m in service.mirror_health.state()}
+    assert state["https://overpass-api.de/api/interpreter"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_offline_extract_answers_searches_without_overpass(tmp_path):
+    extract = tmp_path / "addis.json"
+    extract.write_text(json.dumps({"elements": [
+        {"type": "node", "id": 1, "lat": 9.0192, "lon": 38.7525, "tags": {"name": "Center", "tourism": "hotel"}},
+        {"type": "node", "id": 2, "lat": 9.0250, "lon": 38.7525, "tags": {"name": "North 650m", "tourism": "hotel"}},
+        {"type": "way", "id": 3, "center": {"lat": 9.0192, "lon": 38.7700}, "tags": {"name": "East", "tourism": "hotel"}},
+        {"type": "node", "id": 4, "lat": 9.0193, "lon": 38.7526, "tags": {"name": "Acme", "office": "company"}},
+    ]}))
+
+    def handler(request):
+        raise AssertionError("offline mode must not call Overpass")
+
+    service = MapService(transport=httpx.MockTransport(handler), tiles=TileCache())
+    assert await service.load_osm_extract(str(extract))
+
+    hotels = await service.get_nearby_places(9.0192, 38.7525, "hotel", radius=1000)
+
+    assert [h["name"] for h in hotels] == ["Center", "North 650m"]
+    assert set(hotels[0]) == {
+        "id", "osm_type", "name", "description", "type", "website", "phone", "email", "address", "latitude", "longitude",
+        "distance_m",
+    }
+    assert [p["name"] for p in await service.get_nearby_places(9.0192, 38.7525, "company", radius=50)] == ["Acme"]
+    assert await service.get_nearby_places(9.0192, 38.7525, "bank") == []
+
+
+@pytest.mark.asyncio
+async def test_nearby_places_are_sorted_by_distance_and_paged():
+    elements = [
+        {"type": "node", "id": i, "lat": 9.0192 + d, "lon": 38.7525, "tags": {"name": f"Hotel {i}", "tourism": "hotel"}}
+        for i, d in enumerate([0.004, 0.001, 0.003, 0.0, 0.002])
+    ]
+    service = MapService(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"elements": elements})),
+        tiles=TileCache(),
+    )
+
+    everything = await service.get_nearby_places(9.0192, 38.7525, "hotel", radius=1000)
+    page = await service.get_nearby_places_page(9.0192, 38.7525, "hotel", radius=1000, offset=1, limit=2)
+    last = await service.get_nearby_places_page(9.0192, 38.7525, "hotel", radius=1000, offset=3, limit=5)
+
+    assert [p["id"] for p in everything] == [3, 1, 4, 2, 0]
+    assert [p["distance_m"] for p in everything] == sorted(p["distance_m"] for p in everything)
+    assert 110 < everything[1]["distance_m"] < 112
+    assert page == {"data": everything[1:3], "total": 5, "next_offset": 3}
+    assert last == {"data": everything[3:], "total": 5, "next_offset": None}
+    assert MapService.paginate(everything) == {"data": everything, "total": 5, "next_offset": None}
+
+
+@pytest.mark.asyncio
+async def test_batch_company_insights_streams_results_with_bounded_concurrency(map_service):
+    in_flight = 0
+    peak = 0
+
+    class FlakyAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            if '"Broken"' in user_input:
+                raise RuntimeError("upstream failed")
+            return json.dumps(VALID_COMPANY_INSIGHTS)
+
+    map_service.ai_service = FlakyAIService()
+    places = [{"id": i, "name": "Broken" if i == 2 else f"Place {i}", "type": "company"} for i in range(6)]
+
+    results = [item async for item in map_service.batch_company_insights(places, concurrency=2)]
+
+    assert peak == 2
+    assert sorted(r["index"] for r in results) == list(range(6))
+    by_index = {r["index"]: r for r in results}
+    assert by_index[2] == {"index": 2, "id": 2, "status": "error", "detail": "upstream failed"}
+    assert all(by_index[i]["data"] == VALID_COMPANY_INSIGHTS for i in range(6) if i != 2)
+
+
+@pytest.mark.asyncio
+async def test_company_insights_are_persisted_and_reused_until_place_data_changes(map_service):
+    calls = 0
+
+    class CountingAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            nonlocal calls
+            calls += 1
+            return json.dumps(VALID_COMPANY_INSIGHTS)
+
+    map_service.ai_service = CountingAIService()
+    place = {"id": 42, "osm_type": "node", "name": "Acme", "type": "company", "latitude": 9.0192, "longitude": 38.7525}
+
+    assert await map_service.get_company_insights(place) == VALID_COMPANY_INSIGHTS
+    # Same OSM data (a distance_m from search results does not count as a change)
+    assert await map_service.get_company_insights({**place, "distance_m": 12.5}) == VALID_COMPANY_INSIGHTS
+    assert calls == 1
+
+    await map_service.get_company_insights({**place, "website": "https://acme.et"})
+    assert calls == 2
+
+    stored = await map_service.list_stored_insights(9.0195, 38.7525, radius=500)
+    assert [(s["id"], s["name"], s["kind"]) for s in stored] == [(42, "Acme", "company")]
+    assert stored[0]["insights"] == VALID_COMPANY_INSIGHTS
+    assert await map_service.list_stored_insights(9.2, 38.9, radius=500) == []
+
+
+@pytest.mark.asyncio
+async def test_insights_store_is_disabled_after_a_missing_table():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    sessions = sessionmaker(bind=engine)
+    opened = 0
+
+    def session_factory():
+        nonlocal opened
+        opened += 1
+        return sessions()
+
+    class StaticAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            return json.dumps(VALID_COMPANY_INSIGHTS)
+
+    service = MapService(tiles=TileCache(), session_factory=session_factory)
+    service.ai_service = StaticAIService()
+    place = {"id": 42, "osm_type": "node", "name": "Acme", "type": "company"}
+
+    assert await service.get_company_insights(place) == VALID_COMPANY_INSIGHTS
+    assert await service.get_company_insights({**place, "name": "Acme Ltd"}) == VALID_COMPANY_INSIGHTS
+    # Only the first read touched the database; it had no table, so the store was switched off
+    assert opened == 1
+
+
+@pytest.mark.asyncio
+async def test_stored_insights_are_keyed_by_osm_element_type(map_service):
+    replies = [dict(VALID_COMPANY_INSIGHTS, key_problems=[problem]) for problem in ("node problem", "way problem")]
+
+    class SequenceAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            return json.dumps(replies.pop(0))
+
+    map_service.ai_service = SequenceAIService()
+    base = {"id": 42, "name": "Acme", "type": "company", "latitude": 9.0192, "longitude": 38.7525}
+
+    node = await map_service.get_company_insights({**base, "osm_type": "node"})
+    way = await map_service.get_company_insights({**base, "osm_type": "way"})
+
+    assert node["key_problems"] == ["node problem"]
+    assert way["key_problems"] == ["way problem"]
+    stored = await map_service.list_stored_insights(9.0192, 38.7525, radius=500)
+    assert sorted(s["osm_type"] for s in stored) == ["node", "way"]
+
+
+def test_rank_leads_prefers_weak_presence_close_and_named_places():
+    base = {"phone": "", "email": "", "address": "", "distance_m": 100.0, "category": "hotel"}
+    places = [
+        {**base, "id": 1, "name": "Complete Hotel", "website": "https://x.et", "phone": "+251", "email": "a@x.et", "address": "Bole"},
+        {**base, "id": 2, "name": "Far Hotel", "website": "", "distance_m": 950.0},
+        {**base, "id": 3, "name": "Near Hotel", "website": ""},
+        {**base, "id": 4, "name": "Unnamed Hotel", "website": ""},
+        {**base, "id": 5, "name": "Near Fuel", "website": "", "category": "fuel"},
+    ]
+
+    ranked = rank_leads(places, radius=1000)
+
+    assert [p["id"] for p in ranked] == [3, 2, 5, 1, 4]
+    assert all(0 <= p["lead_score"] <= 1 for p in ranked)
+
+
+@pytest.mark.asyncio
+async def test_get_leads_generates_insights_for_top_candidates_only(map_service):
+    elements = [
+        {"type": "node", "id": i, "lat": 9.0192 + i * 0.0005, "lon": 38.7525,
+         "tags": {"name": f"Hotel {i}", "tourism": "hotel", **({"website": "https://x.et"} if i % 2 else {})}}
+        for i in range(10)
+    ]
+    map_service._transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"elements": elements}))
+    calls = []
+
+    class RecordingAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            calls.append(json.loads(user_input)["name"])
+            return json.dumps(VALID_COMPANY_INSIGHTS)
+
+    map_service.ai_service = RecordingAIService()
+
+    result = await map_service.get_leads(9.0192, 38.7525, ["hotel"], radius=1000, top_n=3)
+
+    assert result["total"] == 10
+    assert result["insights_generated"] == 3
+    assert sorted(calls) == ["Hotel 0", "Hotel 2", "Hotel 4"]
+    assert [lead["name"] for lead in result["leads"][:3]] == ["Hotel 0", "Hotel 2", "Hotel 4"]
+    assert all("insights" in lead for lead in result["leads"][:3])
+    assert not any("insights" in lead for lead in result["leads"][3:])
+
+
+@pytest.mark.asyncio
+async def test_get_leads_only_enriches_leads_inside_the_limit(map_service):
+    elements = [
+        {"type": "node", "id": i, "lat": 9.0192 + i * 0.0005, "lon": 38.7525, "tags": {"name": f"Hotel {i}", "tourism": "hotel"}}
+        for i in range(10)
+    ]
+    map_service._transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"elements": elements}))
+    calls = []
+
+    class RecordingAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            calls.append(json.loads(user_input)["name"])
+            return json.dumps(VALID_COMPANY_INSIGHTS)
+
+    map_service.ai_service = RecordingAIService()
+
+    result = await map_service.get_leads(9.0192, 38.7525, ["hotel"], radius=1000, top_n=5, limit=2)
+
+    assert result["total"] == 10
+    assert [lead["name"] for lead in result["leads"]] == ["Hotel 0", "Hotel 1"]
+    assert sorted(calls) == ["Hotel 0", "Hotel 1"]
+    assert result["insights_generated"] == 2
+
+
+@pytest.mark.asyncio
+async def test_leads_and_direct_lookups_share_insights_for_the_same_place(map_service):
+    elements = [{"type": "node", "id": 7, "lat": 9.0192, "lon": 38.7525, "tags": {"name": "Hotel 7", "tourism": "hotel"}}]
+    map_service._transport = httpx.MockTransport(lambda request: httpx.Response(200, json={"elements": elements}))
+    inputs = []
+
+    class RecordingAIService:
+        async def arespond_to_input(self, user_input, prompt_template=None, **kwargs):
+            inputs.append(json.loads(user_input))
+            return json.dumps(VALID_COMPANY_INSIGHTS)
+
+    map_service.ai_service = RecordingAIService()
+
+    await map_service.get_leads(9.0192, 38.7525, ["hotel"], radius=1000, top_n=1)
+    # A slightly different centre changes distance_m and lead_score, not the place
+    await map_service.get_leads(9.0195, 38.7528, ["hotel"], radius=1000, top_n=1)
+    place = (await map_service.get_nearby_places(9.0192, 38.7525, "hotel", 1000))[0]
+    await map_service.get_company_insights(place)
+
+    assert len(inputs) == 1
+    assert not {"distance_m", "category", "lead_score"} & set(inputs[0])
+
+
+@pytest.mark.asyncio
+async def test_prefetcher_warms_tiles_and_skips_when_mirrors_are_down():
+    queries = []
+    elements = [{"type": "node", "id": 1, "lat": 9.0192, "lon": 38.7525, "tags": {"name": "Hilton", "tourism": "hotel"}}]
+
+    def handler(request):
+        queries.append(request.content.decode())
+        return httpx.Response(200, json={"elements": elements})
+
+    service = MapService(transport=httpx.MockTransport(handler), tiles=TileCache())
+    targets = parse_prefetch_targets("9.0192,38.7525,1000,hotel|restaurant; not-a-target")
+    prefetcher = MapPrefetcher(service, targets, spacing=0)
+
+    assert targets == [PrefetchTarget(9.0192, 38.7525, 1000, ("hotel", "restaurant"))]
+    assert await prefetcher.run_once() == 1
+    assert len(queries) == 1
+
+    assert [p["name"] for p in await service.get_nearby_places(9.0192, 38.7525, "hotel")] == ["Hilton"]
+    assert await service.get_nearby_places(9.0192, 38.7525, "restaurant") == []
+    assert len(queries) == 1
+
+    for url in service.overpass_urls:
+        for _ in range(service.mirror_health.failure_threshold):
+            service.mirror_health.report_failure(url, 1.0)
+    assert await prefetcher.run_once() == 0
+    assert len(queries) == 1
+
+
+@pytest.mark.asyncio
+async def test_prefetcher_only_starts_when_enabled(monkeypatch):
+    from app.core.config import Settings, settings
+
+    assert Settings.model_fields["map_prefetch_enabled"].default is False
+    monkeypatch.setattr(settings, "map_prefetch_enabled", False)
+    service = MapService(transport=httpx.MockTransport(lambda request: httpx.Response(200, json={"elements": []})), tiles=TileCache())
+    prefetcher = MapPrefetcher(service, parse_prefetch_targets("9.0192,38.7525,1000,hotel"), interval=3600, spacing=0)
+
+    prefetcher.start()
+    assert prefetcher._task is None
+
+    monkeypatch.setattr(settings, "map_prefetch_enabled", True)
+    prefetcher.start()
+    assert prefetcher._task is not None
+    await prefetcher.stop()
+
+
+@pytest.mark.asyncio
+async def test_prefetcher_does_nothing_when_tile_cache_is_disabled(monkeypatch):
+    from app.core.config import settings
+
+    queries = []
+
+    def handler(request):
+        queries.append(request.content.decode())
+        return httpx.Response(200, json={"elements": []})
+
+    monkeypatch.setattr(settings, "map_prefetch_enabled", True)
+    monkeypatch.setattr(settings, "geo_tile_cache_enabled", False)
+    service = MapService(transport=httpx.MockTransport(handler), tiles=TileCache())
+    prefetcher = MapPrefetcher(service, parse_prefetch_targets("9.0192,38.7525,1000,hotel"), spacing=0)
+
+    prefetcher.start()
+    assert prefetcher._task is None
+    assert await prefetcher.run_once() == 0
+    assert queries == []
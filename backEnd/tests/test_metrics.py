@@ -0,0 +1,29 @@
+from app.core.metrics import MetricsRegistry
+
+
+def test_render_counters_and_histograms_in_prometheus_format():
+    registry = MetricsRegistry()
+    calls = registry.counter("calls_total", "Calls.", ["service", "outcome"])
+    latency = registry.histogram("latency_seconds", "Latency.", ["service"], buckets=(0.1, 1.0))
+
+    calls.inc(service="gemini", outcome="success")
+    calls.inc(2, service="gemini", outcome="success")
+    latency.observe(0.05, service="gemini")
+    latency.observe(0.5, service="gemini")
+
+    text = registry.render()
+
+    assert "# TYPE calls_total counter" in text
+    assert 'calls_total{service="gemini",outcome="success"} 3' in text
+    assert 'latency_seconds_bucket{service="gemini",le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{service="gemini",le="1"} 2' in text
+    assert 'latency_seconds_bucket{service="gemini",le="+Inf"} 2' in text
+    assert 'latency_seconds_count{service="gemini"} 2' in text
+
+
+def test_collectors_refresh_gauges_before_render():
+    registry = MetricsRegistry()
+    state = registry.gauge("mirror_up", "Mirror health.", ["mirror"])
+    registry.register_collector(lambda: state.set(1, mirror='a"b'))
+
+    assert 'mirror_up{mirror="a\\"b"} 1' in registry.render()